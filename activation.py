@@ -0,0 +1,196 @@
+import selectors, threading, socket, time
+
+class ActivationProxy(threading.Thread):
+    def __init__(self, host, port, backend_host, backend_port, start_backend, stop_backend, wait_ready,
+                 backend_alive=None, idle_timeout=1800.0, ready_timeout=600.0, log=None):
+        super().__init__(name="webui-activation", daemon=True)
+        self.host = host
+        self.port = port
+        self.backend_host = backend_host
+        self.backend_port = backend_port
+        self.start_backend = start_backend
+        self.stop_backend = stop_backend
+        self.wait_ready = wait_ready
+        self.backend_alive = backend_alive or (lambda: True)
+        self.idle_timeout = idle_timeout
+        self.ready_timeout = ready_timeout
+        self.log = log
+        self.backend_running = False
+        self.active = 0
+        self.last_activity = time.monotonic()
+        self.cold_starts = 0
+        self.cold_start_total = 0.0
+        self.last_cold_start = None
+        self.idle_stops = 0
+        self._idle_since = time.monotonic()
+        self._idle_total = 0.0
+        self._lock = threading.Lock()
+        self._backend_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._listener = socket.create_server((host, port))
+
+    def stop(self):
+        self._stopping.set()
+        try:
+            self._listener.close()
+        except OSError:
+            pass
+
+    def idle_seconds(self):
+        # Time the backend has been down while the proxy was up, i.e. GPU memory handed back.
+        with self._lock:
+            current = time.monotonic() - self._idle_since if not self.backend_running else 0.0
+            return self._idle_total + current
+
+    def stats(self):
+        return {
+            "backend_running": self.backend_running,
+            "active_connections": self.active,
+            "cold_starts": self.cold_starts,
+            "last_cold_start": self.last_cold_start,
+            "average_cold_start": self.cold_start_total / self.cold_starts if self.cold_starts else None,
+            "idle_stops": self.idle_stops,
+            "idle_seconds": self.idle_seconds(),
+        }
+
+    def ensure_backend(self):
+        # Every connection that arrives while the server is down waits on the same cold start.
+        with self._backend_lock:
+            self._check_alive()
+            if self.backend_running:
+                return True
+            if self.log:
+                self.log.info("First request while idle, starting WebUI.")
+            return self._cold_start()
+
+    def restart_backend(self):
+        # Takes the same lock as a cold start, so connections arriving meanwhile wait for this server instead of
+        # starting a second one. Returns when the old server is stopped and the new one spawned, not when ready.
+        spawned = threading.Event()
+        result = {}
+        threading.Thread(target=self._restart, args=(spawned, result), name="webui-activation-restart",
+                         daemon=True).start()
+        spawned.wait()
+        if "error" in result:
+            raise result["error"]
+        return result["stopped"]
+
+    def _restart(self, spawned, result):
+        with self._backend_lock:
+            try:
+                if self.backend_running:
+                    self._stop_backend()
+                result["stopped"] = time.monotonic()
+                self._cold_start(spawned)
+            except Exception as e:
+                result["error"] = e
+            finally:
+                spawned.set()
+
+    def _cold_start(self, spawned=None):
+        started = time.monotonic()
+        self.start_backend()
+        if spawned is not None:
+            spawned.set()
+        ready = self.wait_ready(self.ready_timeout)
+        penalty = time.monotonic() - started
+        if not ready:
+            if self.log:
+                self.log.error(f"WebUI did not become ready within {self.ready_timeout:.0f}s.")
+            # Not counted as up, the next connection starts it from scratch.
+            self.stop_backend()
+            return False
+        with self._lock:
+            self.backend_running = True
+            self._idle_total += started - self._idle_since
+        self.cold_starts += 1
+        self.cold_start_total += penalty
+        self.last_cold_start = penalty
+        if self.log:
+            self.log.info(f"WebUI cold start took {penalty:.1f}s.")
+        return True
+
+    def _stop_backend(self):
+        self.stop_backend()
+        self._mark_stopped()
+
+    def _mark_stopped(self):
+        with self._lock:
+            self.backend_running = False
+            self._idle_since = time.monotonic()
+
+    def _check_alive(self):
+        # The supervisor gave up or the server exited cleanly, the next connection starts it again.
+        if self.backend_running and not self.backend_alive():
+            if self.log:
+                self.log.warning("WebUI is no longer running, it starts again on the next request.")
+            self._mark_stopped()
+
+    def _touch(self):
+        self.last_activity = time.monotonic()
+
+    def _pipe(self, client, backend):
+        selector = selectors.DefaultSelector()
+        selector.register(client, selectors.EVENT_READ, backend)
+        selector.register(backend, selectors.EVENT_READ, client)
+        try:
+            while True:
+                for key, _ in selector.select(timeout=60):
+                    data = key.fileobj.recv(65536)
+                    if not data:
+                        return
+                    key.data.sendall(data)
+                    self._touch()
+        except OSError:
+            return
+        finally:
+            selector.close()
+
+    def _handle(self, client):
+        with self._lock:
+            self.active += 1
+        self._touch()
+        try:
+            if not self.ensure_backend():
+                return
+            try:
+                backend = socket.create_connection((self.backend_host, self.backend_port), timeout=10)
+            except OSError as e:
+                if self.log:
+                    self.log.error(f"Could not connect to WebUI on port {self.backend_port}: {e}")
+                return
+            backend.settimeout(None)
+            with backend:
+                self._pipe(client, backend)
+        finally:
+            client.close()
+            with self._lock:
+                self.active -= 1
+            self._touch()
+
+    def _idle_watch(self):
+        while not self._stopping.wait(min(5.0, self.idle_timeout)):
+            with self._backend_lock:
+                self._check_alive()
+                idle_for = time.monotonic() - self.last_activity
+                # Open but silent connections (idle browser tabs) do not keep the server up.
+                if not self.backend_running or idle_for < self.idle_timeout:
+                    continue
+                if self.log:
+                    self.log.info(f"WebUI idle for {idle_for:.0f}s, stopping it to free GPU memory.")
+                self._stop_backend()
+                self.idle_stops += 1
+
+    def run(self):
+        threading.Thread(target=self._idle_watch, name="webui-idle", daemon=True).start()
+        if self.log:
+            self.log.info(f"Waiting for the first request on {self.host}:{self.port}, "
+                          f"WebUI will run on port {self.backend_port}.")
+        while not self._stopping.is_set():
+            try:
+                client, _ = self._listener.accept()
+            except OSError:
+                if self._stopping.is_set():
+                    return
+                continue
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
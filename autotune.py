@@ -0,0 +1,246 @@
+from dotenv import load_dotenv
+from utils import Utils
+from readiness import ReadinessWatcher
+from resources import ResourceSampler
+from shutdown import ShutdownCoordinator
+from logpipe import PipeReader
+from http_proxy import Forwarder, ProxyRequest
+from instance import InstanceLock
+import subprocess, statistics, itertools, argparse, shlex, json, time, sys, os, re, pathlib
+from collections import deque
+
+USER_ARGS = re.compile(r"^\s*(?:export\s+)?COMMANDLINE_ARGS=(.*)$")
+# One axis per kind of flag, every combination is tried. Each entry is a list of webui.sh arguments.
+ATTENTION = {
+    "NVIDIA": [["--xformers"], ["--opt-sdp-attention"], ["--opt-sdp-no-mem-attention"]],
+    "AMD": [["--opt-sub-quad-attention"], ["--opt-sdp-attention"], ["--opt-split-attention"]],
+    None: [["--opt-sdp-attention"], ["--opt-split-attention"]],
+}
+PRECISION = {
+    "NVIDIA": [[], ["--no-half-vae"]],
+    # ROCm produces NaNs in half precision on many cards, so every AMD profile upcasts one way or another.
+    "AMD": [["--upcast-sampling"], ["--no-half"]],
+    None: [[]],
+}
+MEMORY = {
+    "NVIDIA": [[], ["--medvram"]],
+    "AMD": [[], ["--medvram"]],
+    None: [[]],
+}
+BENCHMARK = {
+    "prompt": "a photograph of an astronaut riding a horse on the moon, detailed, 35mm",
+    "negative_prompt": "blurry",
+    "steps": 20,
+    "width": 512,
+    "height": 512,
+    "batch_size": 1,
+    "seed": 1234,
+    "sampler_name": "Euler a",
+    "send_images": False,
+    "save_images": False,
+}
+
+def flag_matrix(vendor):
+    axes = [table.get(vendor, table[None]) for table in (ATTENTION, PRECISION, MEMORY)]
+    return [sum(combination, []) for combination in itertools.product(*axes)]
+
+def gpu_key(gpu, index=0):
+    # Profiles follow the card model, so identical GPUs in a pool share one.
+    if not gpu:
+        return "none"
+    names = gpu["names"]
+    name = names[min(index, len(names) - 1)] if names else "unknown"
+    return name if name.startswith(gpu["vendor"]) else f"{gpu['vendor']} {name}"
+
+def load_profiles(profiles_fp):
+    try:
+        with open(profiles_fp) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def save_profile(profiles_fp, key, profile):
+    profiles = load_profiles(profiles_fp)
+    profiles[key] = profile
+    tmp = f"{profiles_fp}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, profiles_fp)
+
+def tuned_flags(profiles_fp, gpu, index=0):
+    profile = load_profiles(profiles_fp).get(gpu_key(gpu, index))
+    return list(profile["flags"]) if profile else []
+
+def user_commandline_args(webui_sh):
+    # webui.sh sources webui-user.sh after it inherits our environment, so flags set there cannot be cleared.
+    args = []
+    try:
+        with open(pathlib.Path(webui_sh).with_name("webui-user.sh")) as f:
+            for line in f:
+                match = USER_ARGS.match(line)
+                if match:
+                    args = shlex.split(" ".join(shlex.split(match.group(1), comments=True)))
+    except (OSError, ValueError):
+        return []
+    return args
+
+def best(results):
+    # Only profiles that got through every run count, ties go to the one using less VRAM.
+    stable = [result for result in results if result["error"] is None]
+    if not stable:
+        return None
+    return max(stable, key=lambda result: (round(result["its"], 2), -(result["peak_vram"] or 0)))
+
+class AutoTuner:
+    def __init__(self, webui_sh, port, gpu, work_dir, runs=3, warmup=1, payload=BENCHMARK, ready_timeout=600.0,
+                 stop_timeout=30.0, kill_timeout=10.0, log=None):
+        self.webui_sh = webui_sh
+        self.port = port
+        self.gpu = gpu
+        self.work_dir = work_dir
+        self.runs = runs
+        self.warmup = warmup
+        self.payload = payload
+        self.ready_timeout = ready_timeout
+        self.log = log
+        self.shutdown = ShutdownCoordinator(grace=stop_timeout, kill_grace=kill_timeout,
+                                            gpu_source=lambda: gpu, log=log)
+        self.user_args = user_commandline_args(webui_sh)
+        self.request = ProxyRequest("POST", "/sdapi/v1/txt2img", [("Content-Type", "application/json")],
+                                    json.dumps(payload).encode("utf-8"))
+        os.makedirs(work_dir, exist_ok=True)
+
+    def trial(self, index, flags):
+        result = {"flags": flags, "its": None, "seconds": [], "peak_vram": None, "time_to_ready": None,
+                  "error": None}
+        log_fp = os.path.join(self.work_dir, f"trial-{index}.log")
+        tail = deque(maxlen=5)
+        command = [str(self.webui_sh), "--nowebui", "--port", str(self.port)] + flags
+        # Flags exported from the shell or .env would otherwise be added to every trial.
+        env = dict(os.environ, COMMANDLINE_ARGS="")
+        with open(log_fp, "wb") as log_file:
+            log_file.write(f"$ COMMANDLINE_ARGS='' {shlex.join(command)}\n".encode("utf-8"))
+            if self.user_args:
+                log_file.write(f"# webui-user.sh adds {shlex.join(self.user_args)}\n".encode("utf-8"))
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, env=env,
+                                    preexec_fn=os.setsid)
+            readiness = ReadinessWatcher("127.0.0.1", self.port, proc=proc, timeout=self.ready_timeout)
+
+            def on_lines(text):
+                readiness.feed_line(text)
+                tail.extend(text.splitlines())
+            reader = PipeReader(proc.stdout, log_file.write, on_lines=on_lines, name=f"webui-autotune-{proc.pid}")
+            reader.start()
+            readiness.start()
+            sampler = ResourceSampler(lambda: proc.pid if proc.poll() is None else None, gpu_source=lambda: self.gpu,
+                                      interval=0.5, gpu_interval=0.5, log=self.log)
+            sampler.start()
+            try:
+                readiness.done.wait(self.ready_timeout + 5)
+                if not readiness.ready.is_set():
+                    result["error"] = f"did not start ({readiness.state}): {' | '.join(tail)}"
+                    return result
+                result["time_to_ready"] = readiness.time_to_ready()
+                forwarder = Forwarder("127.0.0.1", self.port, timeout=self.ready_timeout)
+                for run in range(self.warmup + self.runs):
+                    started = time.monotonic()
+                    response = forwarder(self.request)
+                    elapsed = time.monotonic() - started
+                    if response.status != 200:
+                        # The WebUI reports OOM and NaN failures as a 500 with the exception in the body.
+                        result["error"] = f"HTTP {response.status}: {response.body[:300].decode('utf-8', 'replace')}"
+                        return result
+                    if run >= self.warmup:
+                        result["seconds"].append(elapsed)
+                result["its"] = self.payload["steps"] / statistics.median(result["seconds"])
+                return result
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+                return result
+            finally:
+                sampler.stop()
+                readiness.stop()
+                if proc.poll() is None:
+                    self.shutdown.stop(proc.pid, port=self.port)
+                reader.join(10)
+                vram = [sample.get("vram_group") or sample.get("vram_used") for sample in sampler.samples]
+                result["peak_vram"] = max((value for value in vram if value), default=None)
+
+    def run(self, matrix):
+        results = []
+        if self.user_args and self.log:
+            self.log.warning(f"webui-user.sh sets COMMANDLINE_ARGS to {shlex.join(self.user_args)}, every trial "
+                             f"runs with these flags on top of its own. Comment it out for a clean comparison.")
+        for index, flags in enumerate(matrix):
+            if self.log:
+                self.log.info(f"Autotune {index + 1}/{len(matrix)}: {' '.join(flags) or '(no flags)'}")
+            result = self.trial(index, flags)
+            results.append(result)
+            if self.log:
+                if result["error"]:
+                    self.log.warning(f"Autotune {' '.join(flags)} failed: {result['error']}")
+                else:
+                    self.log.info(f"Autotune {' '.join(flags)}: {result['its']:.2f} it/s")
+        return results
+
+def format_results(results):
+    lines = []
+    for result in sorted(results, key=lambda result: result["its"] or 0, reverse=True):
+        vram = f"{result['peak_vram'] / 1024 ** 3:6.2f} GiB" if result["peak_vram"] else "       ? GiB"
+        outcome = f"{result['its']:7.2f} it/s" if result["error"] is None else "  failed    "
+        lines.append(f"{outcome}  {vram}  {' '.join(result['flags'])}"
+                     + (f"\n    {result['error']}" if result["error"] else ""))
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark webui.sh launch flags for this GPU and save the fastest.")
+    parser.add_argument("--runs", type=int, help="Timed txt2img calls per flag set.")
+    parser.add_argument("--steps", type=int, default=BENCHMARK["steps"])
+    parser.add_argument("--only", action="append", default=[],
+                        help="Only try flag sets containing this flag, may be repeated.")
+    parser.add_argument("--dry-run", action="store_true", help="Print the flag sets that would be tried.")
+    parser.add_argument("--no-save", dest="save", action="store_false", help="Do not store the winning profile.")
+    args = parser.parse_args()
+
+    load_dotenv()
+    utils = Utils(int(os.environ.get("WEBUI_LOGLEVEL", "20")))
+    gpu = utils.probes()["gpu"]
+    matrix = [flags for flags in flag_matrix(gpu["vendor"] if gpu else None)
+              if all(flag in flags for flag in args.only)]
+    key = gpu_key(gpu)
+    print(f"{key}: {len(matrix)} flag sets")
+    if args.dry_run:
+        print("\n".join(" ".join(flags) or "(no flags)" for flags in matrix))
+        sys.exit(0)
+
+    # Holding the instance lock keeps the tray from starting a WebUI on the same GPU while we measure.
+    lock = InstanceLock(utils.webui_lock_fp)
+    if lock.is_held_elsewhere() or not lock.acquire():
+        print("The WebUI server is running, stop it before tuning.")
+        sys.exit(1)
+    try:
+        tuner = AutoTuner(utils.webui_sh_path, utils.backend_port, gpu, utils.data_dir / "autotune",
+                          runs=args.runs or utils.autotune_runs, payload=dict(BENCHMARK, steps=args.steps),
+                          ready_timeout=utils.ready_timeout, stop_timeout=utils.stop_timeout,
+                          kill_timeout=utils.kill_timeout, log=utils.log)
+        results = tuner.run(matrix)
+    finally:
+        lock.release()
+    print(format_results(results))
+
+    winner = best(results)
+    if winner is None:
+        print("Every flag set failed, see the trial logs in", utils.data_dir / "autotune")
+        sys.exit(1)
+    print(f"Fastest stable: {' '.join(winner['flags'])} at {winner['its']:.2f} it/s")
+    if args.save:
+        save_profile(utils.autotune_fp, key, {
+            "flags": winner["flags"],
+            "its": winner["its"],
+            "peak_vram": winner["peak_vram"],
+            "driver": gpu["driver"] if gpu else None,
+            "steps": args.steps,
+            "tuned_at": time.time(),
+            "results": results,
+        })
+        print(f"Saved to {utils.autotune_fp}, the server applies it on its next launch.")
@@ -0,0 +1,106 @@
+import subprocess, statistics, argparse, tempfile, signal, time, json, sys, os, pathlib
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+STUB_WEBUI_SH = """#!/bin/sh
+echo "$$ $(date +%s.%N)" > "{marker}"
+exec sleep 600
+"""
+
+IMPORT_SNIPPET = """
+import time
+started = time.perf_counter()
+import webui_server
+{extra}
+print(time.perf_counter() - started)
+"""
+
+def bench_env(tmp_dir, daemon):
+    env = dict(os.environ)
+    env.update({
+        "WEBUI_SH": str(tmp_dir / "webui.sh"),
+        "WEBUI_DATA_DIR": str(tmp_dir),
+        # Keep the instance lock and control socket away from a real running instance.
+        "XDG_RUNTIME_DIR": str(tmp_dir),
+        "WEBUI_DAEMON": str(daemon),
+        "WEBUI_HIDDEN": "True",
+        "WEBUI_LOGLEVEL": env.get("WEBUI_LOGLEVEL", "20"),
+        "WEBUI_HEADLESS": env.get("WEBUI_HEADLESS", "False"),
+        # Nothing is listening, so keep readiness detection from waiting on the stub forever.
+        "WEBUI_PORT": "1",
+        "WEBUI_READY_TIMEOUT": "1",
+    })
+    if not daemon and not env.get("DISPLAY") and not env.get("WAYLAND_DISPLAY"):
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    return env
+
+def cold_import(env, daemon):
+    # The tray module is what pulls in Qt, so only the tray mode pays for it.
+    extra = "" if daemon else "import tray"
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET.format(extra=extra)],
+                                     cwd=ROOT, env=env, text=True)
+    return float(output.strip().splitlines()[-1])
+
+def time_to_spawn(tmp_dir, env):
+    marker = tmp_dir / "spawned"
+    if marker.exists():
+        marker.unlink()
+    started = time.time()
+    launcher = subprocess.Popen([sys.executable, str(ROOT / "webui_server.py")], cwd=tmp_dir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.monotonic() + 30
+        while not marker.exists() or not marker.read_text().strip():
+            if launcher.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError("Launcher exited or timed out before spawning webui.sh.")
+            time.sleep(0.001)
+        child_pid, spawned = marker.read_text().split()
+        return float(spawned) - started
+    finally:
+        launcher.send_signal(signal.SIGTERM)
+        try:
+            launcher.wait(10)
+        except subprocess.TimeoutExpired:
+            launcher.kill()
+        if marker.exists():
+            try:
+                os.killpg(int(marker.read_text().split()[0]), signal.SIGKILL)
+            except (ProcessLookupError, ValueError, IndexError):
+                pass
+
+def run(runs):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="webui-bench-") as tmp:
+        tmp_dir = pathlib.Path(tmp)
+        stub = tmp_dir / "webui.sh"
+        stub.write_text(STUB_WEBUI_SH.format(marker=tmp_dir / "spawned"))
+        stub.chmod(0o755)
+        for mode, daemon in (("daemon", True), ("tray", False)):
+            env = bench_env(tmp_dir, daemon)
+            try:
+                imports = [cold_import(env, daemon) for _ in range(runs)]
+                spawns = [time_to_spawn(tmp_dir, env) for _ in range(runs)]
+            except (subprocess.CalledProcessError, RuntimeError) as e:
+                print(f"{mode}: skipped ({e})", file=sys.stderr)
+                continue
+            results[mode] = {
+                "cold_import_median": statistics.median(imports),
+                "time_to_spawn_median": statistics.median(spawns),
+                "cold_import": imports,
+                "time_to_spawn": spawns,
+            }
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure launcher cold import and time-to-spawn.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", help="Also write the raw results to this file.")
+    args = parser.parse_args()
+
+    results = run(args.runs)
+    for mode, result in results.items():
+        print(f"{mode:<8} cold import {result['cold_import_median'] * 1000:8.1f} ms   "
+              f"time to spawn {result['time_to_spawn_median'] * 1000:8.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
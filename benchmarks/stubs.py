@@ -0,0 +1,131 @@
+import sys, pathlib
+
+# Stand-ins for webui.sh, conda and nvidia-smi. Their behaviour is driven by STUB_* environment variables
+# read when they run, so one set of stubs covers every scenario in the suite.
+
+WEBUI_SH = """#!{python}
+import http.server, signal, socket, time, json, sys, os
+
+def env(name, default):
+    return type(default)(os.environ.get(name, default))
+
+marker = os.environ.get("STUB_MARKER")
+def note(event, **fields):
+    if marker:
+        with open(marker, "a") as f:
+            f.write(json.dumps(dict(event=event, pid=os.getpid(), time=time.time(), **fields)) + "\\n")
+
+def on_term(signum, frame):
+    time.sleep(env("STUB_EXIT_DELAY", 0.0))
+    note("exit", code=0)
+    os._exit(0)
+signal.signal(signal.SIGTERM, on_term)
+
+port = int(sys.argv[sys.argv.index("--port") + 1]) if "--port" in sys.argv else int(os.environ.get("WEBUI_PORT", "7860"))
+note("spawned", port=port)
+print("Launching launch.py", flush=True)
+time.sleep(env("STUB_VENV_DELAY", 0.0))
+
+lines = env("STUB_LOG_LINES", 0)
+line = "x" * max(env("STUB_LINE_BYTES", 100) - 1, 0) + "\\n"
+started = time.time()
+for _ in range(lines):
+    sys.stdout.write(line)
+sys.stdout.write("STUB LOG DONE\\n")
+sys.stdout.flush()
+note("logged", started=started, bytes=lines * len(line))
+
+print("Loading weights [stub] from /dev/null", flush=True)
+time.sleep(env("STUB_LOAD_DELAY", 0.0))
+print("Model loaded in %.1fs" % env("STUB_LOAD_DELAY", 0.0), flush=True)
+
+crash_after = env("STUB_CRASH_AFTER", -1.0)
+if crash_after >= 0:
+    time.sleep(crash_after)
+    note("exit", code=1)
+    print("Stub crashing on purpose", flush=True)
+    os._exit(1)
+
+def progress():
+    # Back to back batches of STUB_STEPS steps at STUB_ITS it/s, STUB_JOB_COUNT batches per task.
+    its, steps, job_count = env("STUB_ITS", 0.0), env("STUB_STEPS", 20), env("STUB_JOB_COUNT", 2)
+    if its <= 0:
+        return {{"progress": 0, "state": {{"job": "", "job_count": 0, "job_no": 0, "job_timestamp": "0",
+                                          "sampling_step": 0, "sampling_steps": 0}}}}
+    done = int((time.time() - ready_at) * its)
+    batch, step = divmod(done, steps)
+    return {{"progress": step / steps, "state": {{"job": "Batch", "job_count": job_count, "job_no": batch % job_count,
+                                               "job_timestamp": str(batch // job_count), "interrupted": False,
+                                               "skipped": False, "sampling_step": step, "sampling_steps": steps}}}}
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = json.dumps(progress()).encode() if self.path.startswith("/sdapi/v1/progress") else b"{{}}"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def do_POST(self):
+        # txt2img/img2img take steps / STUB_ITS seconds, scaled by STUB_FLAG_SPEED ("--flag=factor,...") for
+        # flags on the command line. Flags listed in STUB_FAIL_FLAGS make generation fail like an OOM would.
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{{}}")
+        speed = 1.0
+        for item in filter(None, os.environ.get("STUB_FLAG_SPEED", "").split(",")):
+            flag, _, factor = item.partition("=")
+            if flag in sys.argv:
+                speed *= float(factor)
+        its = env("STUB_ITS", 0.0) * speed
+        if any(flag in sys.argv for flag in filter(None, os.environ.get("STUB_FAIL_FLAGS", "").split(","))):
+            status, body = 500, {{"error": "OutOfMemoryError", "detail": "CUDA out of memory (stub)"}}
+        else:
+            if its > 0:
+                time.sleep(payload.get("steps", 20) * payload.get("n_iter", 1) / its)
+            count = payload.get("batch_size", 1) * payload.get("n_iter", 1)
+            status, body = 200, {{"images": ["c3R1Yg=="] * count, "parameters": payload,
+                                 "info": json.dumps({{"seed": payload.get("seed", -1)}})}}
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+ready_at = time.time()
+server = http.server.HTTPServer(("127.0.0.1", port), Handler)
+print("Running on local URL:  http://127.0.0.1:%d" % port, flush=True)
+note("ready")
+server.serve_forever()
+"""
+
+CONDA = """#!{python}
+import time, json, sys, os
+time.sleep(float(os.environ.get("STUB_CONDA_DELAY", "0")))
+if sys.argv[1:3] == ["info", "--json"]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    print(json.dumps({{"conda_version": "23.0.0-stub", "root_prefix": root,
+                      "envs": [root, os.path.join(root, "envs", "AUTO1111")]}}))
+"""
+
+NVIDIA_SMI = """#!{python}
+import time, sys, os
+time.sleep(float(os.environ.get("STUB_SMI_DELAY", "0")))
+args = " ".join(sys.argv[1:])
+if "--query-gpu=name" in args:
+    print("NVIDIA Stub GPU, 535.00")
+elif "--query-gpu=" in args:
+    print("37, 2048, 24576")
+"""
+
+def install(target_dir):
+    # conda and nvidia-smi go into bin/ so the directory can be put at the front of PATH.
+    target_dir = pathlib.Path(target_dir)
+    bin_dir = target_dir / "bin"
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    stubs = {target_dir / "webui.sh": WEBUI_SH, bin_dir / "conda": CONDA, bin_dir / "nvidia-smi": NVIDIA_SMI}
+    for path, source in stubs.items():
+        path.write_text(source.format(python=sys.executable))
+        path.chmod(0o755)
+    (target_dir / "envs" / "AUTO1111").mkdir(parents=True, exist_ok=True)
+    return target_dir / "webui.sh", bin_dir
@@ -0,0 +1,301 @@
+import urllib.request, subprocess, statistics, argparse, platform, tempfile, signal, socket, time, json, sys, os, pathlib
+import stubs
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = pathlib.Path(__file__).resolve().parent / "baseline.json"
+# Which direction is an improvement, and the unit each metric is reported in.
+METRICS = {
+    "spawn_latency": ("lower", "s"),
+    "time_to_ready": ("lower", "s"),
+    "shutdown_latency": ("lower", "s"),
+    "log_throughput": ("higher", "MB/s"),
+    "crash_detection": ("lower", "s"),
+    "probe_cold": ("lower", "s"),
+    "probe_warm": ("lower", "s"),
+    "setup_checks": ("lower", "s"),
+    "metrics_scrape": ("lower", "s"),
+}
+
+PROBE_SNIPPET = """
+import time, json, sys
+sys.path.insert(0, {root!r})
+from probes import EnvironmentProbe
+probe = EnvironmentProbe(cache_fp={cache_fp!r})
+probe.invalidate()
+started = time.perf_counter()
+probe.results()
+cold = time.perf_counter() - started
+probe = EnvironmentProbe(cache_fp={cache_fp!r})
+started = time.perf_counter()
+probe.results()
+warm = time.perf_counter() - started
+print(json.dumps({{"probe_cold": cold, "probe_warm": warm}}))
+"""
+
+SETUP_SNIPPET = """
+import time, json, sys
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from utils import Setup
+setup = Setup(log_lvl=40)
+setup.is_conda_installed()
+setup.is_conda_environment_AUTO1111_present()
+setup.get_conda_activate_path()
+setup.detect_gpu_type()
+print(json.dumps({{"setup_checks": time.perf_counter() - started}}))
+"""
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def port_open(port):
+    try:
+        with socket.create_connection(("127.0.0.1", port), timeout=0.05):
+            return True
+    except OSError:
+        return False
+
+def pid_gone(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] == "Z"
+    except FileNotFoundError:
+        return True
+
+def wait_for(condition, timeout, what):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Timed out waiting for {what}.")
+        time.sleep(0.001)
+    return time.time()
+
+def scrape(port):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+        return response.read().decode()
+
+def metric_value(text, name):
+    for line in text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return None
+
+def read_events(marker):
+    try:
+        with open(marker) as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]
+    except FileNotFoundError:
+        return []
+
+def event(marker, name, nth=0):
+    matches = [e for e in read_events(marker) if e["event"] == name]
+    return matches[nth] if len(matches) > nth else None
+
+def bench_env(work_dir, bin_dir, webui_sh, options, **overrides):
+    env = dict(os.environ)
+    env.update({
+        "PATH": f"{bin_dir}{os.pathsep}{env.get('PATH', '')}",
+        "XDG_CACHE_HOME": str(work_dir / "cache"),
+        "XDG_RUNTIME_DIR": str(work_dir / "run"),
+        "WEBUI_SH": str(webui_sh),
+        "WEBUI_DATA_DIR": str(work_dir),
+        "WEBUI_DAEMON": "True",
+        "WEBUI_HIDDEN": "True",
+        "WEBUI_HEADLESS": "False",
+        "WEBUI_LOGLEVEL": "20",
+        "STUB_MARKER": str(work_dir / "events.jsonl"),
+        "STUB_VENV_DELAY": str(options.venv_delay),
+        "STUB_LOAD_DELAY": str(options.load_delay),
+        "STUB_LOG_LINES": str(options.log_lines),
+        "STUB_LINE_BYTES": str(options.line_bytes),
+        "STUB_EXIT_DELAY": str(options.exit_delay),
+        "STUB_CONDA_DELAY": str(options.conda_delay),
+        "STUB_SMI_DELAY": str(options.smi_delay),
+        "STUB_ITS": str(options.its),
+        "WEBUI_METRICS": "True",
+        "WEBUI_METRICS_PORT": str(free_port()),
+        "WEBUI_METRICS_INTERVAL": "0.1",
+    })
+    env.update(overrides)
+    return env
+
+def fresh_run_dir(work_dir):
+    for name in ("events.jsonl", "webui_runs.jsonl"):
+        (work_dir / name).unlink(missing_ok=True)
+    (work_dir / "run").mkdir(exist_ok=True, mode=0o700)
+
+def launch(work_dir, env):
+    return subprocess.Popen([sys.executable, str(ROOT / "webui_server.py")], cwd=work_dir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def stop(launcher, marker):
+    if launcher.poll() is None:
+        launcher.send_signal(signal.SIGTERM)
+        try:
+            launcher.wait(30)
+        except subprocess.TimeoutExpired:
+            launcher.kill()
+    for e in read_events(marker):
+        if e["event"] == "spawned" and not pid_gone(e["pid"]):
+            os.kill(e["pid"], signal.SIGKILL)
+
+def lifecycle(work_dir, env, timeout):
+    # One full launch: spawn, log burst, ready, then SIGTERM and wait for the whole tree to go away.
+    fresh_run_dir(work_dir)
+    marker = work_dir / "events.jsonl"
+    port = int(env["WEBUI_PORT"])
+    started = time.time()
+    launcher = launch(work_dir, env)
+    try:
+        wait_for(lambda: event(marker, "spawned") is not None, timeout, "webui.sh to start")
+        spawned = event(marker, "spawned")
+        ready = wait_for(lambda: port_open(port), timeout, "the stub to listen")
+        logged = event(marker, "logged")
+        # Scrapes while the sampler is polling the stub's progress API, the way Prometheus would.
+        metrics_port = int(env["WEBUI_METRICS_PORT"])
+        wait_for(lambda: metric_value(scrape(metrics_port), "webui_generation_iterations_per_second"), timeout,
+                 "the progress sampler")
+        scrapes = []
+        for _ in range(20):
+            scrape_started = time.perf_counter()
+            scrape(metrics_port)
+            scrapes.append(time.perf_counter() - scrape_started)
+        stopping = time.time()
+        launcher.send_signal(signal.SIGTERM)
+        launcher.wait(timeout)
+        stopped = wait_for(lambda: pid_gone(spawned["pid"]), timeout, "webui.sh to exit")
+    finally:
+        stop(launcher, marker)
+    result = {
+        "spawn_latency": spawned["time"] - started,
+        "time_to_ready": ready - started,
+        "shutdown_latency": stopped - stopping,
+        "metrics_scrape": statistics.median(scrapes),
+    }
+    if logged["bytes"]:
+        result["log_throughput"] = logged["bytes"] / 1e6 / max(logged["time"] - logged["started"], 1e-9)
+    return result
+
+def crash_detection(work_dir, env, timeout):
+    # Time from the server dying to the supervisor recording the run, before any restart backoff.
+    fresh_run_dir(work_dir)
+    marker = work_dir / "events.jsonl"
+    runs_fp = work_dir / "webui_runs.jsonl"
+    launcher = launch(work_dir, dict(env, STUB_CRASH_AFTER="0", STUB_LOG_LINES="0"))
+    try:
+        wait_for(lambda: event(marker, "exit") is not None, timeout, "the stub to crash")
+        recorded = wait_for(lambda: runs_fp.exists() and runs_fp.stat().st_size > 0, timeout, "the crash record")
+    finally:
+        stop(launcher, marker)
+    return recorded - event(marker, "exit")["time"]
+
+def snippet(source, work_dir, env, **fields):
+    output = subprocess.check_output([sys.executable, "-c", source.format(root=str(ROOT), **fields)],
+                                     cwd=work_dir, env=env, text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "median": statistics.median(ordered),
+        "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+        "min": ordered[0],
+        "max": ordered[-1],
+        "samples": samples,
+    }
+
+def run(options):
+    samples = {name: [] for name in METRICS}
+    with tempfile.TemporaryDirectory(prefix="webui-suite-") as tmp:
+        work_dir = pathlib.Path(tmp)
+        webui_sh, bin_dir = stubs.install(work_dir)
+        for i in range(options.runs):
+            env = bench_env(work_dir, bin_dir, webui_sh, options, WEBUI_PORT=str(free_port()))
+            for name, value in lifecycle(work_dir, env, options.timeout).items():
+                samples[name].append(value)
+            if options.crashes:
+                samples["crash_detection"].append(crash_detection(work_dir, env, options.timeout))
+            probe = snippet(PROBE_SNIPPET, work_dir, env, cache_fp=str(work_dir / f"probes-{i}.json"))
+            samples["probe_cold"].append(probe["probe_cold"])
+            samples["probe_warm"].append(probe["probe_warm"])
+            # A fresh cache directory, so every run pays for the probes like a first setup would.
+            setup_env = dict(env, XDG_CACHE_HOME=str(work_dir / f"cache-{i}"))
+            samples["setup_checks"].append(snippet(SETUP_SNIPPET, work_dir, setup_env)["setup_checks"])
+            print(f"run {i + 1}/{options.runs} done", file=sys.stderr)
+    return {
+        "meta": {
+            "timestamp": time.time(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.node(),
+            "runs": options.runs,
+            "stub": {key: getattr(options, key) for key in ("venv_delay", "load_delay", "log_lines", "line_bytes",
+                                                            "exit_delay", "conda_delay", "smi_delay", "its")},
+        },
+        "metrics": {name: dict(summarize(values), unit=METRICS[name][1], better=METRICS[name][0])
+                    for name, values in samples.items() if values},
+    }
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+
+def compare(results, baseline, threshold):
+    # A metric regresses when its median moved the wrong way by more than threshold (relative).
+    regressions = []
+    for name, metric in results["metrics"].items():
+        base = baseline.get("metrics", {}).get(name)
+        if base is None or not base["median"]:
+            continue
+        change = metric["median"] / base["median"] - 1
+        worse = change > threshold if metric["better"] == "lower" else change < -threshold
+        marker = "REGRESSION" if worse else ""
+        print(f"{name:<18} {base['median']:10.4f} -> {metric['median']:10.4f} {metric['unit']:<5} "
+              f"{change:+7.1%} {marker}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark launch, shutdown, logging and probes against stubs.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--venv-delay", type=float, default=0.05, help="Seconds before the stub's first phase.")
+    parser.add_argument("--load-delay", type=float, default=0.2, help="Seconds the stub spends 'loading weights'.")
+    parser.add_argument("--log-lines", type=int, default=20000, help="Lines the stub prints during startup.")
+    parser.add_argument("--line-bytes", type=int, default=100)
+    parser.add_argument("--exit-delay", type=float, default=0.0, help="Seconds the stub takes to handle SIGTERM.")
+    parser.add_argument("--conda-delay", type=float, default=0.2)
+    parser.add_argument("--smi-delay", type=float, default=0.1)
+    parser.add_argument("--its", type=float, default=10.0, help="Iterations per second the stub's progress API reports.")
+    parser.add_argument("--no-crashes", dest="crashes", action="store_false", help="Skip the crash detection runs.")
+    parser.add_argument("--json", help="Write the results to this file.")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline results to compare against.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change counted as a regression.")
+    args = parser.parse_args()
+
+    results = run(args)
+    for name, metric in results["metrics"].items():
+        print(f"{name:<18} median {metric['median']:10.4f} {metric['unit']:<5} p90 {metric['p90']:10.4f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    regressions = []
+    baseline_fp = pathlib.Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_fp, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {baseline_fp}")
+    elif baseline_fp.exists():
+        with open(baseline_fp) as f:
+            baseline = json.load(f)
+        print(f"\nAgainst baseline from commit {baseline['meta'].get('commit')}:")
+        regressions = compare(results, baseline, args.threshold)
+    sys.exit(1 if regressions else 0)
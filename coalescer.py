@@ -0,0 +1,184 @@
+import threading, bisect, time, json, copy
+from http_proxy import ProxyResponse
+
+COALESCE_PATHS = {"/sdapi/v1/txt2img", "/sdapi/v1/img2img"}
+STATS_PATH = "/coalescer/stats"
+# Fields that may differ between requests sharing one batch, everything else has to match exactly.
+BATCH_FIELDS = {"seed", "batch_size"}
+WAIT_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000]
+
+class _Pending:
+    def __init__(self, payload):
+        self.payload = payload
+        self.seed = int(payload.get("seed", -1))
+        self.size = int(payload.get("batch_size", 1))
+        self.queued = time.monotonic()
+        self.response = None
+        self.done = threading.Event()
+
+class _Group:
+    def __init__(self, path, request):
+        self.path = path
+        self.request = request
+        self.members = []
+        self.images = 0
+        self.dispatched = False
+
+class Coalescer:
+    def __init__(self, upstream, window=0.05, max_batch=8, log=None):
+        self.upstream = upstream
+        self.window = window
+        self.max_batch = max_batch
+        self.log = log
+        self._groups = {}
+        self._lock = threading.Lock()
+        self.batch_sizes = {}
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.upstream_calls = 0
+        self.requests = 0
+
+    def __call__(self, request):
+        path = request.path.split("?")[0]
+        if request.method == "GET" and path == STATS_PATH:
+            return ProxyResponse.from_json(self.stats())
+        if request.method != "POST" or path not in COALESCE_PATHS:
+            return self.upstream(request)
+        try:
+            payload = request.json()
+        except ValueError:
+            return self.upstream(request)
+        if not self.batchable(payload):
+            return self.upstream(request)
+
+        pending = _Pending(payload)
+        key = (path, json.dumps({k: v for k, v in payload.items() if k not in BATCH_FIELDS}, sort_keys=True))
+        flush_now = None
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None or group.images + pending.size > self.max_batch:
+                if group is not None:
+                    flush_now = self._groups.pop(key)
+                group = _Group(path, request)
+                self._groups[key] = group
+                threading.Timer(self.window, self._flush_key, args=(key, group)).start()
+            group.members.append(pending)
+            group.images += pending.size
+        if flush_now is not None:
+            self._dispatch(flush_now)
+        pending.done.wait()
+        return pending.response
+
+    def batchable(self, payload):
+        if not isinstance(payload, dict):
+            return False
+        try:
+            # _Pending converts the same fields, a null or non-numeric value is left for the WebUI to reject.
+            int(payload.get("seed", -1))
+            if int(payload.get("n_iter", 1)) != 1 or int(payload.get("batch_size", 1)) >= self.max_batch:
+                return False
+        except (TypeError, ValueError):
+            return False
+        # Scripts can change how many images come back, so their requests are never merged.
+        return not payload.get("script_name")
+
+    def _flush_key(self, key, group):
+        with self._lock:
+            if self._groups.get(key) is group:
+                del self._groups[key]
+        self._dispatch(group)
+
+    def _runs(self, members):
+        # Random seeds batch freely. Fixed seeds only batch when they are consecutive, since a batch
+        # of size n starting at seed s renders seeds s..s+n-1.
+        random = [m for m in members if m.seed == -1]
+        runs = [random] if random else []
+        fixed = sorted((m for m in members if m.seed != -1), key=lambda m: m.seed)
+        for member in fixed:
+            if runs and runs[-1] and runs[-1][0].seed != -1:
+                last = runs[-1][-1]
+                if last.seed + last.size == member.seed:
+                    runs[-1].append(member)
+                    continue
+            runs.append([member])
+        return runs
+
+    def _dispatch(self, group):
+        # Both the window timer and an overflowing request may try to send the same group.
+        with self._lock:
+            if group.dispatched:
+                return
+            group.dispatched = True
+        for run in self._runs(group.members):
+            self._send(group, run)
+
+    def _send(self, group, run):
+        now = time.monotonic()
+        total = sum(member.size for member in run)
+        with self._lock:
+            self.upstream_calls += 1
+            self.requests += len(run)
+            self.batch_sizes[len(run)] = self.batch_sizes.get(len(run), 0) + 1
+            for member in run:
+                waited = (now - member.queued) * 1000
+                self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS_MS, waited)] += 1
+
+        if len(run) == 1:
+            body = run[0].payload
+        else:
+            body = copy.deepcopy(run[0].payload)
+            body["batch_size"] = total
+            body["do_not_save_grid"] = True
+        try:
+            response = self.upstream(group.request.replace(body=json.dumps(body).encode("utf-8")))
+        except Exception as e:
+            response = ProxyResponse.error(502, str(e))
+
+        if len(run) == 1 or response.status != 200:
+            for member in run:
+                member.response = response
+                member.done.set()
+            return
+        try:
+            self._split(response, run, total)
+        except (ValueError, KeyError, TypeError) as e:
+            if self.log:
+                self.log.error(f"Could not split a batched response: {e}")
+            for member in run:
+                if not member.done.is_set():
+                    member.response = ProxyResponse.error(502, f"Could not split batched response: {e}")
+                    member.done.set()
+
+    def _split(self, response, run, total):
+        data = response.json()
+        images = data.get("images") or []
+        if len(images) == total + 1:
+            # A grid slipped in front of the batch.
+            images = images[1:]
+        info = json.loads(data["info"]) if isinstance(data.get("info"), str) else None
+        offset = 0
+        for member in run:
+            part = {"images": images[offset:offset + member.size], "parameters": member.payload}
+            if info is not None:
+                member_info = dict(info)
+                for field, value in info.items():
+                    if isinstance(value, list) and len(value) == total:
+                        member_info[field] = value[offset:offset + member.size]
+                if member_info.get("all_seeds"):
+                    member_info["seed"] = member_info["all_seeds"][0]
+                part["info"] = json.dumps(member_info)
+            member.response = ProxyResponse(200, [("Content-Type", "application/json")],
+                                            json.dumps(part).encode("utf-8"))
+            member.done.set()
+            offset += member.size
+
+    def stats(self):
+        with self._lock:
+            labels = [f"<={ms}ms" for ms in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+            return {
+                "window_ms": self.window * 1000,
+                "max_batch": self.max_batch,
+                "requests": self.requests,
+                "upstream_calls": self.upstream_calls,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "wait_ms": dict(zip(labels, self.wait_buckets)),
+            }
@@ -0,0 +1,118 @@
+import http.client, http.server, threading, json
+
+HOP_BY_HOP = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te", "trailers",
+              "transfer-encoding", "upgrade", "host", "content-length"}
+
+class ProxyRequest:
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+        self._json = None
+
+    def json(self):
+        if self._json is None:
+            self._json = json.loads(self.body or b"{}")
+        return self._json
+
+    def replace(self, body=None, path=None):
+        return ProxyRequest(self.method, path or self.path, self.headers, self.body if body is None else body)
+
+class ProxyResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+    @classmethod
+    def from_json(cls, data, status=200):
+        return cls(status, [("Content-Type", "application/json")], json.dumps(data).encode("utf-8"))
+
+    @classmethod
+    def error(cls, status, message):
+        return cls.from_json({"error": message}, status=status)
+
+class Forwarder:
+    # Keeps one persistent connection per calling thread instead of reconnecting for every request.
+    def __init__(self, host, port, timeout=600.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def __call__(self, request):
+        headers = {key: value for key, value in request.headers if key.lower() not in HOP_BY_HOP}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(request.method, request.path, body=request.body, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # A kept-alive connection the server already dropped, retry once on a fresh one.
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+            except Exception:
+                conn.close()
+                self._local.conn = None
+                raise
+        response_headers = [(key, value) for key, value in response.getheaders() if key.lower() not in HOP_BY_HOP]
+        return ProxyResponse(response.status, response_headers, body)
+
+class _ProxyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _proxy(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        request = ProxyRequest(self.command, self.path, list(self.headers.items()), body)
+        try:
+            response = self.server.app(request)
+        except Exception as e:
+            if self.server.log:
+                self.server.log.error(f"Proxy error for {self.command} {self.path}: {e}")
+            response = ProxyResponse.error(502, str(e))
+        self.send_response(response.status)
+        for key, value in response.headers:
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(response.body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(response.body)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = _proxy
+
+    def log_message(self, format, *args):
+        if self.server.log:
+            self.server.log.debug("%s - %s" % (self.address_string(), format % args))
+
+class ProxyServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host, port, app, log=None):
+        self.app = app
+        self.log = log
+        super().__init__((host, port), _ProxyHandler)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="webui-proxy", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,113 @@
+import socketserver, threading, socket, fcntl, json, os, pathlib
+
+COMMANDS = ("open", "profile", "restart", "status", "stop")
+
+def runtime_dir():
+    base = os.environ.get("XDG_RUNTIME_DIR")
+    path = pathlib.Path(base) / "webui-desktop-app" if base else pathlib.Path(f"/tmp/webui-desktop-app-{os.getuid()}")
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return path
+
+class InstanceLock:
+    # flock() is released by the kernel when the owner dies, so a crash never leaves a stale lock.
+    def __init__(self, lock_fp):
+        self.lock_fp = pathlib.Path(lock_fp)
+        self._fd = None
+
+    def acquire(self):
+        fd = os.open(self.lock_fp, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        return True
+
+    def owner_pid(self):
+        try:
+            with open(self.lock_fp, "r") as f:
+                return int(f.read().strip())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def is_held_elsewhere(self):
+        if self._fd is not None:
+            return False
+        try:
+            fd = os.open(self.lock_fp, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH | fcntl.LOCK_NB)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            return False
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+
+    def release(self):
+        if self._fd is None:
+            return
+        # The file itself is left in place, unlinking it would let two processes lock different inodes.
+        os.close(self._fd)
+        self._fd = None
+
+class _ControlHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline(1024).decode("utf-8", errors="replace").strip()
+        command, _, argument = line.partition(" ")
+        handler = self.server.handlers.get(command)
+        if handler is None:
+            response = {"ok": False, "error": f"Unknown command '{command}'. Expected one of: {', '.join(self.server.handlers)}"}
+        else:
+            try:
+                result = handler(argument) if argument else handler()
+                response = {"ok": True, "result": result}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+        self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_fp, handlers, log=None):
+        self.socket_fp = pathlib.Path(socket_fp)
+        self.handlers = handlers
+        self.log = log
+        # Only ever called while holding the instance lock, so any socket file left here is stale.
+        try:
+            self.socket_fp.unlink()
+        except FileNotFoundError:
+            pass
+        super().__init__(str(self.socket_fp), _ControlHandler)
+        os.chmod(self.socket_fp, 0o600)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="webui-control", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        try:
+            self.socket_fp.unlink()
+        except FileNotFoundError:
+            pass
+
+def send_command(socket_fp, command, timeout=5.0):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(str(socket_fp))
+        sock.sendall((command + "\n").encode("utf-8"))
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    return json.loads(data.decode("utf-8"))
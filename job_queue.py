@@ -0,0 +1,318 @@
+import http.client, threading, hashlib, base64, time, json, os, pathlib
+from collections import deque
+from http_proxy import ProxyResponse
+
+ENDPOINTS = {"txt2img": "/sdapi/v1/txt2img", "img2img": "/sdapi/v1/img2img"}
+PROMPT_SUFFIXES = (".jsonl", ".txt")
+# Only failures before the payload reached a WebUI, a refused connection or the pool's 503, let the job wait
+# without using up an attempt. A connection dropped mid-request counts, the job may be what crashed the WebUI.
+UNAVAILABLE_STATUS = (503,)
+
+def read_prompt_file(path, log=None):
+    # One job per line: a txt2img/img2img payload as JSON, or a bare prompt. "id" and "endpoint" are ours.
+    path = pathlib.Path(path)
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                payload = json.loads(line) if line.startswith("{") else {"prompt": line}
+            except ValueError as e:
+                if log:
+                    log.error(f"Skipping {path.name}:{line_no}, not valid JSON: {e}")
+                continue
+            job_id = payload.pop("id", None)
+            endpoint = payload.pop("endpoint", "txt2img")
+            if endpoint not in ENDPOINTS:
+                if log:
+                    log.error(f"Skipping {path.name}:{line_no}, unknown endpoint {endpoint!r}.")
+                continue
+            if job_id is None:
+                # Tied to the content, so adding the same file twice queues nothing new but an edited line does.
+                digest = hashlib.sha1(json.dumps([endpoint, payload], sort_keys=True).encode("utf-8")).hexdigest()
+                job_id = f"{path.stem}-{line_no:05d}-{digest[:8]}"
+            yield {"id": str(job_id), "endpoint": endpoint, "payload": payload, "source": str(path)}
+
+class Journal:
+    # Append-only, one JSON record per state change, synced before the next step so a crash loses nothing.
+    def __init__(self, path):
+        self.path = pathlib.Path(path)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def replay(self):
+        jobs = {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write.
+                        continue
+                    event = record.pop("event")
+                    if event == "queued":
+                        jobs[record["id"]] = dict(record, state="pending", attempts=0, outputs=[])
+                    elif record.get("id") in jobs:
+                        job = jobs[record["id"]]
+                        # Only failures use up attempts, a start cut short by a restart does not.
+                        if event == "done":
+                            job.update(state="done", outputs=record["outputs"], seconds=record["seconds"])
+                        elif event == "failed":
+                            job["attempts"] = record["attempt"]
+                            if record.get("final"):
+                                job.update(state="failed", error=record["error"])
+        except FileNotFoundError:
+            pass
+        return jobs
+
+    def append(self, event, **record):
+        data = (json.dumps(dict(record, event=event, time=time.time())) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+class JobQueue:
+    def __init__(self, host, port, jobs_dir, output_dir, concurrency=2, max_attempts=3, ready=None,
+                 poll_interval=5.0, window=600.0, timeout=3600.0, log=None):
+        self.jobs_dir = pathlib.Path(jobs_dir)
+        self.inbox = self.jobs_dir / "inbox"
+        self.ingested = self.jobs_dir / "ingested"
+        self.output_dir = pathlib.Path(output_dir)
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.ready = ready or (lambda: True)
+        self.poll_interval = poll_interval
+        self.window = window
+        self.log = log
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.journal = Journal(self.jobs_dir / "journal.jsonl")
+        self.jobs = {}
+        self.pending = deque()
+        self.running = 0
+        self.completions = deque()
+        self._cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.inbox.mkdir(parents=True, exist_ok=True)
+        self.ingested.mkdir(exist_ok=True)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.jobs = self.journal.replay()
+        # Jobs that were running when the tray or the WebUI went down start over.
+        self.pending.extend(job["id"] for job in self.jobs.values() if job["state"] == "pending")
+        if self.pending and self.log:
+            self.log.info(f"Resuming {len(self.pending)} queued jobs from {self.journal.path}.")
+        self._threads = [threading.Thread(target=self._watch_inbox, name="webui-jobs-inbox", daemon=True)]
+        self._threads += [threading.Thread(target=self._worker, name=f"webui-jobs-{i}", daemon=True)
+                          for i in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        with self._cond:
+            self._cond.notify_all()
+        self.journal.close()
+
+    def add_file(self, path):
+        added = 0
+        for job in read_prompt_file(path, log=self.log):
+            with self._cond:
+                if job["id"] in self.jobs:
+                    continue
+                self.journal.append("queued", **job)
+                self.jobs[job["id"]] = dict(job, state="pending", attempts=0, outputs=[])
+                self.pending.append(job["id"])
+                self._cond.notify()
+            added += 1
+        if self.log:
+            self.log.info(f"Queued {added} jobs from {path}.")
+        return added
+
+    def _watch_inbox(self):
+        while not self._stopping.is_set():
+            try:
+                paths = sorted(self.inbox.iterdir())
+            except OSError as e:
+                # A missing or unreadable inbox is retried on the next pass instead of ending the thread.
+                paths = []
+                if self.log:
+                    self.log.error(f"Could not read the prompt inbox {self.inbox}: {e}")
+            for path in paths:
+                if path.suffix not in PROMPT_SUFFIXES:
+                    continue
+                try:
+                    # Leave files that are still being copied in for the next pass.
+                    if time.time() - path.stat().st_mtime < self.poll_interval:
+                        continue
+                    self.add_file(path)
+                    os.replace(path, self.ingested / path.name)
+                except OSError as e:
+                    if self.log:
+                        self.log.error(f"Could not queue {path}: {e}")
+            self._stopping.wait(self.poll_interval)
+
+    def _next(self):
+        with self._cond:
+            while not self.pending and not self._stopping.is_set():
+                self._cond.wait()
+            if self._stopping.is_set():
+                return None
+            self.running += 1
+            return self.jobs[self.pending.popleft()]
+
+    def _requeue(self, job, front=False):
+        with self._cond:
+            self.running -= 1
+            if front:
+                self.pending.appendleft(job["id"])
+            else:
+                self.pending.append(job["id"])
+            self._cond.notify()
+
+    def _worker(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            if not self.ready():
+                self._requeue(job, front=True)
+                self._stopping.wait(self.poll_interval)
+                continue
+            # A fresh connection per job, so a failed connect always means nothing was sent.
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                conn.connect()
+            except OSError as e:
+                conn.close()
+                self._wait_for_webui(job, e)
+                continue
+            job["attempts"] += 1
+            job["state"] = "running"
+            self.journal.append("started", id=job["id"], attempt=job["attempts"])
+            started = time.monotonic()
+            try:
+                conn.request("POST", ENDPOINTS[job["endpoint"]], body=json.dumps(job["payload"]).encode("utf-8"),
+                             headers={"Content-Type": "application/json"})
+                raw = conn.getresponse()
+                response = ProxyResponse(raw.status, raw.getheaders(), raw.read())
+            except (http.client.HTTPException, OSError) as e:
+                if self._stopping.is_set():
+                    return
+                self._fail(job, f"Connection lost during the request: {e}")
+                continue
+            finally:
+                conn.close()
+            if response.status in UNAVAILABLE_STATUS:
+                job["attempts"] -= 1
+                self._wait_for_webui(job, f"HTTP {response.status}")
+                continue
+            seconds = time.monotonic() - started
+            if response.status == 200:
+                try:
+                    outputs = self._write_outputs(job, response.json(), seconds)
+                except (OSError, ValueError) as e:
+                    self._fail(job, f"Could not save outputs: {e}")
+                    continue
+                self.journal.append("done", id=job["id"], outputs=outputs, seconds=seconds)
+                with self._cond:
+                    job.update(state="done", outputs=outputs, seconds=seconds)
+                    self.running -= 1
+                    self.completions.append((time.monotonic(), len(outputs)))
+            else:
+                self._fail(job, f"HTTP {response.status}: {response.body[:300].decode('utf-8', 'replace')}")
+
+    def _wait_for_webui(self, job, error):
+        if self._stopping.is_set():
+            return
+        if self.log:
+            self.log.debug(f"WebUI unavailable for job {job['id']}, retrying: {error}")
+        job["state"] = "pending"
+        self._requeue(job, front=True)
+        self._stopping.wait(self.poll_interval)
+
+    def _fail(self, job, error):
+        final = job["attempts"] >= self.max_attempts
+        self.journal.append("failed", id=job["id"], attempt=job["attempts"], error=error, final=final)
+        if self.log:
+            self.log.warning(f"Job {job['id']} failed (attempt {job['attempts']}/{self.max_attempts}): {error}")
+        if final:
+            with self._cond:
+                job.update(state="failed", error=error)
+                self.running -= 1
+        else:
+            job["state"] = "pending"
+            self._requeue(job)
+
+    def _write_outputs(self, job, result, seconds):
+        outputs = []
+        for index, image in enumerate(result.get("images") or []):
+            # Some extensions return data URLs instead of bare base64.
+            data = base64.b64decode(image.split(",", 1)[1] if image.startswith("data:") else image)
+            outputs.append(self._write(f"{job['id']}-{index}.png", data))
+        info = {"id": job["id"], "endpoint": job["endpoint"], "payload": job["payload"], "seconds": seconds,
+                "info": result.get("info")}
+        self._write(f"{job['id']}.json", json.dumps(info, indent=2).encode("utf-8"))
+        return outputs
+
+    def _write(self, name, data):
+        target = self.output_dir / name
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+        return str(target)
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            while self.completions and now - self.completions[0][0] > self.window:
+                self.completions.popleft()
+            states = [job["state"] for job in self.jobs.values()]
+            done = states.count("done")
+            failed = states.count("failed")
+            remaining = len(states) - done - failed
+            completions = list(self.completions)
+        # Rates cover the last window only, so the ETA follows the current checkpoint and settings.
+        elapsed = now - completions[0][0] if len(completions) > 1 else 0
+        jobs_per_second = (len(completions) - 1) / elapsed if elapsed > 0 else None
+        images_per_second = sum(images for _, images in completions[1:]) / elapsed if elapsed > 0 else None
+        return {
+            "total": len(states),
+            "done": done,
+            "failed": failed,
+            "running": self.running,
+            "pending": len(self.pending),
+            "jobs_per_minute": jobs_per_second * 60 if jobs_per_second else None,
+            "images_per_minute": images_per_second * 60 if images_per_second else None,
+            "eta": remaining / jobs_per_second if jobs_per_second and remaining else None,
+        }
+
+    def summary(self):
+        stats = self.stats()
+        if not stats["total"]:
+            return None
+        text = f"Jobs {stats['done']}/{stats['total']}"
+        if stats["failed"]:
+            text += f", {stats['failed']} failed"
+        if stats["images_per_minute"]:
+            text += f", {stats['images_per_minute']:.1f} img/min"
+        if stats["eta"]:
+            hours, minutes = divmod(int(stats["eta"]) // 60, 60)
+            text += f", ETA {hours}h {minutes:02d}m"
+        return text
@@ -0,0 +1,422 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPlainTextEdit, QScrollBar,\
+    QComboBox, QLineEdit, QPushButton, QCheckBox, QLabel, QSpinBox
+from PyQt5.QtCore import Qt, QThread, QEvent, pyqtSignal
+from PyQt5.QtGui import QFontDatabase
+from array import array
+import threading, tempfile, bisect, gzip, mmap, re, os, pathlib
+
+NEWLINE = re.compile(b"\n")
+LEVEL_RE = re.compile(rb" - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ")
+LEVELS = {"All": 0, "INFO and above": 20, "WARNING and above": 30, "ERROR and above": 40}
+LEVEL_VALUES = {b"DEBUG": 10, b"INFO": 20, b"WARNING": 30, b"ERROR": 40, b"CRITICAL": 50}
+
+class LineIndex:
+    # Only every STRIDE-th line offset is kept, so the index stays small on multi-GB files.
+    STRIDE = 64
+    CHUNK = 8 * 1024 * 1024
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._mm = None
+        self._file = None
+        self._inode = None
+        self._reset()
+
+    def _reset(self):
+        self._checkpoints = array("Q")
+        self._newlines = 0
+        self._indexed = 0
+        self._last_line_start = 0
+        self._size = 0
+        self._unmap()
+
+    def _unmap(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _remap(self, size):
+        self._unmap()
+        self._size = size
+        if size == 0:
+            return
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+
+    def close(self):
+        with self._lock:
+            self._unmap()
+
+    @property
+    def line_count(self):
+        partial = 1 if self._indexed > self._last_line_start else 0
+        return self._newlines + partial
+
+    @property
+    def fully_indexed(self):
+        return self._indexed >= self._size
+
+    def progress(self):
+        return self._indexed / self._size if self._size else 1.0
+
+    def refresh(self):
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset()
+                return True
+            if st.st_ino != self._inode or st.st_size < self._indexed:
+                # Rotated or truncated, the old offsets are meaningless now.
+                self._reset()
+                self._inode = st.st_ino
+            if st.st_size != self._size:
+                self._remap(st.st_size)
+            if self._indexed >= self._size:
+                return False
+
+            end = min(self._size, self._indexed + self.CHUNK)
+            for match in NEWLINE.finditer(self._mm, self._indexed, end):
+                self._newlines += 1
+                self._last_line_start = match.end()
+                if self._newlines % self.STRIDE == 0:
+                    self._checkpoints.append(match.end())
+            self._indexed = end
+            return True
+
+    def _line_offset(self, line):
+        block = line // self.STRIDE
+        pos = 0 if block == 0 else self._checkpoints[block - 1]
+        for _ in range(line - block * self.STRIDE):
+            pos = self._mm.find(b"\n", pos, self._indexed) + 1
+        return pos
+
+    def read_lines(self, start, count):
+        with self._lock:
+            total = self.line_count
+            if self._mm is None or start >= total:
+                return []
+            count = min(count, total - start)
+            pos = self._line_offset(start)
+            lines = []
+            for _ in range(count):
+                end = self._mm.find(b"\n", pos, self._indexed)
+                if end == -1:
+                    end = self._indexed
+                lines.append(self._mm[pos:end].decode("utf-8", errors="replace"))
+                pos = end + 1
+            return lines
+
+    def read_line(self, line):
+        lines = self.read_lines(line, 1)
+        return lines[0] if lines else ""
+
+def log_files(log_fp):
+    log_fp = pathlib.Path(log_fp)
+    backups = re.compile(re.escape(log_fp.name) + r"\.\d+(\.gz)?$")
+    rotated = sorted((p for p in log_fp.parent.glob(log_fp.name + ".*") if backups.match(p.name)),
+                     key=lambda p: p.stat().st_mtime, reverse=True)
+    return [log_fp] + rotated
+
+def unpack(path, target, progress=None, interrupted=None, chunk_size=1024 * 1024):
+    # Rotated logs are gzipped, they are unpacked into a temporary file so they can be mmapped. Progress is
+    # reported as the share of the compressed file read so far.
+    tmp = target.with_name(target.name + ".part")
+    size = os.path.getsize(path) or 1
+    complete = True
+    reported = None
+    with open(path, "rb") as raw, gzip.GzipFile(fileobj=raw) as src, open(tmp, "wb") as dst:
+        for chunk in iter(lambda: src.read(chunk_size), b""):
+            if interrupted is not None and interrupted():
+                complete = False
+                break
+            dst.write(chunk)
+            percent = min(raw.tell() * 100 // size, 100)
+            if progress is not None and percent != reported:
+                progress(percent)
+                reported = percent
+    if not complete:
+        tmp.unlink()
+        return False
+    os.replace(tmp, target)
+    return True
+
+class UnpackWorker(QThread):
+    progress = pyqtSignal(int)
+    unpacked = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, target, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.target = target
+
+    def run(self):
+        try:
+            if unpack(self.path, self.target, self.progress.emit, self.isInterruptionRequested):
+                self.unpacked.emit(str(self.target))
+        except (OSError, EOFError) as e:
+            self.failed.emit(f"Could not unpack {self.path.name}: {e}")
+
+class IndexWorker(QThread):
+    updated = pyqtSignal()
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+
+    def run(self):
+        while not self.isInterruptionRequested():
+            changed = self.index.refresh()
+            if changed:
+                self.updated.emit()
+            if self.index.fully_indexed:
+                self.msleep(1000)
+
+class FilterWorker(QThread):
+    found = pyqtSignal(object)
+    progress = pyqtSignal(int)
+
+    CHUNK = 4 * 1024 * 1024
+
+    def __init__(self, path, pattern, min_level, parent=None):
+        super().__init__(parent)
+        self.path = str(path)
+        self.pattern = re.compile(pattern.encode(), re.IGNORECASE) if pattern else None
+        self.min_level = min_level
+
+    def matches(self, line):
+        if self.min_level:
+            level = LEVEL_RE.search(line)
+            if level is None or LEVEL_VALUES[level.group(1)] < self.min_level:
+                return False
+        return self.pattern is None or self.pattern.search(line) is not None
+
+    def run(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        if size == 0:
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mm:
+            pos = 0
+            line_no = 0
+            while pos < size and not self.isInterruptionRequested():
+                end = min(size, pos + self.CHUNK)
+                if end < size:
+                    newline = mm.rfind(b"\n", pos, end)
+                    if newline != -1:
+                        end = newline + 1
+                chunk = mm[pos:end]
+                lines = chunk.split(b"\n")
+                if chunk.endswith(b"\n"):
+                    lines.pop()
+                batch = array("Q")
+                for line in lines:
+                    if self.matches(line):
+                        batch.append(line_no)
+                    line_no += 1
+                if batch:
+                    self.found.emit(batch)
+                pos = end
+                self.progress.emit(int(pos * 100 / size))
+
+class LogViewer(QDialog):
+    def __init__(self, log_fp, parent=None):
+        super().__init__(parent)
+        self.log_fp = log_fp
+        self.setWindowTitle("WebUI Logs")
+        self.resize(1000, 600)
+        self.index = None
+        self.index_worker = None
+        self.filter_worker = None
+        self.unpack_worker = None
+        self.matches = None
+        # Unpacked rotated logs, removed with the viewer.
+        self.unpack_dir = tempfile.TemporaryDirectory(prefix="webui-logs-")
+
+        self.file_box = QComboBox()
+        self.level_box = QComboBox()
+        self.level_box.addItems(LEVELS.keys())
+        self.regex_edit = QLineEdit()
+        self.regex_edit.setPlaceholderText("Regex filter")
+        self.apply_button = QPushButton("Filter")
+        self.follow_box = QCheckBox("Follow")
+        self.follow_box.setChecked(True)
+        self.goto_box = QSpinBox()
+        self.goto_box.setPrefix("Line ")
+        self.status = QLabel()
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.text.setFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        self.text.viewport().installEventFilter(self)
+        self.scroll = QScrollBar(Qt.Vertical)
+
+        controls = QHBoxLayout()
+        controls.addWidget(self.file_box)
+        controls.addWidget(self.level_box)
+        controls.addWidget(self.regex_edit, 1)
+        controls.addWidget(self.apply_button)
+        controls.addWidget(self.goto_box)
+        controls.addWidget(self.follow_box)
+        body = QHBoxLayout()
+        body.addWidget(self.text, 1)
+        body.addWidget(self.scroll)
+        layout = QVBoxLayout()
+        layout.addLayout(controls)
+        layout.addLayout(body, 1)
+        layout.addWidget(self.status)
+        self.setLayout(layout)
+
+        self.file_box.currentIndexChanged.connect(self.open_selected)
+        self.apply_button.clicked.connect(self.apply_filter)
+        self.regex_edit.returnPressed.connect(self.apply_filter)
+        self.level_box.currentIndexChanged.connect(self.apply_filter)
+        self.scroll.valueChanged.connect(self.render)
+        self.goto_box.editingFinished.connect(self.goto_line)
+
+        for path in log_files(self.log_fp):
+            self.file_box.addItem(path.name, str(path))
+
+    def page_size(self):
+        return max(1, self.text.viewport().height() // self.text.fontMetrics().lineSpacing())
+
+    def row_count(self):
+        if self.matches is not None:
+            return len(self.matches)
+        return self.index.line_count if self.index else 0
+
+    def open_selected(self):
+        self.stop_workers()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        self.matches = None
+        self.text.clear()
+        path = pathlib.Path(self.file_box.currentData())
+        if path.suffix != ".gz":
+            self.open_index(path)
+            return
+        # Backups are renamed on every rotation, the modification time tells which one was unpacked.
+        target = pathlib.Path(self.unpack_dir.name) / f"{path.stem}.{path.stat().st_mtime_ns}"
+        if target.exists():
+            self.open_index(target)
+            return
+        self.unpack_worker = UnpackWorker(path, target, self)
+        self.unpack_worker.progress.connect(lambda pct: self.status.setText(f"Unpacking {path.name}... {pct}%"))
+        self.unpack_worker.unpacked.connect(self.on_unpacked)
+        self.unpack_worker.failed.connect(self.status.setText)
+        self.unpack_worker.start()
+
+    def on_unpacked(self, path):
+        # Queued signals from a worker for a file that is no longer selected are ignored.
+        if self.sender() is self.unpack_worker:
+            self.open_index(path)
+
+    def open_index(self, path):
+        self.unpack_worker = None
+        self.index = LineIndex(path)
+        self.index_worker = IndexWorker(self.index, self)
+        self.index_worker.updated.connect(self.on_index_updated)
+        self.index_worker.start()
+        self.apply_filter()
+
+    def stop_workers(self):
+        for worker in (self.unpack_worker, self.index_worker, self.filter_worker):
+            if worker is not None:
+                worker.requestInterruption()
+                worker.wait()
+        self.unpack_worker = None
+        self.index_worker = None
+        self.filter_worker = None
+
+    def apply_filter(self):
+        if self.index is None:
+            return
+        if self.filter_worker is not None:
+            self.filter_worker.requestInterruption()
+            self.filter_worker.wait()
+            self.filter_worker = None
+        pattern = self.regex_edit.text()
+        min_level = LEVELS[self.level_box.currentText()]
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            self.status.setText(f"Invalid regex: {e}")
+            return
+        if not pattern and not min_level:
+            self.matches = None
+            self.on_index_updated()
+            return
+        self.matches = array("Q")
+        self.filter_worker = FilterWorker(self.index.path, pattern, min_level, self)
+        self.filter_worker.found.connect(self.on_matches)
+        self.filter_worker.progress.connect(lambda pct: self.status.setText(f"Filtering... {pct}%"))
+        self.filter_worker.start()
+        self.on_index_updated()
+
+    def on_matches(self, batch):
+        self.matches.extend(batch)
+        self.on_index_updated()
+
+    def on_index_updated(self):
+        rows = self.row_count()
+        at_end = self.scroll.value() >= self.scroll.maximum()
+        self.scroll.setRange(0, max(0, rows - self.page_size()))
+        self.scroll.setPageStep(self.page_size())
+        self.goto_box.setRange(1, max(1, self.index.line_count if self.index else 1))
+        if self.follow_box.isChecked() and at_end:
+            self.scroll.setValue(self.scroll.maximum())
+        self.render()
+        if self.index is not None and not self.index.fully_indexed:
+            self.status.setText(f"Indexing... {self.index.progress() * 100:.0f}%")
+        elif self.filter_worker is None or self.filter_worker.isFinished():
+            self.status.setText(f"{rows} lines")
+
+    def render(self):
+        if self.index is None:
+            return
+        first = self.scroll.value()
+        count = self.page_size()
+        if self.matches is None:
+            lines = self.index.read_lines(first, count)
+        else:
+            lines = [self.index.read_line(n) for n in self.matches[first:first + count]]
+        self.text.setPlainText("\n".join(lines))
+
+    def goto_line(self):
+        line = self.goto_box.value() - 1
+        if self.matches is not None:
+            # Jump to the first match at or after the requested line.
+            row = bisect.bisect_left(self.matches, line)
+        else:
+            row = line
+        self.follow_box.setChecked(False)
+        self.scroll.setValue(row)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Wheel:
+            self.scroll.setValue(self.scroll.value() - event.angleDelta().y() // 40)
+            return True
+        return super().eventFilter(obj, event)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.index is not None:
+            self.on_index_updated()
+
+    def done(self, result):
+        self.stop_workers()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+        self.unpack_dir.cleanup()
+        super().done(result)
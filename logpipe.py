@@ -0,0 +1,212 @@
+import logging.handlers, threading, atexit, queue, gzip, shutil, time, sys, os, pathlib
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%m/%d/%Y %I:%M:%S %p'
+BATCH_SIZE = 512
+
+def compress(source, target):
+    tmp = target.with_suffix(".gz.tmp")
+    with open(source, "rb") as src, gzip.open(tmp, "wb", compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp, target)
+    os.unlink(source)
+
+class RotatingLog:
+    # One output file, rotated by size or age into <name>.1.gz ... <name>.<backups>.gz.
+    def __init__(self, path, max_bytes=0, interval=0, backups=5):
+        self.path = pathlib.Path(path)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backups = backups
+        self._compressor = None
+        self._open()
+
+    def backup(self, n, compressed=True):
+        return self.path.with_name(f"{self.path.name}.{n}" + (".gz" if compressed else ""))
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.stream = open(self.path, "ab")
+        self.size = self.stream.tell()
+        try:
+            last_rotation = self.backup(1).stat().st_mtime
+        except FileNotFoundError:
+            last_rotation = time.time()
+        self.rollover_at = last_rotation + self.interval if self.interval else None
+
+    def write(self, data):
+        self.stream.write(data)
+        self.size += len(data)
+
+    def flush(self):
+        self.stream.flush()
+        if (self.max_bytes and self.size >= self.max_bytes) or \
+                (self.rollover_at is not None and time.time() >= self.rollover_at):
+            self.rotate()
+
+    def rotate(self):
+        self.stream.close()
+        if self._compressor is not None:
+            self._compressor.join()
+        for n in range(self.backups - 1, 0, -1):
+            if self.backup(n).exists():
+                os.replace(self.backup(n), self.backup(n + 1))
+        if self.backups:
+            os.replace(self.path, self.backup(1, compressed=False))
+            # Compressing a large file would hold up every other writer, so it happens on the side.
+            self._compressor = threading.Thread(target=compress, args=(self.backup(1, compressed=False), self.backup(1)),
+                                                name="webui-log-compress", daemon=True)
+            self._compressor.start()
+        else:
+            self.path.unlink()
+        self._open()
+        self.rollover_at = time.time() + self.interval if self.interval else None
+
+    def close(self):
+        self.stream.close()
+        if self._compressor is not None:
+            self._compressor.join()
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # Never blocks the thread that logs, which may be the tray's Qt thread. While child output has the queue
+    # full, records are dropped and counted instead, and the writer reports the count once it catches up.
+    def __init__(self, record_queue):
+        super().__init__(record_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        # Called from handle(), which holds self.lock.
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def take_dropped(self):
+        with self.lock:
+            dropped, self.dropped = self.dropped, 0
+        return dropped
+
+class LogPipeline:
+    # Everything bound for a log file, records and raw child output alike, goes through one queue and
+    # is written by a single thread in batches with one flush per batch.
+    def __init__(self, log_fp, max_bytes=10 * 1024 * 1024, interval=0, backups=5, console=sys.stderr,
+                 maxsize=4096):
+        self.log_fp = pathlib.Path(log_fp)
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.backups = backups
+        self.console = console
+        # Bounded, so a flood of child output blocks its reader thread (and the child) instead of using memory.
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.formatter = logging.Formatter(LOG_FORMAT, DATE_FORMAT)
+        self.files = {}
+        self.handler = _QueueHandler(self.queue)
+        self._thread = threading.Thread(target=self._run, name="webui-log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, path, data):
+        self.queue.put((str(path), data))
+
+    def sink(self, path):
+        return lambda data: self.write(path, data)
+
+    def flush(self):
+        self.queue.join()
+
+    def stop(self):
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(10)
+
+    def _file(self, path):
+        log = self.files.get(path)
+        if log is None:
+            log = self.files[path] = RotatingLog(path, self.max_bytes, self.interval, self.backups)
+        return log
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            touched = set()
+            console = []
+            for item in batch:
+                try:
+                    if item is None:
+                        stopping = True
+                    elif isinstance(item, logging.LogRecord):
+                        log = self._file(str(self.log_fp))
+                        log.write((self.formatter.format(item) + "\n").encode("utf-8", errors="replace"))
+                        touched.add(log)
+                        console.append(item.getMessage())
+                    else:
+                        path, data = item
+                        log = self._file(path)
+                        log.write(data)
+                        touched.add(log)
+                except Exception as e:
+                    sys.stderr.write(f"Log writer error: {e}\n")
+            dropped = self.handler.take_dropped()
+            if dropped:
+                record = logging.makeLogRecord({"levelno": logging.WARNING, "levelname": "WARNING",
+                                                "msg": f"{dropped} log records were dropped while the log queue was full."})
+                log = self._file(str(self.log_fp))
+                log.write((self.formatter.format(record) + "\n").encode("utf-8"))
+                touched.add(log)
+                console.append(record.getMessage())
+            for log in touched:
+                try:
+                    log.flush()
+                except OSError as e:
+                    sys.stderr.write(f"Could not write or rotate {log.path}: {e}\n")
+            if console and self.console is not None:
+                self.console.write("\n".join(console) + "\n")
+                self.console.flush()
+            for _ in batch:
+                self.queue.task_done()
+        for log in self.files.values():
+            log.close()
+
+class PipeReader(threading.Thread):
+    # Drains a child's stdout into the pipeline. on_lines, when given, receives each chunk's complete lines
+    # as one string, which keeps per-line overhead off the hot path.
+    def __init__(self, stream, sink, on_lines=None, name="webui-pipe-reader"):
+        super().__init__(name=name, daemon=True)
+        self.stream = stream
+        self.sink = sink
+        self.on_lines = on_lines
+        self._partial = b""
+
+    def run(self):
+        fd = self.stream.fileno()
+        try:
+            while True:
+                data = os.read(fd, 65536)
+                if not data:
+                    break
+                self.sink(data)
+                if self.on_lines is not None:
+                    data = self._partial + data
+                    end = data.rfind(b"\n")
+                    if end == -1:
+                        self._partial = data
+                        continue
+                    self._partial = data[end + 1:]
+                    self.on_lines(data[:end].decode("utf-8", errors="replace"))
+        finally:
+            if self._partial and self.on_lines is not None:
+                self.on_lines(self._partial.decode("utf-8", errors="replace"))
+            self.stream.close()
+
+def setup_logging(log_fp, level, max_bytes, interval, backups):
+    pipeline = LogPipeline(log_fp, max_bytes=max_bytes, interval=interval, backups=backups)
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(pipeline.handler)
+    atexit.register(pipeline.stop)
+    return pipeline
@@ -0,0 +1,180 @@
+import http.server, threading, time
+from collections import deque
+from http_proxy import Forwarder, ProxyRequest
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+PROGRESS_REQUEST = ProxyRequest("GET", "/sdapi/v1/progress?skip_current_image=true", [], b"")
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def render(families):
+    # families: (name, type, help, [(labels, value), ...]) in Prometheus text exposition format.
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_text = ",".join(f'{key}="{escape(val)}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {float(value)!r}" if label_text else f"{name} {float(value)!r}")
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+class GenerationStats:
+    # Turns successive /sdapi/v1/progress snapshots of one server into step and batch counters.
+    def __init__(self, window=30.0):
+        self.window = window
+        self.up = False
+        self.active = False
+        self.job_batches = 0
+        self.steps = 0
+        self.batches = 0
+        self.interrupted = 0
+        self._job = None
+        self._step = 0
+        self._steps_in_job = 0
+        self._history = deque()
+
+    def update(self, progress, now):
+        state = progress.get("state", {})
+        job = (state.get("job_timestamp"), state.get("job_no")) if state.get("job_count") else None
+        step = int(state.get("sampling_step") or 0)
+        if job != self._job:
+            if self._job is not None:
+                # The previous batch finished between samples, count the steps we did not see.
+                if state.get("interrupted") or state.get("skipped"):
+                    self.interrupted += 1
+                else:
+                    self.steps += max(self._steps_in_job - self._step, 0)
+                    self.batches += 1
+            self._step = 0
+        if job is not None:
+            # A hires fix second pass restarts the step counter within the same batch.
+            self.steps += step - self._step if step >= self._step else step
+            self._step = step
+            self._steps_in_job = int(state.get("sampling_steps") or 0)
+        self._job = job
+        self.active = job is not None
+        self.job_batches = int(state.get("job_count") or 0)
+        self._history.append((now, self.steps, self.batches))
+        while self._history and now - self._history[0][0] > self.window:
+            self._history.popleft()
+
+    def rates(self):
+        if len(self._history) < 2:
+            return 0.0, 0.0
+        (start, steps, batches), (end, last_steps, last_batches) = self._history[0], self._history[-1]
+        elapsed = end - start
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (last_steps - steps) / elapsed, (last_batches - batches) / elapsed
+
+class ProgressSampler(threading.Thread):
+    # Polls each running server's progress API at a fixed interval, scrapes only read the cached counters.
+    def __init__(self, targets, interval=2.0, window=30.0, timeout=2.0, log=None):
+        super().__init__(name="webui-progress-sampler", daemon=True)
+        self.targets = targets
+        self.interval = interval
+        self.window = window
+        self.timeout = timeout
+        self.log = log
+        self.stats = {}
+        self._forwarders = {}
+        self._stopping = threading.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def sample(self, port):
+        forwarder = self._forwarders.get(port)
+        if forwarder is None:
+            forwarder = self._forwarders[port] = Forwarder("127.0.0.1", port, timeout=self.timeout)
+        stats = self.stats.get(port)
+        if stats is None:
+            stats = self.stats[port] = GenerationStats(self.window)
+        try:
+            response = forwarder(PROGRESS_REQUEST)
+            stats.up = response.status == 200
+            if stats.up:
+                stats.update(response.json(), time.monotonic())
+        except Exception as e:
+            if stats.up and self.log:
+                self.log.debug(f"Progress API on port {port} stopped answering: {e}")
+            stats.up = False
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            for port, ready in self.targets():
+                if ready:
+                    self.sample(port)
+                elif port in self.stats:
+                    self.stats[port].up = False
+                    self.stats[port].active = False
+
+    def families(self):
+        stats = list(self.stats.items())
+        rates = {port: s.rates() for port, s in stats}
+        return [
+            ("webui_progress_api_up", "gauge", "Whether the WebUI progress API answered the last sample.",
+             [({"port": port}, s.up) for port, s in stats]),
+            ("webui_generation_active", "gauge", "Whether the WebUI is generating right now.",
+             [({"port": port}, s.active) for port, s in stats]),
+            ("webui_job_batches", "gauge", "Batches in the job the WebUI is running, 0 when idle.",
+             [({"port": port}, s.job_batches) for port, s in stats]),
+            ("webui_generation_steps_total", "counter", "Sampling steps completed.",
+             [({"port": port}, s.steps) for port, s in stats]),
+            ("webui_generation_batches_total", "counter", "Batches of images completed.",
+             [({"port": port}, s.batches) for port, s in stats]),
+            ("webui_generation_interrupted_total", "counter", "Batches interrupted or skipped.",
+             [({"port": port}, s.interrupted) for port, s in stats]),
+            ("webui_generation_iterations_per_second", "gauge",
+             f"Sampling steps per second over the last {self.window:.0f}s.",
+             [({"port": port}, rates[port][0]) for port, s in stats]),
+            ("webui_generation_batches_per_second", "gauge",
+             f"Completed batches per second over the last {self.window:.0f}s.",
+             [({"port": port}, rates[port][1]) for port, s in stats]),
+        ]
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = render(self.server.collect())
+        except Exception as e:
+            if self.server.log:
+                self.server.log.error(f"Could not collect metrics: {e}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port, collect, log=None):
+        self.collect = collect
+        self.log = log
+        # Only ever bound to loopback, the metrics reveal what is being generated and when.
+        super().__init__(("127.0.0.1", port), _MetricsHandler)
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="webui-metrics", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
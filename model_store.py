@@ -0,0 +1,219 @@
+import threading, hashlib, shutil, fcntl, errno, json, time, os, pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+MODEL_EXTENSIONS = {".safetensors", ".ckpt", ".pt", ".pth", ".bin", ".onnx", ".gguf"}
+LINK_MODES = ("hardlink", "reflink", "symlink")
+CHUNK_SIZE = 16 * 1024 * 1024
+# ioctl(dest_fd, FICLONE, src_fd) shares extents on btrfs/xfs/bcachefs without copying data.
+FICLONE = 0x40049409
+
+def hash_file(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+def reflink(src, dst):
+    with open(src, "rb") as source, open(dst, "wb") as dest:
+        try:
+            fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+        except OSError:
+            dest.close()
+            os.unlink(dst)
+            raise
+
+def model_files(models_dir):
+    for dirpath, _, filenames in os.walk(models_dir):
+        for filename in filenames:
+            path = pathlib.Path(dirpath) / filename
+            if path.suffix.lower() in MODEL_EXTENSIONS and not path.is_symlink():
+                yield path
+
+class ModelStore:
+    def __init__(self, store_dir, link_mode="auto", workers=4, chunk_size=CHUNK_SIZE, log=None):
+        if link_mode != "auto" and link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode {link_mode}, expected auto or one of {', '.join(LINK_MODES)}")
+        self.store_dir = pathlib.Path(store_dir)
+        self.objects_dir = self.store_dir / "objects"
+        self.index_fp = self.store_dir / "index.json"
+        self.link_mode = link_mode
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.log = log
+        self._lock = threading.Lock()
+        self.files, self.objects = self._load_index()
+        self.stats = {"hashed": 0, "hashed_bytes": 0, "hash_seconds": 0.0, "reused_hashes": 0, "adopted": 0,
+                      "deduplicated": 0, "bytes_saved": 0, "linked": 0, "links": {mode: 0 for mode in LINK_MODES}}
+
+    def _load_index(self):
+        try:
+            with open(self.index_fp, "r") as f:
+                index = json.load(f)
+            return index.get("files", {}), index.get("objects", {})
+        except (OSError, ValueError):
+            return {}, {}
+
+    def save_index(self):
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        tmp_fp = self.index_fp.with_suffix(".tmp")
+        with open(tmp_fp, "w") as f:
+            json.dump({"files": self.files, "objects": self.objects}, f, indent=1)
+        os.replace(tmp_fp, self.index_fp)
+
+    def object_path(self, digest, suffix):
+        return self.objects_dir / digest[:2] / f"{digest}{suffix}"
+
+    def _remember(self, path, digest):
+        st = os.stat(path)
+        with self._lock:
+            self.files[str(path)] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+
+    def _known_digest(self, path):
+        # Size and mtime unchanged means the content is too, so the file is never read again.
+        entry = self.files.get(str(path))
+        if entry is None:
+            return None
+        st = os.stat(path)
+        if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return entry["sha256"]
+        return None
+
+    def _hash(self, path):
+        started = time.monotonic()
+        digest = hash_file(path, self.chunk_size)
+        size = os.path.getsize(path)
+        self._remember(path, digest)
+        with self._lock:
+            self.stats["hashed"] += 1
+            self.stats["hashed_bytes"] += size
+            self.stats["hash_seconds"] += time.monotonic() - started
+        if self.log:
+            self.log.debug(f"Hashed {path} ({size / 2**30:.1f} GiB) in {time.monotonic() - started:.1f}s.")
+        return digest
+
+    def hash_files(self, paths):
+        digests = {}
+        pending = []
+        for path in paths:
+            digest = self._known_digest(path)
+            if digest is None:
+                pending.append(path)
+            else:
+                digests[path] = digest
+                self.stats["reused_hashes"] += 1
+        # sha256 drops the GIL on large updates, so whole files hash in parallel on separate cores.
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for path, digest in zip(pending, pool.map(self._hash, pending)):
+                digests[path] = digest
+        return digests
+
+    def _link_once(self, mode, src, dst):
+        if mode == "hardlink":
+            os.link(src, dst)
+        elif mode == "reflink":
+            reflink(src, dst)
+        else:
+            os.symlink(src, dst)
+
+    def link(self, src, dst):
+        # Built next to dst and renamed over it, so an interrupted run never leaves a model missing.
+        dst = pathlib.Path(dst)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.link-tmp")
+        if tmp.exists() or tmp.is_symlink():
+            tmp.unlink()
+        modes = LINK_MODES if self.link_mode == "auto" else (self.link_mode,)
+        for mode in modes:
+            try:
+                self._link_once(mode, src, tmp)
+            except OSError as e:
+                if mode == modes[-1]:
+                    raise
+                if self.log:
+                    self.log.debug(f"{mode} {src} -> {dst} not possible ({e.strerror}), trying the next method.")
+                continue
+            os.replace(tmp, dst)
+            self.stats["links"][mode] += 1
+            return mode
+
+    def _add_to_store(self, path, target):
+        # The original stays where it is until the store holds its own copy, link() then swaps it for a link.
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            if self.log:
+                self.log.info(f"Copying {path.name} into the store on another filesystem.")
+            tmp = target.with_suffix(target.suffix + ".tmp")
+            shutil.copy2(path, tmp)
+            os.replace(tmp, target)
+        os.chmod(target, os.stat(target).st_mode & ~0o222)
+
+    def adopt(self, models_dir):
+        models_dir = pathlib.Path(models_dir)
+        paths = list(model_files(models_dir))
+        for path, digest in self.hash_files(paths).items():
+            target = self.object_path(digest, path.suffix)
+            category = str(path.parent.relative_to(models_dir))
+            if not target.exists():
+                self._add_to_store(path, target)
+                self.stats["adopted"] += 1
+            elif os.path.samefile(path, target):
+                continue
+            else:
+                self.stats["deduplicated"] += 1
+                self.stats["bytes_saved"] += target.stat().st_size
+            self.objects.setdefault(digest, {"name": path.name, "category": category,
+                                             "size": target.stat().st_size, "suffix": path.suffix})
+            if self.link_mode in ("auto", "hardlink") and os.path.samefile(path, target):
+                # Hardlinked into the store, the original already is the stored object.
+                self.stats["links"]["hardlink"] += 1
+            else:
+                self.link(target, path)
+            self._remember(target, digest)
+            if not path.is_symlink():
+                self._remember(path, digest)
+        return len(paths)
+
+    def populate(self, models_dir):
+        # Gives an install every model the store knows about that it does not have under that name yet.
+        models_dir = pathlib.Path(models_dir)
+        linked = 0
+        for digest, info in self.objects.items():
+            target = self.object_path(digest, info.get("suffix", ""))
+            dst = models_dir / info["category"] / info["name"]
+            if not target.exists() or dst.exists() or dst.is_symlink():
+                continue
+            if self.link(target, dst) != "symlink":
+                self._remember(dst, digest)
+            linked += 1
+        self.stats["linked"] += linked
+        return linked
+
+    def sync(self, installs):
+        started = time.monotonic()
+        models_dirs = [pathlib.Path(install) / "models" for install in installs]
+        models_dirs = [models_dir for models_dir in models_dirs if models_dir.is_dir()]
+        try:
+            for models_dir in models_dirs:
+                self.adopt(models_dir)
+            for models_dir in models_dirs:
+                self.populate(models_dir)
+        finally:
+            self.save_index()
+        if self.log:
+            rate = self.stats["hashed_bytes"] / self.stats["hash_seconds"] / 2**20 if self.stats["hash_seconds"] else 0
+            self.log.info(f"Model store: {len(self.objects)} unique models, {self.stats['adopted']} adopted, "
+                          f"{self.stats['deduplicated']} duplicates replaced ({self.stats['bytes_saved'] / 2**30:.1f} GiB "
+                          f"freed), {self.stats['linked']} linked into other installs, {self.stats['hashed']} hashed "
+                          f"({rate:.0f} MiB/s per thread) and {self.stats['reused_hashes']} reused from the index "
+                          f"in {time.monotonic() - started:.1f}s.")
+        return self.stats
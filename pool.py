@@ -0,0 +1,134 @@
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from supervisor import Supervisor
+from readiness import probe_port
+from http_proxy import Forwarder, ProxyResponse
+
+VISIBLE_DEVICES = {"NVIDIA": "CUDA_VISIBLE_DEVICES", "AMD": "HIP_VISIBLE_DEVICES"}
+# Settings and the loaded checkpoint must match on every instance, or a result depends on which one answers.
+BROADCAST_PATHS = {"/sdapi/v1/options", "/sdapi/v1/reload-checkpoint", "/sdapi/v1/unload-checkpoint",
+                   "/sdapi/v1/refresh-checkpoints"}
+
+class PoolInstance:
+    def __init__(self, index, port, env, log_fp):
+        self.index = index
+        self.port = port
+        self.env = env
+        self.log_fp = log_fp
+        self.readiness = None
+        self.supervisor = None
+        self.forwarder = Forwarder("127.0.0.1", port)
+        # Requests the balancer has sent there and not had an answer for. The progress API has no queue length,
+        # its job_count is the batch count of the running job.
+        self.in_flight = 0
+        self.healthy = False
+        self.served = 0
+
+    def state(self):
+        if self.supervisor is not None and self.supervisor.state != "Running":
+            return self.supervisor.state
+        if self.healthy:
+            return "Ready"
+        return self.readiness.state if self.readiness is not None else "Starting"
+
+class InstancePool:
+    def __init__(self, runner, size, gpu_vendor, headless=False, health_interval=2.0):
+        self.runner = runner
+        self.headless = headless
+        self.health_interval = health_interval
+        self.instances = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._health = None
+        self.last_stop = None
+        device_var = VISIBLE_DEVICES.get(gpu_vendor)
+        for index in range(size):
+            env = {device_var: str(index)} if device_var else {}
+            log_fp = runner.data_dir / f"webui-gpu{index}.log"
+            self.instances.append(PoolInstance(index, runner.backend_port + index, env, log_fp))
+
+    def start(self):
+        for instance in self.instances:
+            instance.supervisor = Supervisor(
+                lambda instance=instance: self.runner.spawn_webui(True, self.headless, instance=instance),
+                history_fp=self.runner.runs_fp, max_crashes=self.runner.max_crashes,
+                crash_window=self.runner.crash_window, log=self.runner.log)
+            instance.supervisor.start()
+        if self._health is None or not self._health.is_alive():
+            self._health = threading.Thread(target=self._health_watch, name="webui-pool-health", daemon=True)
+            self._health.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._stop_instances()
+
+    def _stop_instances(self):
+        # Instances are stopped side by side, each close waits for its own group, port and VRAM.
+        closers = []
+        for instance in self.instances:
+            instance.supervisor.stop()
+            proc = instance.supervisor.proc
+            if proc is not None and proc.poll() is None:
+                closer = threading.Thread(target=self.runner.close, args=(proc.pid, instance.port), daemon=True)
+                closer.start()
+                closers.append(closer)
+        for closer in closers:
+            closer.join()
+        self.last_stop = time.monotonic()
+
+    def restart(self):
+        self._stop_instances()
+        for instance in self.instances:
+            instance.supervisor.join(60)
+        self.start()
+
+    def is_alive(self):
+        return any(instance.supervisor.is_alive() for instance in self.instances)
+
+    def _health_watch(self):
+        while not self._stopping.wait(self.health_interval):
+            for instance in self.instances:
+                running = instance.supervisor.proc is not None and instance.supervisor.proc.poll() is None
+                instance.healthy = running and probe_port("127.0.0.1", instance.port)
+
+    def pick(self):
+        with self._lock:
+            healthy = [instance for instance in self.instances if instance.healthy]
+            if not healthy:
+                return None
+            instance = min(healthy, key=lambda i: (i.in_flight, i.served))
+            instance.in_flight += 1
+            instance.served += 1
+            return instance
+
+    def release(self, instance):
+        with self._lock:
+            instance.in_flight -= 1
+
+    def broadcast(self, request):
+        instances = [instance for instance in self.instances if instance.healthy]
+        if not instances:
+            return ProxyResponse.error(503, "No WebUI instance is ready yet.")
+        with ThreadPoolExecutor(max_workers=len(instances)) as executor:
+            responses = list(executor.map(lambda instance: instance.forwarder(request), instances))
+        return next((response for response in responses if response.status != 200), responses[0])
+
+    def __call__(self, request):
+        if request.method == "POST" and request.path.split("?")[0] in BROADCAST_PATHS:
+            return self.broadcast(request)
+        instance = self.pick()
+        if instance is None:
+            return ProxyResponse.error(503, "No WebUI instance is ready yet.")
+        try:
+            return instance.forwarder(request)
+        finally:
+            self.release(instance)
+
+    def stats(self):
+        return [{
+            "gpu": instance.index,
+            "port": instance.port,
+            "state": instance.state(),
+            "in_flight": instance.in_flight,
+            "served": instance.served,
+        } for instance in self.instances]
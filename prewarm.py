@@ -0,0 +1,199 @@
+import threading, statistics, ctypes, json, mmap, time, os, re, pathlib
+
+CHUNK_SIZE = 8 * 1024 * 1024
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+# sd_model_checkpoint is stored as "<relative path> [<short hash>]".
+CHECKPOINT_TITLE = re.compile(r"^(.*?)(?:\s+\[[0-9a-f]+\])?$")
+VAE_UNSET = {"", "None", "Automatic"}
+# A launch counts as cold for the baseline when less than this share of the model was already cached.
+COLD_RESIDENCY = 0.1
+
+_libc = ctypes.CDLL(None, use_errno=True)
+_libc.mmap.restype = ctypes.c_void_p
+_libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long]
+_libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+_libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte)]
+
+def meminfo():
+    values = {}
+    with open("/proc/meminfo") as f:
+        for line in f:
+            key, value = line.split(":", 1)
+            values[key] = int(value.split()[0]) * 1024
+    return values
+
+def resident_pages(path):
+    # mincore() on a read-only shared mapping, which does not fault anything in. One byte per page.
+    size = os.path.getsize(path)
+    if size == 0:
+        return bytearray()
+    pages = (size + PAGE_SIZE - 1) // PAGE_SIZE
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        addr = _libc.mmap(None, size, mmap.PROT_READ, mmap.MAP_SHARED, fd, 0)
+        if addr in (None, ctypes.c_void_p(-1).value):
+            raise OSError(ctypes.get_errno(), f"mmap failed for {path}")
+        try:
+            vec = (ctypes.c_ubyte * pages)()
+            if _libc.mincore(addr, size, vec) != 0:
+                raise OSError(ctypes.get_errno(), f"mincore failed for {path}")
+            return bytearray(vec)
+        finally:
+            _libc.munmap(addr, size)
+    finally:
+        os.close(fd)
+
+def residency(pages):
+    if not pages:
+        return 1.0
+    return sum(page & 1 for page in pages) / len(pages)
+
+def resolve_models(webui_dir, configured=None):
+    # An explicit list wins, otherwise whatever the WebUI itself will load first from config.json.
+    webui_dir = pathlib.Path(webui_dir)
+    if configured:
+        paths = [pathlib.Path(name) for name in configured.split(":") if name]
+        return [path if path.is_absolute() else webui_dir / "models" / "Stable-diffusion" / path for path in paths]
+    try:
+        with open(webui_dir / "config.json") as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        config = {}
+    models = []
+    checkpoint = config.get("sd_model_checkpoint")
+    if checkpoint:
+        models.append(webui_dir / "models" / "Stable-diffusion" / CHECKPOINT_TITLE.match(checkpoint).group(1))
+    else:
+        # Without a saved choice the WebUI picks among all checkpoints, only guess when there is one.
+        candidates = [path for suffix in ("*.safetensors", "*.ckpt")
+                      for path in (webui_dir / "models" / "Stable-diffusion").rglob(suffix)]
+        if len(candidates) == 1:
+            models.append(candidates[0])
+    vae = config.get("sd_vae")
+    if vae and vae not in VAE_UNSET:
+        models.append(webui_dir / "models" / "VAE" / vae)
+    return [path for path in models if path.is_file()]
+
+def cached_fraction(files):
+    total = sum(info["size"] for info in files.values())
+    if not total:
+        return None
+    return sum(info["size"] * info["resident_before"] for info in files.values()) / total
+
+def baseline_model_load(timings_fp, limit=20):
+    # Median model load time of recent startups whose model files were not in the page cache beforehand.
+    # Nothing being warmed does not mean a cold start, the files are often still cached from the last run.
+    durations = []
+    try:
+        with open(timings_fp) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("outcome") != "ready" or "model_load" not in entry.get("phases", {}):
+                    continue
+                cached = cached_fraction(entry.get("prewarm", {}).get("files", {}))
+                if cached is None or cached >= COLD_RESIDENCY:
+                    continue
+                durations.append(entry["phases"]["model_load"])
+    except OSError:
+        return None
+    return statistics.median(durations[-limit:]) if durations else None
+
+class Prewarmer(threading.Thread):
+    def __init__(self, paths, rate=512 * 1024 * 1024, reserve=1024 * 1024 * 1024, timings_fp=None, log=None):
+        super().__init__(name="webui-prewarm", daemon=True)
+        self.paths = paths
+        self.rate = rate
+        self.reserve = reserve
+        self.timings_fp = timings_fp
+        self.log = log
+        self.files = {}
+        self.warmed_bytes = 0
+        self.seconds = 0.0
+        self.stopped_for_memory = False
+        self._stop_requested = threading.Event()
+
+    def stop(self):
+        self._stop_requested.set()
+
+    def progress(self):
+        files = self.files
+        total = sum(info["size"] for info in files.values())
+        done = sum(info["size"] * info["resident_before"] for info in files.values()) + self.warmed_bytes
+        return min(done / total, 1.0) if total else 1.0
+
+    def _memory_allows(self, length):
+        # Only fill genuinely free memory. Reading past MemFree would start evicting pages somebody else,
+        # including a running server, is using, MemAvailable counts those as reclaimable.
+        return meminfo()["MemFree"] - length > self.reserve
+
+    def _warm(self, path, pages):
+        size = os.path.getsize(path)
+        pages_per_chunk = CHUNK_SIZE // PAGE_SIZE
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            for offset in range(0, size, CHUNK_SIZE):
+                if self._stop_requested.is_set():
+                    return
+                first = offset // PAGE_SIZE
+                if all(page & 1 for page in pages[first:first + pages_per_chunk]):
+                    continue
+                length = min(CHUNK_SIZE, size - offset)
+                if not self._memory_allows(length):
+                    self.stopped_for_memory = True
+                    if self.log:
+                        self.log.info(f"Prewarm stopped at {offset / size:.0%} of {path.name}, free memory is "
+                                      f"below the {self.reserve / 2**20:.0f} MiB reserve.")
+                    return
+                started = time.monotonic()
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+                self.warmed_bytes += length
+                if self.rate:
+                    # Pace readahead submissions so the I/O rate stays bounded.
+                    remaining = length / self.rate - (time.monotonic() - started)
+                    if remaining > 0:
+                        self._stop_requested.wait(remaining)
+        finally:
+            os.close(fd)
+
+    def run(self):
+        started = time.monotonic()
+        pages = {}
+        files = {}
+        for path in self.paths:
+            try:
+                pages[path] = resident_pages(path)
+            except OSError as e:
+                if self.log:
+                    self.log.warning(f"Could not check page cache residency of {path}: {e}")
+                continue
+            files[str(path)] = {"size": os.path.getsize(path), "resident_before": residency(pages[path])}
+        # Published in one go, progress() and the status command read it from other threads.
+        self.files = files
+        for path in self.paths:
+            info = self.files.get(str(path))
+            if info is None or info["resident_before"] == 1.0 or self.stopped_for_memory:
+                continue
+            self._warm(path, pages[path])
+            info["resident_after"] = residency(resident_pages(path))
+        self.seconds = time.monotonic() - started
+        if self.log:
+            self.log.info(f"Prewarmed {self.warmed_bytes / 2**20:.0f} MiB of model files in {self.seconds:.1f}s: "
+                          + ", ".join(f"{pathlib.Path(p).name} {i['resident_before']:.0%} -> "
+                                      f"{i.get('resident_after', i['resident_before']):.0%} resident"
+                                      for p, i in self.files.items()))
+
+    def annotate(self, entry):
+        # Adds the prewarm outcome and the estimated saving to a readiness timing record.
+        report = {"files": self.files, "warmed_bytes": self.warmed_bytes, "seconds": self.seconds,
+                  "stopped_for_memory": self.stopped_for_memory}
+        model_load = entry.get("phases", {}).get("model_load")
+        baseline = baseline_model_load(self.timings_fp) if self.timings_fp else None
+        if model_load is not None and baseline is not None:
+            report["model_load_baseline"] = baseline
+            report["seconds_saved"] = baseline - model_load
+            if self.log:
+                self.log.info(f"Model load took {model_load:.1f}s against a {baseline:.1f}s median without prewarm.")
+        entry["prewarm"] = report
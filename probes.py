@@ -0,0 +1,137 @@
+import subprocess, threading, hashlib, shutil, json, time, os, pathlib
+from concurrent.futures import ThreadPoolExecutor
+
+ROCM_SMI_PATH = "/opt/rocm/bin/rocm-smi"
+DRIVER_VERSION_FILES = ["/proc/driver/nvidia/version", "/sys/module/amdgpu/version"]
+
+def default_cache_fp():
+    cache_home = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache_home) / "webui-desktop-app" / "probes.json"
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def _read_digest(path):
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
+    except OSError:
+        return None
+
+def probe_conda(timeout=60):
+    try:
+        output = subprocess.check_output(["conda", "info", "--json"], stderr=subprocess.DEVNULL, timeout=timeout)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+    try:
+        # Warnings or a plugin banner in front of the JSON make conda's output unreadable.
+        info = json.loads(output.decode("utf-8"))
+    except ValueError:
+        return None
+    return {
+        "version": info.get("conda_version"),
+        "root_prefix": info.get("root_prefix") or info.get("conda_prefix"),
+        "envs": info.get("envs", []),
+    }
+
+def probe_gpu(timeout=30):
+    try:
+        output = subprocess.check_output(["nvidia-smi", "--query-gpu=name,driver_version", "--format=csv,noheader"],
+                                         universal_newlines=True, stderr=subprocess.DEVNULL, timeout=timeout)
+        gpus = [line.split(",")[0].strip() for line in output.splitlines() if line.strip()]
+        driver = output.splitlines()[0].split(",")[-1].strip() if gpus else None
+        return {"vendor": "NVIDIA", "tool": shutil.which("nvidia-smi"), "names": gpus, "driver": driver}
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, FileNotFoundError):
+        pass
+
+    rocm_smi = shutil.which("rocm-smi") or (ROCM_SMI_PATH if os.access(ROCM_SMI_PATH, os.X_OK) else None)
+    if rocm_smi:
+        try:
+            output = subprocess.check_output([rocm_smi, "--showproductname", "--json"],
+                                             universal_newlines=True, stderr=subprocess.DEVNULL, timeout=timeout)
+            cards = json.loads(output)
+            gpus = [card.get("Card series") or card.get("Card SKU") or name for name, card in cards.items()
+                    if name.startswith("card")]
+            return {"vendor": "AMD", "tool": rocm_smi, "names": gpus, "driver": None}
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError):
+            pass
+    return None
+
+class EnvironmentProbe:
+    PROBES = {"conda": probe_conda, "gpu": probe_gpu}
+
+    def __init__(self, cache_fp=None, log=None):
+        self.cache_fp = pathlib.Path(cache_fp or default_cache_fp())
+        self.log = log
+        self._results = None
+        self._lock = threading.Lock()
+
+    def fingerprint(self):
+        # Cheap stat()s only: anything that changes what conda or the GPU tools would report.
+        conda = shutil.which("conda") or os.environ.get("CONDA_EXE")
+        conda_base = pathlib.Path(os.path.realpath(conda)).parent.parent if conda else None
+        return {
+            "path": os.environ.get("PATH", ""),
+            "conda_prefix": os.environ.get("CONDA_PREFIX"),
+            "conda": conda,
+            "conda_mtime": _mtime(conda) if conda else None,
+            "conda_envs_mtime": _mtime(conda_base / "envs") if conda_base else None,
+            "conda_meta_mtime": _mtime(conda_base / "conda-meta") if conda_base else None,
+            "environments_txt_mtime": _mtime(pathlib.Path.home() / ".conda" / "environments.txt"),
+            "nvidia_smi": shutil.which("nvidia-smi"),
+            "rocm_smi": shutil.which("rocm-smi") or (ROCM_SMI_PATH if os.path.exists(ROCM_SMI_PATH) else None),
+            "drivers": {path: _read_digest(path) for path in DRIVER_VERSION_FILES},
+        }
+
+    def _load(self, fingerprint):
+        try:
+            with open(self.cache_fp, "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("fingerprint") != fingerprint:
+            return None
+        return cached.get("results")
+
+    def _save(self, fingerprint, results):
+        try:
+            self.cache_fp.parent.mkdir(parents=True, exist_ok=True)
+            tmp_fp = self.cache_fp.with_suffix(".tmp")
+            with open(tmp_fp, "w") as f:
+                json.dump({"fingerprint": fingerprint, "created": time.time(), "results": results}, f)
+            os.replace(tmp_fp, self.cache_fp)
+        except OSError as e:
+            if self.log:
+                self.log.warning(f"Could not write probe cache {self.cache_fp}: {e}")
+
+    def run_probes(self):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=len(self.PROBES)) as pool:
+            futures = {name: pool.submit(probe) for name, probe in self.PROBES.items()}
+            results = {name: future.result() for name, future in futures.items()}
+        if self.log:
+            self.log.debug(f"Environment probes took {time.monotonic() - started:.2f}s.")
+        return results
+
+    def results(self, refresh=False):
+        with self._lock:
+            fingerprint = self.fingerprint()
+            if not refresh and self._results is not None and self._results[0] == fingerprint:
+                return self._results[1]
+            results = None if refresh else self._load(fingerprint)
+            if results is None:
+                results = self.run_probes()
+                self._save(fingerprint, results)
+            self._results = (fingerprint, results)
+            return results
+
+    def invalidate(self):
+        with self._lock:
+            self._results = None
+            try:
+                self.cache_fp.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,134 @@
+import socket, threading, time, json, re
+
+# Lines printed by webui.sh / launch.py that mark the start of each startup phase.
+PHASE_MARKERS = [
+    ("venv_activated", re.compile(r"Launching launch\.py|python venv already activate")),
+    ("model_load_started", re.compile(r"Loading weights|Creating model from config")),
+    ("model_loaded", re.compile(r"Model loaded in")),
+    ("port_bound", re.compile(r"Running on local URL")),
+]
+
+STATES = {
+    "spawned": "Activating venv",
+    "venv_activated": "Starting server",
+    "model_load_started": "Loading model",
+    "model_loaded": "Binding port",
+    "port_bound": "Ready",
+}
+
+def probe_port(host, port, timeout=0.5):
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+class ReadinessWatcher(threading.Thread):
+    def __init__(self, host, port, proc=None, timings_fp=None, spawn_started=None, timeout=600.0,
+                 interval=0.5, log=None):
+        super().__init__(name="webui-readiness", daemon=True)
+        self.host = host
+        self.port = port
+        self.proc = proc
+        self.timings_fp = timings_fp
+        self.timeout = timeout
+        self.interval = interval
+        self.log = log
+        self.started_at = spawn_started if spawn_started is not None else time.monotonic()
+        self.marks = {"spawned": time.monotonic() - self.started_at}
+        self.state = STATES["spawned"]
+        self.ready = threading.Event()
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+        self._stop_requested = threading.Event()
+        # Callables that add fields to the timing record before it is written.
+        self.annotations = []
+
+    def feed_line(self, line):
+        for phase, pattern in PHASE_MARKERS:
+            if phase not in self.marks and pattern.search(line):
+                self.mark(phase)
+
+    def mark(self, phase):
+        with self._lock:
+            if phase in self.marks:
+                return
+            self.marks[phase] = time.monotonic() - self.started_at
+            self.state = STATES.get(phase, self.state)
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def time_to_ready(self):
+        return self.marks.get("ready")
+
+    def stop(self):
+        self._stop_requested.set()
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def run(self):
+        outcome = "timeout"
+        while not self._stop_requested.is_set() and self.elapsed() < self.timeout:
+            if probe_port(self.host, self.port):
+                self.mark("port_bound")
+                outcome = "ready"
+                break
+            if self.proc is not None and self.proc.poll() is not None:
+                outcome = "exited"
+                break
+            self._stop_requested.wait(self.interval)
+        else:
+            if self._stop_requested.is_set():
+                outcome = "stopped"
+
+        with self._lock:
+            if outcome == "ready":
+                self.marks["ready"] = self.elapsed()
+                self.state = STATES["port_bound"]
+                self.ready.set()
+            elif outcome == "exited":
+                self.state = f"Exited ({self.proc.returncode})"
+            elif outcome == "timeout":
+                self.state = "Timed out"
+            else:
+                self.state = "Stopped"
+        self.record(outcome)
+        self.done.set()
+
+    def phase_durations(self):
+        marks = self.marks
+        durations = {}
+        if "venv_activated" in marks:
+            durations["venv_activation"] = marks["venv_activated"] - marks["spawned"]
+        if "model_load_started" in marks and "model_loaded" in marks:
+            durations["model_load"] = marks["model_loaded"] - marks["model_load_started"]
+        if "port_bound" in marks:
+            durations["port_bind"] = marks["port_bound"] - marks.get("model_loaded", marks["spawned"])
+        return durations
+
+    def record(self, outcome):
+        entry = {
+            "timestamp": time.time(),
+            "outcome": outcome,
+            "host": self.host,
+            "port": self.port,
+            "marks": self.marks,
+            "phases": self.phase_durations(),
+        }
+        for annotate in self.annotations:
+            annotate(entry)
+        if self.log:
+            if outcome == "ready":
+                self.log.info(f"WebUI ready after {self.marks['ready']:.1f}s: {entry['phases']}")
+            else:
+                self.log.warning(f"WebUI did not become ready ({outcome}) after {self.elapsed():.1f}s.")
+        if not self.timings_fp:
+            return
+        try:
+            with open(self.timings_fp, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            if self.log:
+                self.log.error(f"Could not save startup timings to {self.timings_fp}: {e}")
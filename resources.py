@@ -0,0 +1,182 @@
+import subprocess, threading, time, json, os
+from collections import deque
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+def read_stat(pid):
+    with open(f"/proc/{pid}/stat", "rb") as f:
+        data = f.read()
+    # The command name may contain spaces or parentheses, everything after the last ')' is fixed.
+    fields = data[data.rindex(b")") + 2:].split()
+    return {
+        "state": fields[0].decode(),
+        "pgrp": int(fields[2]),
+        "ticks": int(fields[11]) + int(fields[12]),
+        "threads": int(fields[17]),
+        "rss": int(fields[21]) * PAGE_SIZE,
+    }
+
+def read_io(pid):
+    io = {}
+    try:
+        with open(f"/proc/{pid}/io", "r") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("read_bytes", "write_bytes"):
+                    io[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return io
+
+def group_stats(pgid):
+    stats = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            stat = read_stat(entry)
+        except (OSError, ValueError, IndexError):
+            continue
+        if stat["pgrp"] == pgid:
+            stat.update(read_io(entry))
+            stats[int(entry)] = stat
+    return stats
+
+def nvidia_usage(tool, pids, timeout=10):
+    usage = {"gpu_util": None, "vram_used": 0, "vram_total": 0, "vram_group": 0}
+    output = subprocess.check_output([tool, "--query-gpu=utilization.gpu,memory.used,memory.total",
+                                      "--format=csv,noheader,nounits"], universal_newlines=True, timeout=timeout)
+    utils = []
+    for line in output.splitlines():
+        util, used, total = (float(value) for value in line.split(","))
+        utils.append(util)
+        usage["vram_used"] += used * 1024 * 1024
+        usage["vram_total"] += total * 1024 * 1024
+    usage["gpu_util"] = max(utils) if utils else None
+    output = subprocess.check_output([tool, "--query-compute-apps=pid,used_memory", "--format=csv,noheader,nounits"],
+                                     universal_newlines=True, timeout=timeout)
+    for line in output.splitlines():
+        pid, _, used = line.partition(",")
+        if pid.strip().isdigit() and int(pid) in pids:
+            usage["vram_group"] += float(used) * 1024 * 1024
+    return usage
+
+def rocm_usage(tool, pids, timeout=10):
+    # rocm-smi has no reliable per-process VRAM figure, so report device totals only.
+    usage = {"gpu_util": None, "vram_used": 0, "vram_total": 0, "vram_group": None}
+    output = subprocess.check_output([tool, "--showuse", "--showmeminfo", "vram", "--json"],
+                                     universal_newlines=True, timeout=timeout)
+    utils = []
+    for name, card in json.loads(output).items():
+        if not name.startswith("card"):
+            continue
+        for key, value in card.items():
+            if key.startswith("GPU use"):
+                utils.append(float(value))
+            elif key.startswith("VRAM Total Used Memory"):
+                usage["vram_used"] += float(value)
+            elif key.startswith("VRAM Total Memory"):
+                usage["vram_total"] += float(value)
+    usage["gpu_util"] = max(utils) if utils else None
+    return usage
+
+GPU_READERS = {"NVIDIA": nvidia_usage, "AMD": rocm_usage}
+
+class ResourceSampler(threading.Thread):
+    def __init__(self, pgid_source, gpu_source=None, interval=2.0, gpu_interval=10.0, history=1800, log=None):
+        super().__init__(name="webui-resources", daemon=True)
+        self.pgid_source = pgid_source
+        self.gpu_source = gpu_source
+        self.gpu = None
+        self.interval = interval
+        self.gpu_interval = gpu_interval
+        self.samples = deque(maxlen=history)
+        self.log = log
+        self._stopping = threading.Event()
+        self._gpu_usage = {}
+        self._gpu_sampled = 0.0
+        self._previous = None
+
+    def stop(self):
+        self._stopping.set()
+
+    def latest(self):
+        return self.samples[-1] if self.samples else None
+
+    def _sample_gpu(self, pids):
+        # GPU tools are slow to start, so they run on their own, longer interval and the value is reused.
+        now = time.monotonic()
+        reader = GPU_READERS.get(self.gpu["vendor"]) if self.gpu else None
+        if reader is None or now - self._gpu_sampled < self.gpu_interval:
+            return self._gpu_usage
+        self._gpu_sampled = now
+        try:
+            self._gpu_usage = reader(self.gpu["tool"], pids)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, ValueError) as e:
+            if self.log:
+                self.log.debug(f"GPU sampling failed: {e}")
+            self._gpu_usage = {}
+        return self._gpu_usage
+
+    def sample(self):
+        pgid = self.pgid_source()
+        if pgid is None:
+            self._previous = None
+            return None
+        now = time.monotonic()
+        stats = group_stats(pgid)
+        ticks = sum(stat["ticks"] for stat in stats.values())
+        cpu = None
+        if self._previous is not None and self._previous[0] == pgid:
+            elapsed = now - self._previous[1]
+            cpu = max(0.0, (ticks - self._previous[2]) / CLK_TCK / elapsed * 100) if elapsed > 0 else None
+        self._previous = (pgid, now, ticks)
+        sample = {
+            "time": time.time(),
+            "pgid": pgid,
+            "processes": len(stats),
+            "cpu": cpu,
+            "rss": sum(stat["rss"] for stat in stats.values()),
+            "threads": sum(stat["threads"] for stat in stats.values()),
+            "read_bytes": sum(stat.get("read_bytes", 0) for stat in stats.values()),
+            "write_bytes": sum(stat.get("write_bytes", 0) for stat in stats.values()),
+        }
+        sample.update(self._sample_gpu(set(stats)))
+        self.samples.append(sample)
+        return sample
+
+    def run(self):
+        # Resolved here rather than in the launch path, a cold probe cache means running nvidia-smi.
+        if self.gpu_source is not None:
+            try:
+                self.gpu = self.gpu_source()
+            except Exception as e:
+                if self.log:
+                    self.log.warning(f"Could not detect GPU for resource sampling: {e}")
+        while not self._stopping.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                if self.log:
+                    self.log.error(f"Resource sampling failed: {e}")
+
+def format_bytes(value):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+def summary(sample):
+    parts = []
+    if sample.get("cpu") is not None:
+        parts.append(f"CPU {sample['cpu']:.0f}%")
+    parts.append(f"RAM {format_bytes(sample['rss'])}")
+    if sample.get("vram_group"):
+        parts.append(f"VRAM {format_bytes(sample['vram_group'])}")
+    elif sample.get("vram_used") and sample.get("vram_total"):
+        parts.append(f"VRAM {format_bytes(sample['vram_used'])}/{format_bytes(sample['vram_total'])}")
+    if sample.get("gpu_util") is not None:
+        parts.append(f"GPU {sample['gpu_util']:.0f}%")
+    return "  ".join(parts)
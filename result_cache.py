@@ -0,0 +1,191 @@
+import threading, hashlib, time, json, os, pathlib
+from collections import OrderedDict
+from http_proxy import ProxyRequest, ProxyResponse
+
+CACHEABLE_PATHS = {"/sdapi/v1/txt2img", "/sdapi/v1/img2img"}
+STATS_PATH = "/cache/stats"
+OPTIONS_REQUEST = ProxyRequest("GET", "/sdapi/v1/options", [], b"")
+# POSTs that can change the loaded checkpoint, the cached hash is dropped once they are forwarded.
+MODEL_CHANGE_PATHS = {"/sdapi/v1/options", "/sdapi/v1/reload-checkpoint", "/sdapi/v1/unload-checkpoint",
+                      "/sdapi/v1/refresh-checkpoints"}
+
+def is_deterministic(payload):
+    # Malformed seeds are passed through uncached, the WebUI decides what to make of them.
+    try:
+        if int(payload.get("seed", -1)) == -1:
+            return False
+        # A random subseed only changes the output when it is actually blended in.
+        if float(payload.get("subseed_strength", 0) or 0) > 0 and int(payload.get("subseed", -1)) == -1:
+            return False
+    except (TypeError, ValueError, AttributeError):
+        return False
+    return True
+
+class ResultCache:
+    def __init__(self, upstream, cache_dir, max_bytes, checkpoint_ttl=30.0, log=None):
+        self.upstream = upstream
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.checkpoint_ttl = checkpoint_ttl
+        self.log = log
+        self._index = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._checkpoint = (None, 0.0)
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.bytes_served = 0
+        self.gpu_seconds_saved = 0.0
+        self._load_index()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                with open(path, "rb") as f:
+                    meta = json.loads(f.readline())
+                entries.append((path.stat().st_mtime, path.stem, path.stat().st_size, meta.get("elapsed", 0.0)))
+            except (OSError, ValueError):
+                continue
+        for _, key, size, elapsed in sorted(entries):
+            self._index[key] = (size, elapsed)
+            self._bytes += size
+        self._evict()
+
+    def checkpoint_hash(self):
+        value, fetched = self._checkpoint
+        if value is not None and time.monotonic() - fetched < self.checkpoint_ttl:
+            return value
+        response = self.upstream(OPTIONS_REQUEST)
+        if response.status != 200:
+            return None
+        options = response.json()
+        value = options.get("sd_checkpoint_hash") or options.get("sd_model_checkpoint")
+        self._checkpoint = (value, time.monotonic())
+        return value
+
+    def key(self, path, payload, checkpoint):
+        canonical = json.dumps({"path": path, "checkpoint": checkpoint, "payload": payload},
+                               sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            self._index.move_to_end(key)
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                f.readline()
+                body = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                if self._index.pop(key, None) is not None:
+                    self._bytes -= entry[0]
+            return None
+        return body, entry[1]
+
+    def _put(self, key, body, elapsed):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(json.dumps({"elapsed": elapsed}).encode("utf-8") + b"\n")
+            f.write(body)
+        os.replace(tmp_path, path)
+        size = path.stat().st_size
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[0]
+            self._index[key] = (size, elapsed)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._index:
+            key, (size, _) = self._index.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def __call__(self, request):
+        path = request.path.split("?")[0]
+        if request.method == "GET" and path == STATS_PATH:
+            return ProxyResponse.from_json(self.stats())
+        if request.method == "POST" and path in MODEL_CHANGE_PATHS:
+            try:
+                return self.upstream(request)
+            finally:
+                self._checkpoint = (None, 0.0)
+        if request.method != "POST" or path not in CACHEABLE_PATHS:
+            return self.upstream(request)
+        try:
+            payload = request.json()
+        except ValueError:
+            return self.upstream(request)
+        if not is_deterministic(payload):
+            return self._bypass(request)
+        try:
+            checkpoint = self.checkpoint_hash()
+        except Exception as e:
+            if self.log:
+                self.log.warning(f"Could not read the active checkpoint, not caching: {e}")
+            checkpoint = None
+        if checkpoint is None:
+            return self._bypass(request)
+
+        key = self.key(path, payload, checkpoint)
+        cached = self._get(key)
+        if cached is not None:
+            body, elapsed = cached
+            with self._lock:
+                self.hits += 1
+                self.bytes_served += len(body)
+                self.gpu_seconds_saved += elapsed
+            return ProxyResponse(200, [("Content-Type", "application/json"), ("X-Cache", "HIT")], body)
+
+        started = time.monotonic()
+        response = self.upstream(request)
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self.misses += 1
+        if response.status == 200:
+            try:
+                self._put(key, response.body, elapsed)
+            except OSError as e:
+                if self.log:
+                    self.log.warning(f"Could not store result in cache: {e}")
+        return response
+
+    def _bypass(self, request):
+        with self._lock:
+            self.bypassed += 1
+        return self.upstream(request)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._index),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "bytes_served": self.bytes_served,
+                "gpu_seconds_saved": self.gpu_seconds_saved,
+            }
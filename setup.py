@@ -1,12 +1,16 @@
 from utils import Setup, os
+from model_store import ModelStore
 from dotenv import load_dotenv, set_key
 load_dotenv()
 
 setup = Setup()
 
 def create_symlinks(setup:Setup):
-    setup.root.parent / "stablility-diffusion-"
-    
+    # Every install's models/ tree points into one content-addressed store, so each checkpoint is kept once.
+    store = ModelStore(setup.model_store_dir, link_mode=setup.model_link_mode,
+                       workers=setup.model_hash_workers, log=setup.log)
+    return store.sync(setup.model_installs)
+
 LOGLEVEL = int(os.environ["WEBUI_LOGLEVEL"])
 HEADLESS = os.environ["WEBUI_HEADLESS"]
 
@@ -18,6 +22,7 @@ if __name__ == "__main__":
         cont = setup.webui_sh_first_run_conda()
         set_key(".env", "WEBUI_INSTALLATION_SUCCESS", "True")
     if cont:
+        create_symlinks(setup)
         setup.main()
     if not cont:
         print("Conda first run failed, please check logs and try again.")
\ No newline at end of file
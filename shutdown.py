@@ -0,0 +1,102 @@
+import subprocess, signal, time, os
+from resources import read_stat, group_stats
+from readiness import probe_port
+
+def alive(pid):
+    # A zombie has released its memory, GPU context and sockets, so it counts as gone.
+    try:
+        return read_stat(pid)["state"] != "Z"
+    except (OSError, ValueError, IndexError):
+        return False
+
+def nvidia_holders(tool, pids, timeout=5):
+    output = subprocess.check_output([tool, "--query-compute-apps=pid", "--format=csv,noheader"],
+                                     universal_newlines=True, timeout=timeout)
+    return {int(line) for line in output.split() if line.strip().isdigit()} & set(pids)
+
+class ShutdownCoordinator:
+    def __init__(self, grace=30.0, kill_grace=10.0, gpu_source=None, interval=0.05, gpu_interval=0.5, log=None):
+        self.grace = grace
+        self.kill_grace = kill_grace
+        self.gpu_source = gpu_source
+        self.interval = interval
+        # Each GPU check runs nvidia-smi, which takes tens of milliseconds of CPU, so it is polled far less often.
+        self.gpu_interval = gpu_interval
+        self.log = log
+
+    def _wait(self, condition, deadline, interval=None):
+        while not condition():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(interval or self.interval)
+        return True
+
+    def _signal(self, pgid, pids, own_group, sig):
+        try:
+            if own_group:
+                # A terminal-wrapped child shares our process group, only the child itself is signalled.
+                for pid in pids:
+                    os.kill(pid, sig)
+            else:
+                os.killpg(pgid, sig)
+        except ProcessLookupError:
+            pass
+
+    def stop(self, pid, host="127.0.0.1", port=None):
+        started = time.monotonic()
+        result = {"pid": pid, "escalated": False, "exited": None, "port_free": None, "gpu_free": None}
+        try:
+            pgid = os.getpgid(pid)
+        except ProcessLookupError:
+            result["total"] = 0.0
+            return result
+        own_group = pgid == os.getpgrp()
+        # Remember every member up front, workers keep running (and holding VRAM) after the leader exits.
+        snapshot = {pid} if own_group else set(group_stats(pgid)) | {pid}
+
+        def remaining():
+            members = set() if own_group else {member for member, stat in group_stats(pgid).items()
+                                               if stat["state"] != "Z"}
+            return members | {member for member in snapshot if alive(member)}
+
+        self._signal(pgid, [pid], own_group, signal.SIGTERM)
+        if not self._wait(lambda: not remaining(), started + self.grace):
+            left = remaining()
+            result["escalated"] = True
+            if self.log:
+                self.log.warning(f"WebUI processes {sorted(left)} still running after {self.grace:.0f}s, "
+                                 f"sending SIGKILL.")
+            self._signal(pgid, left, own_group, signal.SIGKILL)
+            if not own_group:
+                for member in left:
+                    try:
+                        os.kill(member, signal.SIGKILL)
+                    except ProcessLookupError:
+                        pass
+            if not self._wait(lambda: not remaining(), time.monotonic() + self.kill_grace) and self.log:
+                self.log.error(f"WebUI processes {sorted(remaining())} survived SIGKILL.")
+        result["exited"] = time.monotonic() - started
+
+        deadline = time.monotonic() + self.kill_grace
+        if port is not None:
+            if self._wait(lambda: not probe_port(host, port, timeout=0.2), deadline):
+                result["port_free"] = time.monotonic() - started
+            elif self.log:
+                self.log.warning(f"Port {port} is still in use after stopping the WebUI.")
+
+        gpu = self.gpu_source() if self.gpu_source else None
+        if gpu and gpu.get("vendor") == "NVIDIA" and gpu.get("tool"):
+            try:
+                if self._wait(lambda: not nvidia_holders(gpu["tool"], snapshot), deadline, self.gpu_interval):
+                    result["gpu_free"] = time.monotonic() - started
+                elif self.log:
+                    self.log.warning("GPU memory is still held by stopped WebUI processes.")
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+                if self.log:
+                    self.log.debug(f"Could not check GPU memory release: {e}")
+
+        result["total"] = time.monotonic() - started
+        if self.log:
+            self.log.info(f"WebUI stopped in {result['total']:.2f}s"
+                          + (" after escalating to SIGKILL." if result["escalated"] else "."))
+        return result
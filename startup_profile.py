@@ -0,0 +1,312 @@
+import threading, json, time, os, re, pathlib
+from collections import Counter, defaultdict
+
+# Put on the child's PYTHONPATH, so every Python started by webui.sh samples its own stacks until the
+# stop file appears. Stacks are folded root first, one "file:function" per frame.
+SITECUSTOMIZE = '''import threading, atexit, json, time, sys, os
+_dir = os.path.dirname(os.path.abspath(__file__))
+_interval = float(os.environ.get("WEBUI_PROFILE_INTERVAL", "0.01"))
+_deadline = time.monotonic() + float(os.environ.get("WEBUI_PROFILE_SECONDS", "900"))
+_stop_fp = os.path.join(_dir, "stop")
+# Leaf frames of threads that are only waiting, they would otherwise dominate every profile.
+_IDLE = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"),
+         ("socket.py", "accept"), ("queue.py", "get"), ("socketserver.py", "serve_forever")}
+_stacks = {}
+_state = {"ticks": 0, "started": time.time(), "ended": None}
+
+def _dump():
+    if _state["ended"] is not None:
+        return
+    _state["ended"] = time.time()
+    data = {"pid": os.getpid(), "argv": sys.argv, "interval": _interval, "ticks": _state["ticks"],
+            "started": _state["started"], "ended": _state["ended"], "stacks": dict(_stacks)}
+    target = os.path.join(_dir, "samples-%d.json" % os.getpid())
+    with open(target + ".tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(target + ".tmp", target)
+
+def _sample():
+    me = threading.get_ident()
+    next_check = 0.0
+    while True:
+        now = time.monotonic()
+        if now >= next_check:
+            if now >= _deadline or os.path.exists(_stop_fp):
+                break
+            next_check = now + 0.5
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE:
+                continue
+            stack = []
+            while frame is not None and len(stack) < 128:
+                stack.append(frame.f_code.co_filename + ":" + frame.f_code.co_name)
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            _stacks[key] = _stacks.get(key, 0) + 1
+        _state["ticks"] += 1
+        time.sleep(_interval)
+    _dump()
+
+atexit.register(_dump)
+threading.Thread(target=_sample, name="webui-startup-profiler", daemon=True).start()
+
+# Hand over to a sitecustomize further down the path, ours shadows it.
+try:
+    import importlib.machinery, importlib.util
+    _spec = importlib.machinery.PathFinder.find_spec(
+        "sitecustomize", [p for p in sys.path if os.path.abspath(p or ".") != _dir])
+    if _spec is not None:
+        _spec.loader.exec_module(importlib.util.module_from_spec(_spec))
+except Exception:
+    pass
+'''
+
+IMPORT_TIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|( *)(\S.*)")
+# AUTO1111 prints one summary line, e.g. "Startup time: 12.3s (import torch: 2.4s, load scripts: 2.1s, ...)".
+STARTUP_TIME = re.compile(r"Startup time: ([\d.]+)s \((.*)\)")
+STARTUP_PHASE = re.compile(r"([^,:]+): ([\d.]+)s")
+EXTENSION_PATH = re.compile(r"/(extensions(?:-builtin)?)/([^/]+)/")
+TOP = 25
+
+def parse_import_times(lines):
+    imports = []
+    for line in lines:
+        match = IMPORT_TIME.match(line)
+        if match:
+            imports.append({"name": match.group(4).strip(), "self": int(match.group(1)) / 1e6,
+                            "cumulative": int(match.group(2)) / 1e6, "depth": (len(match.group(3)) - 1) // 2})
+    return imports
+
+def parse_startup_phases(lines):
+    phases = {}
+    for line in lines:
+        match = STARTUP_TIME.search(line)
+        if match:
+            phases = {"total": float(match.group(1))}
+            phases.update((name.strip(), float(seconds)) for name, seconds in STARTUP_PHASE.findall(match.group(2)))
+    return phases
+
+def git_revision(repo):
+    # Reads .git directly, running git for every extension would add seconds of its own.
+    git_dir = pathlib.Path(repo) / ".git"
+    try:
+        head = (git_dir / "HEAD").read_text().strip()
+        if not head.startswith("ref: "):
+            return head[:10]
+        ref = head[5:]
+        if (git_dir / ref).exists():
+            return (git_dir / ref).read_text().strip()[:10]
+        for line in (git_dir / "packed-refs").read_text().splitlines():
+            if line.endswith(" " + ref):
+                return line.split()[0][:10]
+    except OSError:
+        pass
+    return None
+
+def short_path(path, webui_dir):
+    webui_dir = str(webui_dir) + os.sep
+    if path.startswith(webui_dir):
+        return path[len(webui_dir):]
+    if "site-packages" + os.sep in path:
+        return path.split("site-packages" + os.sep, 1)[1]
+    return os.path.basename(path)
+
+def load_samples(profile_dir):
+    # The launcher process has the most samples, pip and git helpers started by webui.sh are ignored.
+    dumps = []
+    for path in pathlib.Path(profile_dir).glob("samples-*.json"):
+        try:
+            with open(path) as f:
+                dumps.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return max(dumps, key=lambda dump: sum(dump["stacks"].values()), default=None)
+
+def analyse_stacks(dump, webui_dir):
+    # Each sample stands for one tick of wall time in one thread.
+    weight = (dump["ended"] - dump["started"]) / max(dump["ticks"], 1)
+    extensions = Counter()
+    functions = Counter()
+    for stack, count in dump["stacks"].items():
+        frames = stack.split(";")
+        for frame in frames:
+            match = EXTENSION_PATH.search(frame)
+            if match:
+                extensions[(match.group(1), match.group(2))] += count
+                break
+        path, _, function = frames[-1].rpartition(":")
+        functions[f"{short_path(path, webui_dir)}:{function}"] += count
+    return {
+        "extensions": {name: {"seconds": count * weight, "builtin": kind == "extensions-builtin",
+                              "revision": git_revision(pathlib.Path(webui_dir) / kind / name)}
+                       for (kind, name), count in extensions.most_common()},
+        "functions": [{"name": name, "seconds": count * weight} for name, count in functions.most_common(TOP)],
+        "samples": {"pid": dump["pid"], "argv": dump["argv"], "ticks": dump["ticks"],
+                    "duration": dump["ended"] - dump["started"], "interval": dump["interval"]},
+    }
+
+def build_report(import_lines, output_lines, samples, webui_dir, readiness=None):
+    imports = parse_import_times(import_lines)
+    packages = defaultdict(float)
+    for entry in imports:
+        packages[entry["name"].split(".")[0]] += entry["self"]
+    report = {
+        "timestamp": time.time(),
+        "time_to_ready": readiness.time_to_ready() if readiness is not None else None,
+        "launcher_phases": readiness.phase_durations() if readiness is not None else {},
+        "webui_phases": parse_startup_phases(output_lines),
+        "imports": {
+            "total": sum(entry["self"] for entry in imports),
+            "slowest": sorted(imports, key=lambda entry: entry["cumulative"], reverse=True)[:TOP],
+            "packages": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True)[:TOP]),
+        },
+        "extensions": {},
+        "functions": [],
+        "samples": None,
+    }
+    if samples is not None:
+        report.update(analyse_stacks(samples, webui_dir))
+    return report
+
+def changes(previous, current, limit=10):
+    # Largest moves first, so a slow extension update is at the top of the comparison.
+    deltas = [(name, current.get(name, 0.0) - previous.get(name, 0.0)) for name in set(previous) | set(current)]
+    return sorted(deltas, key=lambda item: abs(item[1]), reverse=True)[:limit]
+
+def format_report(report, previous=None):
+    lines = [f"Startup profile {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(report['timestamp']))}"]
+    if report["time_to_ready"] is not None:
+        lines.append(f"Ready after {report['time_to_ready']:.1f}s")
+    lines += ["", "Startup phases"]
+    phases = dict(report["launcher_phases"], **report["webui_phases"])
+    lines += [f"  {seconds:8.2f}s  {name}" for name, seconds in phases.items()]
+    lines += ["", "Extensions (sampled wall time in their code)"]
+    lines += [f"  {ext['seconds']:8.2f}s  {name}" + (f" @ {ext['revision']}" if ext["revision"] else "")
+              for name, ext in report["extensions"].items()]
+    lines += ["", f"Slowest imports (cumulative, {report['imports']['total']:.2f}s importing in total)"]
+    lines += [f"  {entry['cumulative']:8.2f}s  {entry['name']}"
+              for entry in report["imports"]["slowest"]]
+    lines += ["", "Import time by package"]
+    lines += [f"  {seconds:8.2f}s  {name}" for name, seconds in report["imports"]["packages"].items()]
+    lines += ["", "Hottest functions (sampled self time)"]
+    lines += [f"  {entry['seconds']:8.2f}s  {entry['name']}" for entry in report["functions"]]
+    if previous is not None:
+        lines += ["", f"Compared with {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(previous['timestamp']))}"]
+        if report["time_to_ready"] is not None and previous.get("time_to_ready") is not None:
+            lines.append(f"  {report['time_to_ready'] - previous['time_to_ready']:+8.2f}s  time to ready")
+        old_phases = dict(previous["launcher_phases"], **previous["webui_phases"])
+        lines += [f"  {delta:+8.2f}s  phase {name}" for name, delta in changes(old_phases, phases, 5)]
+        old_extensions = previous["extensions"]
+        for name, delta in changes({k: v["seconds"] for k, v in old_extensions.items()},
+                                   {k: v["seconds"] for k, v in report["extensions"].items()}):
+            old = old_extensions.get(name, {}).get("revision")
+            new = report["extensions"].get(name, {}).get("revision")
+            updated = f" ({old or 'new'} -> {new or 'removed'})" if old != new else ""
+            lines.append(f"  {delta:+8.2f}s  extension {name}{updated}")
+        lines += [f"  {delta:+8.2f}s  package {name}"
+                  for name, delta in changes(previous["imports"]["packages"], report["imports"]["packages"], 5)]
+    return "\n".join(lines) + "\n"
+
+class ImportTimeSplitter:
+    # Sits between the child's stdout and webui.log, keeping the import trace out of the log.
+    def __init__(self, sink, import_fp):
+        self.sink = sink
+        self.import_fp = import_fp
+        self.output = []
+        self._partial = b""
+        self._file = open(import_fp, "ab")
+
+    def __call__(self, data):
+        data = self._partial + data
+        end = data.rfind(b"\n")
+        if end == -1:
+            self._partial = data
+            return
+        self._partial = data[end + 1:]
+        kept = []
+        for line in data[:end + 1].splitlines(keepends=True):
+            if line.startswith(b"import time:"):
+                self._file.write(line)
+            else:
+                kept.append(line)
+                if line.startswith(b"Startup time:"):
+                    self.output.append(line.decode("utf-8", errors="replace"))
+        if kept:
+            self.sink(b"".join(kept))
+
+    def flush(self):
+        # The trace stays on for the child's lifetime, later lazy imports keep landing in the file.
+        self._file.flush()
+
+class StartupProfiler:
+    def __init__(self, profiles_dir, webui_dir, interval=0.01, settle=120.0, timeout=900.0, log=None):
+        self.webui_dir = webui_dir
+        self.interval = interval
+        self.settle = settle
+        self.timeout = timeout
+        self.log = log
+        self.profiles_dir = pathlib.Path(profiles_dir)
+        self.profile_dir = self.profiles_dir / time.strftime("%Y%m%d-%H%M%S")
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        (self.profile_dir / "sitecustomize.py").write_text(SITECUSTOMIZE)
+        self.splitter = None
+        self.report_fp = None
+
+    def env(self):
+        python_path = os.environ.get("PYTHONPATH")
+        return {
+            "PYTHONPATH": str(self.profile_dir) + (os.pathsep + python_path if python_path else ""),
+            "PYTHONPROFILEIMPORTTIME": "1",
+            "WEBUI_PROFILE_INTERVAL": str(self.interval),
+            "WEBUI_PROFILE_SECONDS": str(self.timeout),
+        }
+
+    def sink(self, sink):
+        self.splitter = ImportTimeSplitter(sink, self.profile_dir / "importtime.log")
+        return self.splitter
+
+    def watch(self, readiness):
+        threading.Thread(target=self._finish, args=(readiness,), name="webui-startup-profile", daemon=True).start()
+
+    def previous(self):
+        reports = sorted(path for path in self.profiles_dir.glob("*/report.json") if path.parent != self.profile_dir)
+        if not reports:
+            return None
+        try:
+            with open(reports[-1]) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _finish(self, readiness):
+        readiness.done.wait(self.timeout)
+        if readiness.ready.is_set():
+            # Newer WebUI versions load the model after the port is bound, give it time to finish.
+            deadline = time.monotonic() + self.settle
+            while "model_loaded" not in readiness.marks and time.monotonic() < deadline and \
+                    (readiness.proc is None or readiness.proc.poll() is None):
+                time.sleep(0.5)
+        (self.profile_dir / "stop").touch()
+        deadline = time.monotonic() + 10
+        while not any(self.profile_dir.glob("samples-*.json")) and time.monotonic() < deadline:
+            time.sleep(0.2)
+        self.splitter.flush()
+        try:
+            with open(self.profile_dir / "importtime.log", errors="replace") as f:
+                import_lines = f.readlines()
+            report = build_report(import_lines, self.splitter.output, load_samples(self.profile_dir),
+                                  self.webui_dir, readiness)
+            previous = self.previous()
+            with open(self.profile_dir / "report.json", "w") as f:
+                json.dump(report, f, indent=2)
+            self.report_fp = self.profile_dir / "report.txt"
+            self.report_fp.write_text(format_report(report, previous))
+        except Exception as e:
+            if self.log:
+                self.log.error(f"Could not build the startup profile in {self.profile_dir}: {e}")
+            return
+        if self.log:
+            self.log.info(f"Startup profile written to {self.report_fp}.")
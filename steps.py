@@ -0,0 +1,220 @@
+import subprocess, threading, hashlib, shlex, json, time, os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DONE = ("done", "unchanged")
+
+def file_digest(path):
+    if os.path.isdir(path):
+        return "directory"
+    try:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except FileNotFoundError:
+        return None
+
+class Step:
+    def __init__(self, name, command, deps=(), interactive=False, inputs=(), outputs=(), always_run=False):
+        self.name = name
+        self.command = command
+        self.deps = list(deps)
+        # Interactive steps (sudo prompts) keep the terminal and never run alongside each other.
+        self.interactive = interactive
+        # Files whose content the step depends on, and files or directories it leaves behind.
+        self.inputs = [str(path) for path in inputs]
+        self.outputs = [str(path) for path in outputs]
+        # Steps whose effect does not show in any file (cache purges) are never skipped as unchanged.
+        self.always_run = always_run
+        self.fingerprint = None
+        self.status = "pending"
+        self.returncode = None
+        self.duration = None
+        self.output_fp = None
+
+class StepGraph:
+    def __init__(self, steps, log, log_dir, cwd=None, max_workers=4, state_fp=None, force=False):
+        self.steps = {step.name: step for step in steps}
+        self.log = log
+        self.log_dir = log_dir
+        self.cwd = cwd
+        self.max_workers = max_workers
+        self.state_fp = state_fp
+        self.force = force
+        self._terminal = threading.Lock()
+        self.validate()
+        self.state = self._load_state()
+
+    def validate(self):
+        for step in self.steps.values():
+            for dep in step.deps:
+                if dep not in self.steps:
+                    raise ValueError(f"Setup step '{step.name}' depends on unknown step '{dep}'.")
+        visiting, done = set(), set()
+
+        def visit(name):
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Setup steps contain a dependency cycle through '{name}'.")
+            visiting.add(name)
+            for dep in self.steps[name].deps:
+                visit(dep)
+            visiting.remove(name)
+            done.add(name)
+
+        for name in self.steps:
+            visit(name)
+
+    def _load_state(self):
+        if not self.state_fp:
+            return {}
+        try:
+            with open(self.state_fp, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        # Written after every step, so an interrupted setup picks up after the last finished one.
+        if not self.state_fp:
+            return
+        tmp_fp = f"{self.state_fp}.tmp"
+        with open(tmp_fp, "w") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_fp, self.state_fp)
+
+    def fingerprint(self, step):
+        if step.fingerprint is None:
+            parts = {
+                "command": step.command,
+                "inputs": {path: file_digest(os.path.join(self.cwd or "", path)) for path in step.inputs},
+            }
+            step.fingerprint = hashlib.sha256(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+        return step.fingerprint
+
+    def output_digests(self, step):
+        return {path: file_digest(os.path.join(self.cwd or "", path)) for path in step.outputs}
+
+    def is_current(self, step):
+        # Anything downstream of a step that actually ran this time runs again too.
+        if step.always_run or any(self.steps[dep].status == "done" for dep in step.deps):
+            return False
+        recorded = self.state.get(step.name)
+        if self.force or recorded is None or recorded.get("fingerprint") != self.fingerprint(step):
+            return False
+        outputs = self.output_digests(step)
+        return None not in outputs.values() and recorded.get("outputs") == outputs
+
+    def _execute(self, step):
+        os.makedirs(self.log_dir, exist_ok=True)
+        step.output_fp = os.path.join(self.log_dir, f"{step.name}.log")
+        started = time.monotonic()
+        with open(step.output_fp, "w") as output:
+            output.write(f"$ {step.command}\n")
+            output.flush()
+            if step.interactive:
+                with self._terminal:
+                    proc = subprocess.run(shlex.split(step.command), stdout=output,
+                                          stderr=subprocess.STDOUT, cwd=self.cwd)
+            else:
+                proc = subprocess.run(shlex.split(step.command), stdout=output, stderr=subprocess.STDOUT,
+                                      stdin=subprocess.DEVNULL, cwd=self.cwd)
+        step.duration = time.monotonic() - started
+        return proc.returncode
+
+    def _finish(self, step, returncode):
+        step.returncode = returncode
+        if returncode == 0:
+            step.status = "done"
+            self.log.info(f"Setup step '{step.name}' finished in {step.duration:.1f}s.")
+            self.state[step.name] = {"fingerprint": self.fingerprint(step), "outputs": self.output_digests(step),
+                                     "finished": time.time(), "duration": step.duration}
+        else:
+            self.state.pop(step.name, None)
+            step.status = "failed"
+            self.log.error(f"Setup step '{step.name}' failed with return code {returncode} "
+                           f"after {step.duration:.1f}s, see {step.output_fp}")
+            try:
+                with open(step.output_fp, "r", errors="replace") as f:
+                    tail = f.readlines()[-20:]
+                self.log.error("".join(tail))
+            except OSError:
+                pass
+        self._save_state()
+
+    def run(self):
+        started = time.monotonic()
+        pending = dict(self.steps)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                for name, step in list(pending.items()):
+                    deps = [self.steps[dep] for dep in step.deps]
+                    if any(dep.status in ("failed", "skipped") for dep in deps):
+                        step.status = "skipped"
+                        self.log.warning(f"Skipping setup step '{name}' because a dependency failed.")
+                        del pending[name]
+                    elif all(dep.status in DONE for dep in deps) and self.is_current(step):
+                        step.status = "unchanged"
+                        self.log.info(f"Setup step '{name}' is unchanged since its last run, skipping it.")
+                        del pending[name]
+                    elif all(dep.status in DONE for dep in deps):
+                        step.status = "running"
+                        self.log.info(f"Running setup step '{name}': {step.command}")
+                        running[pool.submit(self._execute, step)] = step
+                        del pending[name]
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    step = running.pop(future)
+                    try:
+                        returncode = future.result()
+                    except Exception as e:
+                        self.log.error(f"An unknown error occurred while running setup step '{step.name}': {e}")
+                        step.duration = step.duration or 0.0
+                        returncode = -1
+                    self._finish(step, returncode)
+        self.wall_time = time.monotonic() - started
+        self.report()
+        return self.returncode()
+
+    def returncode(self):
+        for step in self.steps.values():
+            if step.status not in DONE:
+                return step.returncode if step.returncode else 1
+        return 0
+
+    def critical_path(self):
+        finish, previous = {}, {}
+
+        def path_length(name):
+            if name not in finish:
+                step = self.steps[name]
+                best = None
+                for dep in step.deps:
+                    # Computed first, finish[best] only exists once path_length has run for it.
+                    length = path_length(dep)
+                    if best is None or length > finish[best]:
+                        best = dep
+                previous[name] = best
+                finish[name] = (step.duration or 0.0) + (finish[best] if best else 0.0)
+            return finish[name]
+
+        end = max(self.steps, key=path_length)
+        path = []
+        while end is not None:
+            path.append(end)
+            end = previous[end]
+        return list(reversed(path)), finish[path[0]]
+
+    def report(self):
+        for step in sorted(self.steps.values(), key=lambda s: s.duration or 0.0, reverse=True):
+            duration = f"{step.duration:.1f}s" if step.duration is not None else "-"
+            self.log.info(f"  {step.name:<24} {step.status:<9} {duration}")
+        path, length = self.critical_path()
+        serial = sum(step.duration or 0.0 for step in self.steps.values())
+        self.log.info(f"Setup took {self.wall_time:.1f}s wall clock ({serial:.1f}s if run serially). "
+                      f"Critical path {length:.1f}s: {' -> '.join(path)}")
@@ -0,0 +1,150 @@
+import threading, select, time, json, os
+from collections import deque
+
+class Supervisor:
+    def __init__(self, spawn, on_spawn=None, on_exit=None, history_fp=None, max_crashes=5, crash_window=600.0,
+                 backoff_base=2.0, backoff_max=120.0, stable_uptime=300.0, log=None):
+        self.spawn = spawn
+        self.on_spawn = on_spawn
+        self.on_exit = on_exit
+        self.history_fp = history_fp
+        self.max_crashes = max_crashes
+        self.crash_window = crash_window
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stable_uptime = stable_uptime
+        self.log = log
+        self.proc = None
+        self.history = []
+        self.state = "Stopped"
+        self.gave_up = False
+        self._crash_times = deque()
+        self._consecutive_crashes = 0
+        self._run_started = None
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # A second supervise loop would spawn a second server next to the first.
+        if self.is_alive():
+            raise RuntimeError("The WebUI supervisor is already running.")
+        self._stopping.clear()
+        # A manual start after giving up gets the full crash budget and the shortest backoff again.
+        self.gave_up = False
+        self._crash_times.clear()
+        self._consecutive_crashes = 0
+        self._start_child()
+        self._thread = threading.Thread(target=self._supervise, name="webui-supervisor", daemon=True)
+        self._thread.start()
+        return self.proc
+
+    def stop(self):
+        # Only marks the shutdown as intentional, the caller is responsible for signalling the child.
+        self._stopping.set()
+        self.state = "Stopped"
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def is_stopping(self):
+        return self._stopping.is_set()
+
+    def _start_child(self):
+        self.proc = self.spawn()
+        self._run_started = time.monotonic()
+        self.state = "Running"
+        if self.on_spawn:
+            self.on_spawn(self.proc)
+        if self.log:
+            self.log.info(f"WebUI started with PID {self.proc.pid} (run {len(self.history) + 1}).")
+
+    def _wait_child(self, proc):
+        # Block on a pidfd where available. Unlike a bare proc.wait() this does not hold the
+        # Popen waitpid lock while sleeping, so other threads can still poll() the child.
+        if hasattr(os, "pidfd_open"):
+            try:
+                pidfd = os.pidfd_open(proc.pid)
+            except OSError:
+                pidfd = None
+            if pidfd is not None:
+                try:
+                    select.select([pidfd], [], [])
+                finally:
+                    os.close(pidfd)
+        return proc.wait()
+
+    def _backoff_delay(self):
+        return min(self.backoff_base * (2 ** (self._consecutive_crashes - 1)), self.backoff_max)
+
+    def _record_run(self, exit_code, uptime, restart_delay):
+        entry = {
+            "run": len(self.history) + 1,
+            "pid": self.proc.pid,
+            "ended": time.time(),
+            "uptime": uptime,
+            "exit_code": exit_code,
+            "intentional": self._stopping.is_set(),
+            "restart_delay": restart_delay,
+        }
+        self.history.append(entry)
+        if not self.history_fp:
+            return
+        try:
+            with open(self.history_fp, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            if self.log:
+                self.log.error(f"Could not save run history to {self.history_fp}: {e}")
+
+    def _supervise(self):
+        while True:
+            exit_code = self._wait_child(self.proc)
+            uptime = time.monotonic() - self._run_started
+            if self.on_exit:
+                self.on_exit(self.proc)
+
+            if self._stopping.is_set() or exit_code == 0:
+                self._record_run(exit_code, uptime, None)
+                if not self._stopping.is_set() and self.log:
+                    self.log.info("WebUI exited cleanly, not restarting.")
+                self.state = "Stopped"
+                return
+
+            now = time.monotonic()
+            self._crash_times.append(now)
+            while self._crash_times and now - self._crash_times[0] > self.crash_window:
+                self._crash_times.popleft()
+            if uptime >= self.stable_uptime:
+                self._consecutive_crashes = 0
+            self._consecutive_crashes += 1
+
+            if len(self._crash_times) >= self.max_crashes:
+                self._record_run(exit_code, uptime, None)
+                self.gave_up = True
+                self.state = f"Crash loop ({len(self._crash_times)} crashes), not restarting"
+                if self.log:
+                    self.log.critical(f"WebUI crashed {len(self._crash_times)} times within "
+                                      f"{self.crash_window:.0f}s, giving up on restarts.")
+                return
+
+            delay = self._backoff_delay()
+            self._record_run(exit_code, uptime, delay)
+            self.state = f"Crashed ({exit_code}), restarting in {delay:.0f}s"
+            if self.log:
+                self.log.error(f"WebUI exited with code {exit_code} after {uptime:.1f}s, "
+                               f"restarting in {delay:.1f}s.")
+            if self._stopping.wait(delay):
+                self.state = "Stopped"
+                return
+            try:
+                self._start_child()
+            except Exception as e:
+                self.gave_up = True
+                self.state = "Restart failed"
+                if self.log:
+                    self.log.critical(f"Could not restart WebUI: {e}")
+                return
@@ -0,0 +1,30 @@
+import socket, time, sys, pathlib
+import pytest
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+# The modules live at the top of the repo and the stub webui.sh in benchmarks/, neither is a package.
+sys.path[:0] = [str(ROOT), str(ROOT / "benchmarks")]
+
+import stubs
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_for(condition, timeout=10.0, interval=0.02):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+@pytest.fixture
+def webui_sh(tmp_path):
+    webui_sh, _ = stubs.install(tmp_path / "stubs")
+    return webui_sh
+
+@pytest.fixture
+def marker(tmp_path):
+    return tmp_path / "events.jsonl"
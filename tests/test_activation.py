@@ -0,0 +1,131 @@
+import http.server, threading, socket, time
+import pytest
+from conftest import free_port, wait_for
+from activation import ActivationProxy
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+class StubBackend:
+    # Stands in for the supervised WebUI: a local HTTP server that takes start_delay to come up.
+    def __init__(self, start_delay=0.0, ready=True):
+        self.port = free_port()
+        self.start_delay = start_delay
+        self.ready = ready
+        self.starts = 0
+        self.stops = 0
+        self.server = None
+        self._up = threading.Event()
+
+    def start(self):
+        self.starts += 1
+        self._up.clear()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        time.sleep(self.start_delay)
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", self.port), _Handler)
+        self._up.set()
+        self.server.serve_forever()
+
+    def stop(self):
+        self.stops += 1
+        if self._up.wait(5):
+            self.server.shutdown()
+            self.server.server_close()
+
+    def wait_ready(self, timeout):
+        return self._up.wait(timeout) and self.ready
+
+def request(port):
+    response = b""
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(b"GET / HTTP/1.0\r\n\r\n")
+        try:
+            while chunk := sock.recv(4096):
+                response += chunk
+        except ConnectionResetError:
+            # The proxy gave up on the backend and closed the connection without reading the request.
+            pass
+    return response
+
+@pytest.fixture
+def activate():
+    proxies = []
+
+    def activate(backend, **kwargs):
+        proxy = ActivationProxy("127.0.0.1", 0, "127.0.0.1", backend.port, start_backend=backend.start,
+                                stop_backend=backend.stop, wait_ready=backend.wait_ready, **kwargs)
+        proxy.start()
+        proxies.append((proxy, backend))
+        return proxy, proxy._listener.getsockname()[1]
+    yield activate
+    for proxy, backend in proxies:
+        proxy.stop()
+        if proxy.backend_running:
+            backend.stop()
+
+def test_first_connection_starts_the_backend(activate):
+    backend = StubBackend(start_delay=0.2)
+    proxy, port = activate(backend)
+    assert backend.starts == 0
+
+    assert request(port).endswith(b"ok")
+    assert backend.starts == 1
+    assert proxy.backend_running
+    assert proxy.stats()["cold_starts"] == 1
+    assert request(port).endswith(b"ok")
+    assert backend.starts == 1
+
+def test_idle_backend_is_stopped_and_started_again(activate):
+    backend = StubBackend()
+    proxy, port = activate(backend, idle_timeout=0.3)
+
+    assert request(port).endswith(b"ok")
+    assert wait_for(lambda: not proxy.backend_running)
+    assert backend.stops == 1
+    assert proxy.stats()["idle_stops"] == 1
+
+    assert request(port).endswith(b"ok")
+    assert backend.starts == 2
+
+def test_connections_during_startup_share_one_start(activate):
+    backend = StubBackend(start_delay=0.5)
+    proxy, port = activate(backend)
+    responses = []
+    clients = [threading.Thread(target=lambda: responses.append(request(port))) for _ in range(4)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join(10)
+
+    assert len(responses) == 4 and all(response.endswith(b"ok") for response in responses)
+    assert backend.starts == 1
+
+def test_backend_that_never_gets_ready_is_not_counted_as_running(activate):
+    backend = StubBackend(ready=False)
+    proxy, port = activate(backend, ready_timeout=1.0)
+
+    assert request(port) == b""
+    assert not proxy.backend_running
+    assert backend.stops == 1
+
+def test_backend_that_exited_for_good_is_started_again(activate):
+    backend = StubBackend()
+    alive = threading.Event()
+    alive.set()
+    proxy, port = activate(backend, backend_alive=alive.is_set)
+    assert request(port).endswith(b"ok")
+
+    # What the supervisor looks like once it gave up on a crash loop.
+    backend.stop()
+    alive.clear()
+    assert request(port).endswith(b"ok")
+    assert backend.starts == 2
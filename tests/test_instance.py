@@ -0,0 +1,69 @@
+import subprocess, textwrap, sys
+import pytest
+from conftest import ROOT
+from instance import InstanceLock, ControlServer, send_command
+
+def in_other_process(lock_fp, code):
+    # flock() conflicts are between open files, a second process is what a second launch looks like.
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, {str(ROOT)!r})
+        from instance import InstanceLock
+        lock = InstanceLock({str(lock_fp)!r})
+    """) + textwrap.dedent(code)
+    return subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=30).stdout.split()
+
+def test_second_process_cannot_acquire_the_lock(tmp_path):
+    lock = InstanceLock(tmp_path / "instance.lock")
+    assert lock.acquire()
+    try:
+        assert in_other_process(lock.lock_fp, """
+            print(lock.is_held_elsewhere(), lock.owner_pid(), lock.acquire())
+        """) == ["True", str(lock.owner_pid()), "False"]
+    finally:
+        lock.release()
+    assert in_other_process(lock.lock_fp, "print(lock.is_held_elsewhere(), lock.acquire())") == ["False", "True"]
+
+def test_lock_is_released_when_the_owner_dies(tmp_path):
+    lock_fp = tmp_path / "instance.lock"
+    # The child exits without calling release(), as a crashed instance would.
+    assert in_other_process(lock_fp, "print(lock.acquire())") == ["True"]
+    lock = InstanceLock(lock_fp)
+    assert not lock.is_held_elsewhere()
+    assert lock.acquire()
+    lock.release()
+
+@pytest.fixture
+def control(tmp_path):
+    opened = []
+
+    def fail():
+        raise RuntimeError("The WebUI is not running.")
+
+    handlers = {"status": lambda: {"state": "Running", "port": 7860}, "open": lambda url="/": opened.append(url),
+                "stop": fail}
+    server = ControlServer(tmp_path / "control.sock", handlers)
+    server.start()
+    server.opened = opened
+    yield server
+    server.stop()
+
+def test_command_round_trips_over_the_socket(control):
+    assert send_command(control.socket_fp, "status") == {"ok": True, "result": {"state": "Running", "port": 7860}}
+    assert send_command(control.socket_fp, "open /sdapi/v1/docs") == {"ok": True, "result": None}
+    assert control.opened == ["/sdapi/v1/docs"]
+    assert oct(control.socket_fp.stat().st_mode & 0o777) == "0o600"
+
+def test_unknown_and_failing_commands_are_rejected(control):
+    response = send_command(control.socket_fp, "reboot now")
+    assert not response["ok"]
+    assert response["error"] == "Unknown command 'reboot'. Expected one of: status, open, stop"
+    assert send_command(control.socket_fp, "stop") == {"ok": False, "error": "The WebUI is not running."}
+
+def test_stop_removes_the_socket(tmp_path):
+    server = ControlServer(tmp_path / "control.sock", {})
+    server.start()
+    server.stop()
+    assert not (tmp_path / "control.sock").exists()
+    with pytest.raises(OSError):
+        send_command(tmp_path / "control.sock", "status")
@@ -0,0 +1,142 @@
+import http.server, threading, base64, json
+import pytest
+from conftest import wait_for
+from job_queue import Journal, JobQueue
+
+IMAGE = base64.b64encode(b"png").decode("ascii")
+
+class _WebUIHandler(http.server.BaseHTTPRequestHandler):
+    def do_POST(self):
+        # Answers with the scripted statuses in order, then keeps repeating the last one.
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        statuses = self.server.statuses
+        status = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+        self.server.requests.append((self.path, payload, status))
+        body = json.dumps({"images": [IMAGE], "info": "{}"} if status == 200 else {"error": "busy"}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def webui():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _WebUIHandler)
+    server.statuses = [200]
+    server.requests = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def queues(webui, tmp_path):
+    started = []
+
+    def make(**kwargs):
+        queue = JobQueue("127.0.0.1", webui.server_address[1], tmp_path / "jobs", tmp_path / "outputs",
+                         concurrency=1, poll_interval=0.05, **kwargs)
+        started.append(queue)
+        return queue
+    yield make
+    for queue in started:
+        queue.stop()
+
+def journal_records(tmp_path):
+    with open(tmp_path / "jobs" / "journal.jsonl") as f:
+        return [json.loads(line) for line in f]
+
+def write_journal(path, *records):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+def queued(job_id, prompt):
+    return {"event": "queued", "id": job_id, "endpoint": "txt2img", "payload": {"prompt": prompt}, "source": "x"}
+
+def test_replay_restores_each_job_state(tmp_path):
+    journal_fp = tmp_path / "jobs" / "journal.jsonl"
+    write_journal(journal_fp,
+                  queued("waiting", "a"),
+                  queued("interrupted", "b"), {"event": "started", "id": "interrupted", "attempt": 1},
+                  queued("retrying", "c"), {"event": "failed", "id": "retrying", "attempt": 1, "error": "HTTP 500",
+                                            "final": False},
+                  queued("failed", "d"), {"event": "failed", "id": "failed", "attempt": 3, "error": "HTTP 500",
+                                          "final": True},
+                  queued("done", "e"), {"event": "done", "id": "done", "outputs": ["e-0.png"], "seconds": 1.5})
+    with open(journal_fp, "a") as f:
+        # A crash in the middle of appending.
+        f.write('{"event": "queued", "id": "torn", "endpoint": "txt2i')
+
+    jobs = Journal(journal_fp).replay()
+    assert {job_id: (job["state"], job["attempts"]) for job_id, job in jobs.items()} == {
+        "waiting": ("pending", 0), "interrupted": ("pending", 0), "retrying": ("pending", 1),
+        "failed": ("failed", 3), "done": ("done", 0)}
+    assert jobs["failed"]["error"] == "HTTP 500"
+    assert jobs["done"]["outputs"] == ["e-0.png"]
+
+def test_resumes_only_the_unfinished_jobs(webui, queues, tmp_path):
+    write_journal(tmp_path / "jobs" / "journal.jsonl",
+                  queued("interrupted", "b"), {"event": "started", "id": "interrupted", "attempt": 1},
+                  queued("failed", "d"), {"event": "failed", "id": "failed", "attempt": 3, "error": "HTTP 500",
+                                          "final": True})
+    queue = queues()
+    queue.start()
+
+    assert wait_for(lambda: queue.jobs["interrupted"]["state"] == "done")
+    assert [(path, payload) for path, payload, _ in webui.requests] == [("/sdapi/v1/txt2img", {"prompt": "b"})]
+    assert queue.jobs["failed"]["state"] == "failed"
+    assert (tmp_path / "outputs" / "interrupted-0.png").read_bytes() == b"png"
+    assert json.loads((tmp_path / "outputs" / "interrupted.json").read_text())["payload"] == {"prompt": "b"}
+
+def test_unavailable_webui_does_not_use_an_attempt(webui, queues, tmp_path):
+    webui.statuses = [503, 503, 200]
+    (tmp_path / "prompts.txt").write_text("a lighthouse\n")
+    queue = queues(max_attempts=1)
+    queue.start()
+    queue.add_file(tmp_path / "prompts.txt")
+    job_id, = queue.jobs
+
+    assert wait_for(lambda: queue.jobs[job_id]["state"] == "done")
+    assert [status for _, _, status in webui.requests] == [503, 503, 200]
+    assert queue.jobs[job_id]["attempts"] == 1
+    assert [record["event"] for record in journal_records(tmp_path)] == ["queued", "started", "started", "started",
+                                                                          "done"]
+
+def test_gives_up_after_max_attempts(webui, queues, tmp_path):
+    webui.statuses = [500]
+    (tmp_path / "prompts.jsonl").write_text(json.dumps({"id": "broken", "prompt": "x", "steps": "many"}) + "\n")
+    queue = queues(max_attempts=2)
+    queue.start()
+    queue.add_file(tmp_path / "prompts.jsonl")
+
+    assert wait_for(lambda: queue.jobs["broken"]["state"] == "failed")
+    assert len(webui.requests) == 2
+    failures = [record for record in journal_records(tmp_path) if record["event"] == "failed"]
+    assert [(record["attempt"], record["final"]) for record in failures] == [(1, False), (2, True)]
+    assert queue.jobs["broken"]["error"].startswith("HTTP 500")
+    assert queue.stats()["failed"] == 1
+
+def test_inbox_files_are_queued_once_they_settle(webui, queues, tmp_path):
+    queue = queues()
+    queue.start()
+    (queue.inbox / "batch.txt").write_text("a fox\na cat\n")
+    (queue.inbox / "notes.md").write_text("not a prompt file\n")
+
+    assert wait_for(lambda: queue.stats()["done"] == 2)
+    assert (queue.ingested / "batch.txt").exists()
+    assert (queue.inbox / "notes.md").exists()
+
+def test_inbox_thread_survives_a_missing_inbox(webui, queues, tmp_path):
+    queue = queues()
+    queue.start()
+    queue.inbox.rmdir()
+    inbox_thread = queue._threads[0]
+    assert not wait_for(lambda: not inbox_thread.is_alive(), timeout=0.3)
+
+    queue.inbox.mkdir()
+    (queue.inbox / "batch.txt").write_text("a fox\n")
+    assert wait_for(lambda: queue.stats()["done"] == 1)
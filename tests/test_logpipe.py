@@ -0,0 +1,85 @@
+import threading, logging, gzip, os
+from conftest import wait_for
+from logpipe import RotatingLog, LogPipeline, PipeReader
+
+def test_rotates_by_size_into_compressed_backups(tmp_path):
+    log = RotatingLog(tmp_path / "webui.log", max_bytes=10, backups=2)
+    for n in range(3):
+        log.write(f"rotation {n}\n".encode())
+        log.flush()
+    log.write(b"current\n")
+    log.close()
+
+    assert (tmp_path / "webui.log").read_bytes() == b"current\n"
+    assert gzip.decompress((tmp_path / "webui.log.1.gz").read_bytes()) == b"rotation 2\n"
+    assert gzip.decompress((tmp_path / "webui.log.2.gz").read_bytes()) == b"rotation 1\n"
+    # Only the configured number of backups is kept, and no uncompressed or partial file is left behind.
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["webui.log", "webui.log.1.gz", "webui.log.2.gz"]
+
+class BlockingConsole:
+    # Holds up the writer thread inside its console write until released.
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.lines = []
+
+    def write(self, text):
+        self.entered.set()
+        self.release.wait(10)
+        self.lines.append(text)
+
+    def flush(self):
+        pass
+
+def test_full_queue_drops_records_and_reports_the_count(tmp_path):
+    console = BlockingConsole()
+    pipeline = LogPipeline(tmp_path / "webui.log", console=console, maxsize=2)
+    logger = logging.getLogger("test-logpipe")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(pipeline.handler)
+    try:
+        logger.info("first")
+        assert wait_for(console.entered.is_set)
+        for n in range(5):
+            logger.info(f"record {n}")
+        assert pipeline.handler.dropped == 3
+        console.release.set()
+        pipeline.flush()
+    finally:
+        logger.removeHandler(pipeline.handler)
+        pipeline.stop()
+
+    messages = [line.split(" - ", 2)[2] for line in (tmp_path / "webui.log").read_text().splitlines()]
+    assert messages == ["first", "record 0", "record 1", "3 log records were dropped while the log queue was full."]
+    assert pipeline.handler.dropped == 0
+
+def test_pipeline_writes_child_output_to_its_own_file(tmp_path):
+    pipeline = LogPipeline(tmp_path / "webui.log", console=None, max_bytes=16, backups=1)
+    sink = pipeline.sink(tmp_path / "webui-gpu1.log")
+    sink(b"0123456789abcdef\n")
+    # Size is checked once per batch, so the second write has to come in a batch of its own.
+    pipeline.flush()
+    sink(b"after rotation\n")
+    pipeline.flush()
+    pipeline.stop()
+
+    assert (tmp_path / "webui-gpu1.log").read_bytes() == b"after rotation\n"
+    assert gzip.decompress((tmp_path / "webui-gpu1.log.1.gz").read_bytes()) == b"0123456789abcdef\n"
+    assert not (tmp_path / "webui.log").exists()
+
+def test_pipe_reader_joins_lines_split_across_reads():
+    read_fd, write_fd = os.pipe()
+    chunks, lines = [], []
+    reader = PipeReader(os.fdopen(read_fd, "rb"), chunks.append, on_lines=lines.append)
+    reader.start()
+    written = [b"Loading wei", b"ghts\nModel loa", b"ded in 1s\ncaf\xc3", b"\xa9\nno newline"]
+    for n, chunk in enumerate(written, 1):
+        os.write(write_fd, chunk)
+        # One read per write, so every line boundary falls where the test put it.
+        assert wait_for(lambda: len(chunks) == n)
+    os.close(write_fd)
+    reader.join(5)
+
+    assert chunks == written
+    assert lines == ["Loading weights", "Model loaded in 1s", "café", "no newline"]
@@ -0,0 +1,128 @@
+import http.server, urllib.request, urllib.error, threading, json
+import pytest
+from conftest import wait_for
+from metrics import render, GenerationStats, ProgressSampler, MetricsServer
+
+def progress(step, steps=20, job_no=0, job_timestamp="20261018120000", job_count=1, interrupted=False,
+             skipped=False):
+    # Shaped like the WebUI's /sdapi/v1/progress response.
+    return {"progress": step / steps if steps else 0, "state": {
+        "job": f"Batch {job_no + 1} out of {job_count}" if job_count else "", "job_count": job_count,
+        "job_no": job_no, "job_timestamp": job_timestamp, "interrupted": interrupted, "skipped": skipped,
+        "sampling_step": step, "sampling_steps": steps}}
+
+IDLE = progress(0, steps=0, job_count=0)
+
+def feed(stats, *snapshots):
+    for now, snapshot in enumerate(snapshots):
+        stats.update(snapshot, float(now))
+    return stats
+
+def test_render_exposition_format():
+    body = render([
+        ("webui_up", "gauge", "Whether the WebUI is up.", [({}, True)]),
+        ("webui_generation_steps_total", "counter", "Sampling steps completed.",
+         [({"port": 7860}, 42), ({"port": 7861}, None)]),
+    ])
+    assert body.decode("utf-8") == (
+        "# HELP webui_up Whether the WebUI is up.\n"
+        "# TYPE webui_up gauge\n"
+        "webui_up 1.0\n"
+        "# HELP webui_generation_steps_total Sampling steps completed.\n"
+        "# TYPE webui_generation_steps_total counter\n"
+        'webui_generation_steps_total{port="7860"} 42.0\n'
+    )
+
+def test_render_escapes_label_values():
+    body = render([("webui_info", "gauge", "Build info.", [({"version": 'v1 "dev"\\beta\nrc', "port": 1}, 1)])])
+    assert body.decode("utf-8").splitlines()[-1] == 'webui_info{version="v1 \\"dev\\"\\\\beta\\nrc",port="1"} 1.0'
+
+def test_counts_steps_and_batches():
+    stats = feed(GenerationStats(), IDLE, progress(5), progress(12), progress(20), IDLE)
+    assert (stats.steps, stats.batches, stats.interrupted) == (20, 1, 0)
+    assert not stats.active and stats.job_batches == 0
+
+def test_counts_steps_missed_between_samples():
+    # Batch 1 finished and batch 2 was 3 steps in before the next sample.
+    stats = feed(GenerationStats(), progress(5, job_count=2), progress(3, job_no=1, job_count=2))
+    assert (stats.steps, stats.batches) == (20 + 3, 1)
+    assert stats.active and stats.job_batches == 2
+
+def test_hires_fix_second_pass_resets_the_step_counter():
+    stats = feed(GenerationStats(), progress(15), progress(20), progress(4, steps=10), progress(9, steps=10), IDLE)
+    assert (stats.steps, stats.batches) == (20 + 10, 1)
+
+def test_interrupted_batch_is_not_counted_as_finished():
+    stats = feed(GenerationStats(), progress(7), progress(0, steps=0, job_count=0, interrupted=True))
+    assert (stats.steps, stats.batches, stats.interrupted) == (7, 0, 1)
+
+def test_skipped_batch_is_counted_as_interrupted():
+    stats = feed(GenerationStats(), progress(7, job_count=2),
+                 progress(2, job_no=1, job_count=2, skipped=True))
+    assert (stats.steps, stats.batches, stats.interrupted) == (7 + 2, 0, 1)
+
+def test_rates_cover_the_window():
+    stats = GenerationStats(window=10.0)
+    for now in range(21):
+        stats.update(progress(now % 20, job_timestamp=str(now // 20)), float(now))
+    steps_per_second, _ = stats.rates()
+    assert steps_per_second == 1.0
+
+class _ProgressHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Answers with the scripted snapshots in order, then keeps repeating the last one.
+        snapshots = self.server.snapshots
+        body = json.dumps(snapshots.pop(0) if len(snapshots) > 1 else snapshots[0]).encode("utf-8")
+        self.server.paths.append(self.path)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def progress_api():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ProgressHandler)
+    server.snapshots = [IDLE, progress(5), progress(12), progress(20), IDLE]
+    server.paths = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def scrape(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        return response.headers["Content-Type"], response.read().decode("utf-8").splitlines()
+
+def test_sampled_progress_is_served_over_http(progress_api):
+    port = progress_api.server_address[1]
+    sampler = ProgressSampler(lambda: [(port, True)], interval=0.02)
+    metrics = MetricsServer(0, sampler.families)
+    sampler.start()
+    metrics.start()
+    try:
+        assert wait_for(lambda: port in sampler.stats and sampler.stats[port].batches == 1)
+        content_type, lines = scrape(metrics.url)
+        assert content_type.startswith("text/plain")
+        assert progress_api.paths[0] == "/sdapi/v1/progress?skip_current_image=true"
+        assert f'webui_progress_api_up{{port="{port}"}} 1.0' in lines
+        assert f'webui_generation_steps_total{{port="{port}"}} 20.0' in lines
+        assert f'webui_generation_batches_total{{port="{port}"}} 1.0' in lines
+        assert f'webui_job_batches{{port="{port}"}} 0.0' in lines
+        assert "# TYPE webui_generation_steps_total counter" in lines
+
+        progress_api.shutdown()
+        progress_api.server_close()
+        assert wait_for(lambda: not sampler.stats[port].up)
+        _, lines = scrape(metrics.url)
+        assert f'webui_progress_api_up{{port="{port}"}} 0.0' in lines
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(metrics.url.replace("/metrics", "/other"), timeout=5)
+        assert error.value.code == 404
+    finally:
+        sampler.stop()
+        metrics.stop()
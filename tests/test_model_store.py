@@ -0,0 +1,75 @@
+import tempfile, hashlib, json, os
+import pytest
+from model_store import ModelStore
+
+def install(root, files):
+    for relative, content in files.items():
+        path = root / "models" / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+    return root
+
+def sha256(content):
+    return hashlib.sha256(content).hexdigest()
+
+@pytest.fixture
+def other_device(tmp_path):
+    # A store on another filesystem, so hardlinks and reflinks into it fail with EXDEV.
+    if not os.path.isdir("/dev/shm") or os.stat("/dev/shm").st_dev == os.stat(tmp_path).st_dev:
+        pytest.skip("needs /dev/shm on a different filesystem than the test directory")
+    with tempfile.TemporaryDirectory(dir="/dev/shm") as path:
+        yield path
+
+def test_adopts_an_existing_model_with_a_hardlink(tmp_path):
+    webui = install(tmp_path / "webui", {"Stable-diffusion/sd15.safetensors": b"weights"})
+    model = webui / "models" / "Stable-diffusion" / "sd15.safetensors"
+    store = ModelStore(tmp_path / "store")
+    stats = store.sync([webui])
+
+    target = store.object_path(sha256(b"weights"), ".safetensors")
+    assert os.path.samefile(model, target) and model.stat().st_nlink == 2
+    assert not target.stat().st_mode & 0o222
+    assert (stats["adopted"], stats["hashed"], stats["links"]["hardlink"]) == (1, 1, 1)
+    index = json.loads((tmp_path / "store" / "index.json").read_text())
+    assert index["objects"][sha256(b"weights")] == {"name": "sd15.safetensors", "category": "Stable-diffusion",
+                                                    "size": 7, "suffix": ".safetensors"}
+
+    # Unchanged size and mtime, so a second run reads the hash from the index instead of the file.
+    stats = ModelStore(tmp_path / "store").sync([webui])
+    assert (stats["hashed"], stats["adopted"]) == (0, 0)
+    assert stats["reused_hashes"] == 1
+
+def test_identical_models_are_stored_once_and_shared(tmp_path):
+    first = install(tmp_path / "first", {"Stable-diffusion/sd15.safetensors": b"weights",
+                                         "Lora/detail.safetensors": b"lora"})
+    second = install(tmp_path / "second", {"Stable-diffusion/copy.safetensors": b"weights"})
+    stats = ModelStore(tmp_path / "store").sync([first, second])
+
+    assert (stats["adopted"], stats["deduplicated"], stats["bytes_saved"]) == (2, 1, len(b"weights"))
+    copy = second / "models" / "Stable-diffusion" / "copy.safetensors"
+    assert os.path.samefile(first / "models" / "Stable-diffusion" / "sd15.safetensors", copy)
+    # Each install gets the models it lacked under the name the store knows them by.
+    assert (second / "models" / "Lora" / "detail.safetensors").read_bytes() == b"lora"
+    assert os.path.samefile(second / "models" / "Stable-diffusion" / "sd15.safetensors", copy)
+    assert not (first / "models" / "Stable-diffusion" / "copy.safetensors").exists()
+    assert stats["linked"] == 2
+
+def test_falls_back_to_a_symlink_across_filesystems(tmp_path, other_device):
+    webui = install(tmp_path / "webui", {"VAE/vae.pt": b"vae"})
+    model = webui / "models" / "VAE" / "vae.pt"
+    store = ModelStore(other_device)
+    stats = store.sync([webui])
+
+    target = store.object_path(sha256(b"vae"), ".pt")
+    assert model.is_symlink() and model.resolve() == target.resolve()
+    assert model.read_bytes() == b"vae"
+    assert stats["links"] == {"hardlink": 0, "reflink": 0, "symlink": 1}
+    assert not list(model.parent.glob(".*link-tmp"))
+
+def test_a_fixed_link_mode_never_falls_back(tmp_path, other_device):
+    webui = install(tmp_path / "webui", {"VAE/vae.pt": b"vae"})
+    model = webui / "models" / "VAE" / "vae.pt"
+    with pytest.raises(OSError):
+        ModelStore(other_device, link_mode="hardlink").sync([webui])
+    # The link is built next to the model and renamed over it, a failure leaves the original alone.
+    assert not model.is_symlink() and model.read_bytes() == b"vae"
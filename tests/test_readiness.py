@@ -0,0 +1,82 @@
+import subprocess, json, os
+import pytest
+from conftest import free_port
+from logpipe import PipeReader
+from readiness import ReadinessWatcher
+
+@pytest.fixture
+def launch(webui_sh):
+    procs = []
+
+    def launch(port, **stub_env):
+        env = dict(os.environ, **{key: str(value) for key, value in stub_env.items()})
+        procs.append(subprocess.Popen([str(webui_sh), "--port", str(port)], env=env, stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT))
+        return procs[-1]
+    yield launch
+    for proc in procs:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+
+def watch(port, proc=None, **kwargs):
+    watcher = ReadinessWatcher("127.0.0.1", port, proc=proc, interval=0.05, **kwargs)
+    if proc is not None:
+        PipeReader(proc.stdout, lambda data: None, on_lines=watcher.feed_line).start()
+    watcher.start()
+    return watcher
+
+def test_ready_once_the_port_binds(launch, tmp_path):
+    port = free_port()
+    timings_fp = tmp_path / "timings.jsonl"
+    watcher = watch(port, launch(port, STUB_LOAD_DELAY=0.5), timings_fp=timings_fp)
+
+    assert not watcher.wait(0.2)
+    assert watcher.wait(10)
+    assert watcher.state == "Ready"
+    assert watcher.time_to_ready() >= 0.5
+    watcher.done.wait(5)
+    entry, = [json.loads(line) for line in open(timings_fp)]
+    assert entry["outcome"] == "ready" and entry["port"] == port
+
+def test_exited_when_the_child_dies_first(launch):
+    port = free_port()
+    proc = launch(port, STUB_CRASH_AFTER=0)
+    watcher = watch(port, proc)
+
+    assert watcher.done.wait(10)
+    assert not watcher.ready.is_set()
+    assert watcher.state == "Exited (1)"
+    assert watcher.time_to_ready() is None
+
+def test_timeout_when_nothing_binds():
+    watcher = watch(free_port(), timeout=0.3)
+
+    assert watcher.done.wait(5)
+    assert not watcher.ready.is_set()
+    assert watcher.state == "Timed out"
+
+def test_phase_timestamps_from_the_output(launch):
+    port = free_port()
+    watcher = watch(port, launch(port, STUB_VENV_DELAY=0.2, STUB_LOAD_DELAY=0.3))
+    assert watcher.wait(10)
+    watcher.done.wait(5)
+
+    marks = watcher.marks
+    order = ["spawned", "venv_activated", "model_load_started", "model_loaded", "port_bound", "ready"]
+    assert [marks[phase] for phase in order] == sorted(marks[phase] for phase in order)
+    assert marks["model_load_started"] - marks["venv_activated"] >= 0.2
+    phases = watcher.phase_durations()
+    assert phases["model_load"] >= 0.3
+    assert set(phases) == {"venv_activation", "model_load", "port_bind"}
+
+def test_feed_line_keeps_the_first_mark_and_tracks_the_state():
+    watcher = ReadinessWatcher("127.0.0.1", free_port())
+    watcher.feed_line("Launching launch.py")
+    first = watcher.marks["venv_activated"]
+    assert watcher.state == "Starting server"
+    watcher.feed_line("python venv already activate\nLoading weights [abc] from model.safetensors")
+    assert watcher.marks["venv_activated"] == first
+    assert watcher.state == "Loading model"
+    watcher.feed_line("unrelated output")
+    assert set(watcher.marks) == {"spawned", "venv_activated", "model_load_started"}
@@ -0,0 +1,86 @@
+import logging, json
+from steps import Step, StepGraph
+
+LOG = logging.getLogger("test-steps")
+
+def record(name):
+    # Appends the step name to runs.txt, so the test can tell which steps actually ran.
+    return f"sh -c 'echo {name} >> runs.txt'"
+
+def runs(tmp_path):
+    try:
+        return (tmp_path / "runs.txt").read_text().split()
+    except FileNotFoundError:
+        return []
+
+def run(tmp_path, steps, **kwargs):
+    graph = StepGraph(steps, LOG, tmp_path / "logs", cwd=tmp_path, state_fp=tmp_path / "setup_state.json",
+                      **kwargs)
+    return graph.run(), {name: step.status for name, step in graph.steps.items()}
+
+def install_steps():
+    return [
+        Step("venv", "sh -c 'mkdir -p venv && echo venv >> runs.txt'", outputs=["venv"]),
+        Step("requirements", record("requirements"), deps=["venv"], inputs=["requirements.txt"]),
+    ]
+
+def test_unchanged_steps_are_skipped_until_an_input_changes(tmp_path):
+    (tmp_path / "requirements.txt").write_text("torch\n")
+    assert run(tmp_path, install_steps()) == (0, {"venv": "done", "requirements": "done"})
+    assert run(tmp_path, install_steps()) == (0, {"venv": "unchanged", "requirements": "unchanged"})
+    assert runs(tmp_path) == ["venv", "requirements"]
+
+    (tmp_path / "requirements.txt").write_text("torch\nxformers\n")
+    assert run(tmp_path, install_steps()) == (0, {"venv": "unchanged", "requirements": "done"})
+    assert runs(tmp_path) == ["venv", "requirements", "requirements"]
+
+def test_missing_outputs_and_force_run_steps_again(tmp_path):
+    (tmp_path / "requirements.txt").write_text("torch\n")
+    run(tmp_path, install_steps())
+    (tmp_path / "venv").rmdir()
+    # The rebuilt venv invalidates everything that was installed into it.
+    assert run(tmp_path, install_steps()) == (0, {"venv": "done", "requirements": "done"})
+    assert run(tmp_path, install_steps(), force=True) == (0, {"venv": "done", "requirements": "done"})
+    assert runs(tmp_path) == ["venv", "requirements"] * 3
+
+def test_resumes_after_the_failed_step(tmp_path):
+    def steps():
+        return [
+            Step("clone", record("clone")),
+            Step("build", "sh -c 'echo build >> runs.txt && test -f fixed'", deps=["clone"]),
+            Step("install", record("install"), deps=["build"]),
+        ]
+
+    returncode, statuses = run(tmp_path, steps())
+    assert returncode == 1
+    assert statuses == {"clone": "done", "build": "failed", "install": "skipped"}
+    assert list(json.loads((tmp_path / "setup_state.json").read_text())) == ["clone"]
+    assert "$ sh -c" in (tmp_path / "logs" / "build.log").read_text()
+
+    (tmp_path / "fixed").touch()
+    assert run(tmp_path, steps()) == (0, {"clone": "unchanged", "build": "done", "install": "done"})
+    assert runs(tmp_path) == ["clone", "build", "build", "install"]
+
+def test_always_run_steps_and_their_dependents_run_every_time(tmp_path):
+    def steps():
+        return [
+            Step("purge", record("purge"), always_run=True),
+            Step("install", record("install"), deps=["purge"]),
+            Step("shortcut", record("shortcut")),
+        ]
+
+    run(tmp_path, steps())
+    assert run(tmp_path, steps()) == (0, {"purge": "done", "install": "done", "shortcut": "unchanged"})
+    assert runs(tmp_path).count("purge") == 2 and runs(tmp_path).count("install") == 2
+
+def test_independent_steps_run_in_parallel(tmp_path):
+    # Each step waits for the other's file, so they only both succeed when they run at the same time.
+    def rendezvous(mine, other):
+        return f"sh -c 'touch {mine}; for i in $(seq 100); do test -f {other} && exit 0; sleep 0.05; done; exit 1'"
+
+    steps = [
+        Step("download", rendezvous("download.started", "venv.started")),
+        Step("venv", rendezvous("venv.started", "download.started")),
+        Step("install", record("install"), deps=["download", "venv"]),
+    ]
+    assert run(tmp_path, steps, max_workers=2) == (0, {"download": "done", "venv": "done", "install": "done"})
@@ -0,0 +1,94 @@
+import subprocess, signal, json, os
+import pytest
+from conftest import free_port, wait_for
+from supervisor import Supervisor
+
+def spawner(webui_sh, marker, crash_after):
+    # crash_after gives STUB_CRASH_AFTER per launch, None for a launch that stays up.
+    launches = []
+
+    def spawn():
+        delay = crash_after(len(launches))
+        env = dict(os.environ, STUB_MARKER=str(marker))
+        if delay is not None:
+            env["STUB_CRASH_AFTER"] = str(delay)
+        launches.append(subprocess.Popen([str(webui_sh), "--port", str(free_port())], env=env,
+                                         stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, preexec_fn=os.setsid))
+        return launches[-1]
+    return spawn, launches
+
+def events(marker, name):
+    try:
+        with open(marker) as f:
+            return [e for e in (json.loads(line) for line in f if line.endswith("\n")) if e["event"] == name]
+    except FileNotFoundError:
+        return []
+
+@pytest.fixture
+def supervisors():
+    started = []
+    yield started
+    for supervisor in started:
+        supervisor.stop()
+        if supervisor.proc is not None and supervisor.proc.poll() is None:
+            os.killpg(supervisor.proc.pid, signal.SIGKILL)
+        supervisor.join(10)
+
+def test_restarts_a_crash_after_the_backoff_delay(webui_sh, marker, supervisors):
+    spawn, launches = spawner(webui_sh, marker, lambda n: 0 if n == 0 else None)
+    supervisor = Supervisor(spawn, max_crashes=3, crash_window=60, backoff_base=0.5)
+    supervisors.append(supervisor)
+    supervisor.start()
+
+    assert wait_for(lambda: len(events(marker, "spawned")) == 2)
+    assert supervisor.state == "Running"
+    assert [(run["exit_code"], run["restart_delay"]) for run in supervisor.history] == [(1, 0.5)]
+    crashed, = events(marker, "exit")
+    assert events(marker, "spawned")[1]["time"] - crashed["time"] >= 0.5
+    assert not supervisor.gave_up
+
+def test_backoff_doubles_and_gives_up_within_the_crash_window(webui_sh, marker, supervisors):
+    spawn, launches = spawner(webui_sh, marker, lambda n: 0)
+    supervisor = Supervisor(spawn, max_crashes=3, crash_window=60, backoff_base=0.1)
+    supervisors.append(supervisor)
+    supervisor.start()
+
+    assert wait_for(lambda: not supervisor.is_alive())
+    assert supervisor.gave_up
+    assert supervisor.state.startswith("Crash loop")
+    assert len(launches) == 3
+    assert [run["restart_delay"] for run in supervisor.history] == [0.1, 0.2, None]
+
+def test_crashes_outside_the_window_never_give_up(webui_sh, marker, supervisors):
+    spawn, launches = spawner(webui_sh, marker, lambda n: 0)
+    supervisor = Supervisor(spawn, max_crashes=2, crash_window=0.2, backoff_base=0.3, backoff_max=0.3)
+    supervisors.append(supervisor)
+    supervisor.start()
+
+    assert wait_for(lambda: len(launches) >= 4)
+    assert not supervisor.gave_up
+    assert supervisor.is_alive()
+
+def test_start_refuses_a_second_supervise_loop(webui_sh, marker, supervisors):
+    spawn, launches = spawner(webui_sh, marker, lambda n: None)
+    supervisor = Supervisor(spawn)
+    supervisors.append(supervisor)
+    supervisor.start()
+
+    with pytest.raises(RuntimeError):
+        supervisor.start()
+    assert len(launches) == 1
+
+def test_start_after_giving_up_resets_the_crash_budget(webui_sh, marker, supervisors):
+    spawn, launches = spawner(webui_sh, marker, lambda n: 0 if n < 3 else None)
+    supervisor = Supervisor(spawn, max_crashes=2, crash_window=60, backoff_base=0.1)
+    supervisors.append(supervisor)
+    supervisor.start()
+    assert wait_for(lambda: not supervisor.is_alive())
+    assert supervisor.gave_up and len(launches) == 2
+
+    # The third launch crashes once more, then the fourth stays up.
+    supervisor.start()
+    assert wait_for(lambda: len(launches) == 4)
+    assert not supervisor.gave_up
+    assert supervisor.history[-1]["restart_delay"] == 0.1
@@ -0,0 +1,151 @@
+from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction,\
+    QVBoxLayout, QLabel, QPushButton, QDialog, QWidget, QFileDialog
+from PyQt5.QtGui import QIcon, QPainter, QPen, QColor
+from PyQt5.QtCore import QTimer, QPointF, QMetaObject, Qt
+from resources import format_bytes, summary
+import threading, sys
+
+class ResourceChart(QWidget):
+    SERIES = [
+        ("rss", "RAM", QColor("#1f77b4")),
+        ("vram", "VRAM", QColor("#d62728")),
+        ("cpu", "CPU %", QColor("#2ca02c")),
+    ]
+
+    def __init__(self, sampler, parent=None):
+        super().__init__(parent)
+        self.sampler = sampler
+        self.setWindowTitle("WebUI Resources")
+        self.resize(640, 280)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.update)
+        self.timer.start(int(sampler.interval * 1000))
+
+    def values(self, key, samples):
+        if key == "vram":
+            return [sample.get("vram_group") or sample.get("vram_used") or 0 for sample in samples]
+        return [sample.get(key) or 0 for sample in samples]
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), Qt.white)
+        samples = list(self.sampler.samples)
+        margin = 24
+        width = self.width() - 2 * margin
+        height = self.height() - 3 * margin
+        if len(samples) < 2:
+            painter.drawText(self.rect(), Qt.AlignCenter, "Collecting samples...")
+            return
+
+        for row, (key, label, color) in enumerate(self.SERIES):
+            values = self.values(key, samples)
+            peak = max(values) or 1
+            painter.setPen(QPen(color, 1.5))
+            step = width / (len(values) - 1)
+            points = [QPointF(margin + i * step, margin + height - value / peak * height)
+                      for i, value in enumerate(values)]
+            for start, end in zip(points, points[1:]):
+                painter.drawLine(start, end)
+            peak_text = f"{peak:.0f}%" if key == "cpu" else format_bytes(peak)
+            painter.drawText(margin + row * width // 3, self.height() - margin // 2,
+                             f"{label} (peak {peak_text})")
+        painter.setPen(Qt.black)
+        painter.drawText(margin, margin - 6, summary(samples[-1]))
+
+class Tray:
+    def __init__(self, runner, icon_path):
+        self.runner = runner
+        self.app = QApplication(sys.argv)
+        self.tray = QSystemTrayIcon(QIcon(str(icon_path)), self.app)
+        self.log_viewer = None
+        self.resource_chart = None
+        self.actions = []
+        self.exiting = None
+
+        self.tray.setToolTip(self.runner.status_tooltip())
+        self.status_timer = QTimer()
+        self.status_timer.timeout.connect(self.refresh)
+        self.status_timer.start(1000)
+
+        self.menu = QMenu()
+        self.add_action("View logs", self.show_logs)
+        if self.runner.resources is not None:
+            self.add_action("Resource history", self.show_resources)
+        if self.runner.jobs is not None:
+            self.add_action("Add prompt file...", self.add_prompt_file)
+        self.add_action("Restart", self.restart)
+        self.add_action("Profile launch", self.profile_launch)
+        self.add_action("Exit", self.exit)
+
+        self.tray.setContextMenu(self.menu)
+        self.tray.show()
+
+    def add_action(self, text, slot):
+        action = QAction(text)
+        action.triggered.connect(slot)
+        self.menu.addAction(action)
+        self.actions.append(action)
+        return action
+
+    def refresh(self):
+        if self.runner.exit_requested.is_set():
+            self.exit()
+        self.tray.setToolTip(self.runner.status_tooltip())
+
+    def exit(self):
+        # Stopping can take stop_timeout + kill_timeout, on_exit quits the app once the WebUI is gone.
+        if self.exiting is None:
+            self.exiting = threading.Thread(target=self.runner.on_exit, name="webui-exit", daemon=True)
+            self.exiting.start()
+
+    def restart(self):
+        # Stopping waits for the old WebUI to release its port and GPU, which must not block the Qt loop.
+        threading.Thread(target=self.runner.restart_webui, daemon=True).start()
+
+    def add_prompt_file(self):
+        path, _ = QFileDialog.getOpenFileName(None, "Add prompt file", str(self.runner.jobs.inbox),
+                                              "Prompt files (*.jsonl *.txt)")
+        if path:
+            threading.Thread(target=self.runner.jobs.add_file, args=(path,), daemon=True).start()
+
+    def profile_launch(self):
+        threading.Thread(target=self.runner.profile_launch, daemon=True).start()
+
+    def show_logs(self):
+        # Imported here so the viewer is only loaded when someone asks for it.
+        from log_viewer import LogViewer
+        if self.log_viewer is None or not self.log_viewer.isVisible():
+            self.log_viewer = LogViewer(self.runner.log_fp)
+        self.log_viewer.show()
+        self.log_viewer.raise_()
+
+    def show_resources(self):
+        if self.resource_chart is None:
+            self.resource_chart = ResourceChart(self.runner.resources)
+        self.resource_chart.show()
+        self.resource_chart.raise_()
+
+    def quit(self):
+        # Called from the exit thread, so the quit is queued to the Qt thread.
+        QMetaObject.invokeMethod(self.app, "quit", Qt.QueuedConnection)
+
+    def exec(self):
+        return self.app.exec_()
+
+def show_instance_running_dialog():
+    app = QApplication.instance() or QApplication(sys.argv)
+
+    dialog = QDialog()
+    dialog.setWindowTitle("Error:")
+
+    layout = QVBoxLayout()
+    label = QLabel("Instance already running!")
+    layout.addWidget(label)
+
+    ok_button = QPushButton("OK")
+    ok_button.clicked.connect(dialog.accept)
+    layout.addWidget(ok_button)
+
+    dialog.setLayout(layout)
+    dialog.exec_()
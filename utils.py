@@ -1,6 +1,13 @@
 import pathlib, subprocess, os, signal,\
-sys, pathlib, logging, shutil, stat, json, traceback
-from logging.handlers import RotatingFileHandler
+sys, pathlib, logging, shutil, stat, json, traceback, collections
+from steps import Step, StepGraph
+from probes import EnvironmentProbe
+from instance import runtime_dir
+from logpipe import setup_logging, PipeReader
+
+WEBUI_SH_URL = "https://raw.githubusercontent.com/AUTOMATIC1111/stable-diffusion-webui/master/webui.sh"
+# -O rather than -P, so downloading again replaces webui.sh instead of adding webui.sh.1 next to it.
+DOWNLOAD_WEBUI_SH = f"wget -q -O ../webui.sh {WEBUI_SH_URL}"
 
 def to_strict_bool(value):
   if not isinstance(value, str):
@@ -8,7 +15,7 @@ def to_strict_bool(value):
   return value.lower() == "true"
 
 class Utils:
-    logging_configured = False
+    log_pipeline = None
     def __init__(self, log_lvl=10):
         self.root = pathlib.Path(__file__).parent.resolve()
         self.webui_sh_fp = self.root.parent
@@ -16,109 +23,111 @@ class Utils:
         self.tooltip = "WebUI Server"
         self.webui_pid_fp =  "/tmp/webui.pid"
         self.tray_pid_fp = "/tmp/webui_tray.pid"
-        self.webui_lock_fp = "webui.lock"
-        self.log_fp = self.root.parent / "webui.log"
-        if not Utils.logging_configured:
-            self.log = logging.getLogger(__name__)
-            logging.basicConfig(level=log_lvl, format='%(asctime)s - %(levelname)s - %(message)s',
-                                datefmt='%m/%d/%Y %I:%M:%S %p', filemode="a", filename=self.log_fp)
-            self.log.addHandler(logging.StreamHandler())
-            self.log.addHandler(RotatingFileHandler(self.root / self.log_fp, maxBytes=500000, backupCount=2))
-            Utils.logging_configured = True
-
-    def get_log_file_path(self, log):
-        for handler in self.log.handlers:
-            if isinstance(handler, logging.handlers.RotatingFileHandler):
-                return handler.baseFilename
-        return None
+        self.webui_lock_fp = runtime_dir() / "instance.lock"
+        self.control_socket_fp = runtime_dir() / "control.sock"
+        self.webui_sh_path = pathlib.Path(os.environ.get("WEBUI_SH") or self.root.parent / "webui.sh")
+        self.data_dir = pathlib.Path(os.environ.get("WEBUI_DATA_DIR") or self.root.parent)
+        self.log_fp = self.data_dir / "webui.log"
+        self.first_run_log_fp = self.root / "webui_first_run.log"
+        self.timings_fp = self.data_dir / "webui_startup.jsonl"
+        self.runs_fp = self.data_dir / "webui_runs.jsonl"
+        self.webui_host = os.environ.get("WEBUI_HOST", "127.0.0.1")
+        self.webui_port = int(os.environ.get("WEBUI_PORT", "7860"))
+        self.ready_timeout = float(os.environ.get("WEBUI_READY_TIMEOUT", "600"))
+        self.stop_timeout = float(os.environ.get("WEBUI_STOP_TIMEOUT", "30"))
+        self.kill_timeout = float(os.environ.get("WEBUI_KILL_TIMEOUT", "10"))
+        self.max_crashes = int(os.environ.get("WEBUI_MAX_CRASHES", "5"))
+        self.crash_window = float(os.environ.get("WEBUI_CRASH_WINDOW", "600"))
+        self.on_demand = to_strict_bool(os.environ.get("WEBUI_ON_DEMAND", "False"))
+        self.backend_port = int(os.environ.get("WEBUI_BACKEND_PORT", "7861"))
+        self.idle_timeout = float(os.environ.get("WEBUI_IDLE_TIMEOUT", "1800"))
+        self.pool_mode = to_strict_bool(os.environ.get("WEBUI_POOL", "False"))
+        self.pool_size = int(os.environ.get("WEBUI_POOL_SIZE", "0"))
+        self.coalesce = to_strict_bool(os.environ.get("WEBUI_COALESCE", "False"))
+        self.coalesce_window = float(os.environ.get("WEBUI_COALESCE_WINDOW_MS", "50")) / 1000
+        self.coalesce_max_batch = int(os.environ.get("WEBUI_COALESCE_MAX_BATCH", "8"))
+        self.result_cache_enabled = to_strict_bool(os.environ.get("WEBUI_RESULT_CACHE", "False"))
+        self.result_cache_dir = pathlib.Path(os.environ.get("WEBUI_RESULT_CACHE_DIR") or self.data_dir / "result_cache")
+        self.result_cache_bytes = int(os.environ.get("WEBUI_RESULT_CACHE_MB", "2048")) * 1024 * 1024
+        self.webui_dir = pathlib.Path(os.environ.get("WEBUI_DIR") or self.webui_sh_path.parent / "stable-diffusion-webui")
+        self.prewarm = to_strict_bool(os.environ.get("WEBUI_PREWARM", "True"))
+        self.prewarm_models = os.environ.get("WEBUI_PREWARM_MODELS", "")
+        self.prewarm_rate = int(os.environ.get("WEBUI_PREWARM_RATE_MB", "512")) * 1024 * 1024
+        self.prewarm_reserve = int(os.environ.get("WEBUI_PREWARM_RESERVE_MB", "1024")) * 1024 * 1024
+        self.metrics_enabled = to_strict_bool(os.environ.get("WEBUI_METRICS", "False"))
+        self.metrics_port = int(os.environ.get("WEBUI_METRICS_PORT", "9860"))
+        self.metrics_interval = float(os.environ.get("WEBUI_METRICS_INTERVAL", "2"))
+        self.jobs_enabled = to_strict_bool(os.environ.get("WEBUI_JOBS", "False"))
+        self.jobs_dir = self.data_dir / "jobs"
+        self.jobs_output_dir = pathlib.Path(os.environ.get("WEBUI_JOBS_OUTPUT") or self.jobs_dir / "outputs")
+        self.jobs_concurrency = int(os.environ.get("WEBUI_JOBS_CONCURRENCY", "2"))
+        self.jobs_max_attempts = int(os.environ.get("WEBUI_JOBS_ATTEMPTS", "3"))
+        self.autotune_fp = self.data_dir / "webui_autotune.json"
+        self.autotune_apply = to_strict_bool(os.environ.get("WEBUI_AUTOTUNE", "True"))
+        self.autotune_runs = int(os.environ.get("WEBUI_AUTOTUNE_RUNS", "3"))
+        self.profiles_dir = self.data_dir / "webui_profiles"
+        self.profile_interval = float(os.environ.get("WEBUI_PROFILE_INTERVAL_MS", "10")) / 1000
+        self.profile_settle = float(os.environ.get("WEBUI_PROFILE_SETTLE", "120"))
+        self.sample_interval = float(os.environ.get("WEBUI_SAMPLE_INTERVAL", "2"))
+        self.gpu_sample_interval = float(os.environ.get("WEBUI_GPU_SAMPLE_INTERVAL", "10"))
+        self.log_max_bytes = int(os.environ.get("WEBUI_LOG_MAX_MB", "10")) * 1024 * 1024
+        self.log_rotate_interval = float(os.environ.get("WEBUI_LOG_ROTATE_HOURS", "24")) * 3600
+        self.log_backups = int(os.environ.get("WEBUI_LOG_BACKUPS", "5"))
+        if Utils.log_pipeline is None:
+            Utils.log_pipeline = setup_logging(self.log_fp, log_lvl, self.log_max_bytes,
+                                               self.log_rotate_interval, self.log_backups)
+        self.log_pipeline = Utils.log_pipeline
+        self.log = logging.getLogger(__name__)
+        self.environment_probe = EnvironmentProbe(log=logging.getLogger(__name__))
 
     def run_command_with_logging(self, command:str, log:logging):
-        log_file_path = self.get_log_file_path(log)
+        # Output goes through the log pipeline instead of handing the child our log file descriptor.
         requires_sudo = command.split(" ")[0].strip() == 'sudo'
-
+        log.info(f"Running command: {command}")
+        tail = collections.deque(maxlen=20)
+        result = None
         try:
-            if log_file_path:
-                with open(log_file_path, "a") as log_file:
-                    stream_handler = None
-                    for handler in log.handlers:
-                        if isinstance(handler, logging.StreamHandler):
-                            stream_handler = handler
-                            log.removeHandler(handler)
-                            break
-                    if requires_sudo:
-                        command = command.split(" ")
-                        proc = subprocess.Popen(command, stdout=log_file, stderr=subprocess.PIPE)
-                        stdout, stderr = proc.communicate()  # Wait for the command to complete
-                        result = proc.returncode
-                    else:
-                        completed_process = subprocess.run(command, stdout=log_file, stderr=subprocess.PIPE, shell=True)
-                        result = completed_process.returncode
-                    if stream_handler:
-                        log.addHandler(stream_handler)
-                    if isinstance(command, list):
-                        cmd = " ".join(command)
-                    else:
-                        cmd = command
-                    log.info(f"Running command: {cmd}")
-                    if result != 0:
-                        log.error(f"Command failed with return code {result}")
-                        log.error(stderr.decode('utf-8') if requires_sudo else completed_process.stderr.decode('utf-8'))
-                    else:
-                        log.info(f"Command executed successfully.")
+            proc = subprocess.Popen(command.split(" ") if requires_sudo else command, shell=not requires_sudo,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            reader = PipeReader(proc.stdout, self.log_pipeline.sink(self.log_fp), on_lines=lambda text: tail.extend(text.split("\n")))
+            reader.start()
+            result = proc.wait()
+            reader.join()
+            if result != 0:
+                log.error(f"Command failed with return code {result}")
+                log.error("\n".join(tail))
             else:
-                log.warning("RotatingFileHandler not found for logging. Output will go to the console.")
-                if requires_sudo:
-                    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-                    stdout, stderr = proc.communicate()  # Wait for the command to complete
-                    result = proc.returncode
-                else:
-                    completed_process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-                    result = completed_process.returncode
-                if isinstance(command, list):
-                    cmd = " ".join(command)
-                else:
-                    cmd = command
-                log.info(f"Running command: {cmd}")
-                if result != 0:
-                    log.error(f"Command failed with return code {result}")
-                    log.error(stderr.decode('utf-8') if requires_sudo else completed_process.stderr.decode('utf-8'))
-                else:
-                    log.info(f"Command executed successfully: {stdout.decode('utf-8') if requires_sudo else completed_process.stdout.decode('utf-8')}")
+                log.info(f"Command executed successfully.")
         except Exception as e:
-            if isinstance(command, list):
-                cmd = " ".join(command)
-            else:
-                cmd = command
-            log.error(f"An unknown error occurred while running command {cmd}: {str(e)}\n{traceback.format_exc()}")
+            log.error(f"An unknown error occurred while running command {command}: {str(e)}\n{traceback.format_exc()}")
         return result
 
+    def probes(self, refresh=False):
+        return self.environment_probe.results(refresh=refresh)
+
     def get_conda_conda_path(self):
-        try:
-            conda_prefix = os.environ.get("CONDA_PREFIX")
-            if conda_prefix:
-                conda_path = os.path.join(conda_prefix, "bin", "conda")
+        conda_prefix = os.environ.get("CONDA_PREFIX")
+        if conda_prefix:
+            conda_path = os.path.join(conda_prefix, "bin", "conda")
             if os.path.isfile(conda_path):
                 return conda_path
 
-            output = subprocess.check_output(["conda", "info", "--json"]).decode("utf-8")
-            info = json.loads(output)
-            return info.get("conda_prefix") + "/bin/conda"
-        except (subprocess.CalledProcessError, KeyError):
+        conda = self.probes()["conda"]
+        if conda is None or not conda.get("root_prefix"):
             return None
+        return conda["root_prefix"] + "/bin/conda"
 
     def get_conda_activate_path(self):
-        try:
-            conda_prefix = os.environ.get("CONDA_PREFIX")
-            if conda_prefix:
-                activate_path = os.path.join(conda_prefix, "bin", "activate")
-                if os.path.isfile(activate_path):
-                    return activate_path
-
-            output = subprocess.check_output(["conda", "info", "--json"]).decode("utf-8")
-            info = json.loads(output)
-            return info.get("conda_prefix") + "/bin/activate"
-        except (subprocess.CalledProcessError, KeyError):
+        conda_prefix = os.environ.get("CONDA_PREFIX")
+        if conda_prefix:
+            activate_path = os.path.join(conda_prefix, "bin", "activate")
+            if os.path.isfile(activate_path):
+                return activate_path
+
+        conda = self.probes()["conda"]
+        if conda is None or not conda.get("root_prefix"):
             return None
+        return conda["root_prefix"] + "/bin/activate"
         
     def detect_conda_environment(self):
         conda_env = os.environ.get("CONDA_DEFAULT_ENV")
@@ -139,33 +148,20 @@ class Utils:
         return de
 
     def detect_gpu_type(self):
-        try:
-            subprocess.check_output(["nvidia-smi", "--query-gpu=name", "--format=csv,noheader"], universal_newlines=True)
-            return "NVIDIA"
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            pass
-
-        rocm_smi_path = "/opt/rocm/bin/rocm-smi"  
-
-        if shutil.which(self, rocm_smi_path):
-            try:
-                subprocess.check_output([rocm_smi_path, "--showid"], universal_newlines=True)
-                return "AMD"
-            except subprocess.CalledProcessError:
-                pass
-        return None
+        gpu = self.probes()["gpu"]
+        return gpu["vendor"] if gpu else None
 
     def linux_commands_by_distro(self):
         if os.path.exists("/etc/debian_version"):
-            return ["sudo apt install wget git python3 python3-venv libgl1 libglib2.0-0", "wget -P .. -q https://raw.githubusercontent.com/AUTOMATIC1111/stable-diffusion-webui/master/webui.sh"]
+            return ["sudo apt install wget git python3 python3-venv libgl1 libglib2.0-0", DOWNLOAD_WEBUI_SH]
         elif os.path.exists("/etc/redhat-release") or os.path.exists("/etc/centos-release") or os.path.exists("/etc/fedora-release"):
-            return ["sudo dnf install wget git python3 gperftools-libs libglvnd-glx", "wget -P .. -q https://raw.githubusercontent.com/AUTOMATIC1111/stable-diffusion-webui/master/webui.sh"] 
+            return ["sudo dnf install wget git python3 gperftools-libs libglvnd-glx", DOWNLOAD_WEBUI_SH] 
         elif os.path.exists("/etc/SuSE-release") or os.path.exists("/etc/os-release"):
             with open("/etc/os-release", "r") as f:
                 if "opensuse" in f.read().lower():
-                    return ["sudo zypper install wget git python3 libtcmalloc4 libglvnd", "wget -P .. -q https://raw.githubusercontent.com/AUTOMATIC1111/stable-diffusion-webui/master/webui.sh"]
+                    return ["sudo zypper install wget git python3 libtcmalloc4 libglvnd", DOWNLOAD_WEBUI_SH]
         elif os.path.exists("/etc/arch-release"):
-            return ["sudo pacman -S wget git python3", "wget -P .. -q https://raw.githubusercontent.com/AUTOMATIC1111/stable-diffusion-webui/master/webui.sh"]
+            return ["sudo pacman -S wget git python3", DOWNLOAD_WEBUI_SH]
         else:
             return None
 
@@ -174,67 +170,78 @@ class Utils:
         print(char * os.get_terminal_size().columns)
         
     def is_conda_installed(self):
-        try:
-            subprocess.run(['conda', '--version'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
-            return False
+        return self.probes()["conda"] is not None
         
     def is_conda_environment_AUTO1111_present(self):
-        try:
-            result = subprocess.run(['conda', 'env', 'list'], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            output = result.stdout.decode('utf-8')
-            env_list = [line.split()[0] for line in output.splitlines() if line and not line.startswith('#')]
-            if "AUTO1111" in env_list:
-                return True
-        except (subprocess.CalledProcessError, FileNotFoundError):
+        conda = self.probes()["conda"]
+        if conda is None:
             return False
+        return any(pathlib.Path(env).name == "AUTO1111" for env in conda["envs"])
         
     def append_and_cleanup_log(self):
-        with open(self.root / "<Logger utils (DEBUG)>", "r") as f:
-            lines = f.readlines()
-            for line in lines:
-                with open(self.webui_sh_fp / "webui.log", "a") as f:
-                    if len(line.strip()) > 2:
-                        if "%" in line.strip()[1:3] and line.strip()[0] != 1:
-                            continue
-                    f.writelines(line.strip() + "\n")
-                   
-        
-        pathlib.Path(self.root / "<Logger utils (DEBUG)>").unlink()
-        
+        # Progress bar lines ("  45%|####") are dropped, the rest is appended to webui.log in one write.
+        with open(self.first_run_log_fp, "r", errors="replace") as f:
+            lines = [line.strip() for line in f]
+        kept = [line for line in lines if not (len(line) > 2 and "%" in line[1:3])]
+        self.log_pipeline.write(self.log_fp, "".join(line + "\n" for line in kept).encode("utf-8"))
+        self.log_pipeline.flush()
+        self.first_run_log_fp.unlink()
+
 class Setup(Utils):
     def __init__(self, log_lvl=10):
         super().__init__(log_lvl)
         self.conda_env = self.detect_conda_environment()
-
-    def run_prerequisites(self):
+        self.setup_logs_dir = self.root.parent / "setup_logs"
+        self.setup_workers = int(os.environ.get("WEBUI_SETUP_WORKERS", "4"))
+        self.setup_state_fp = self.root.parent / "setup_state.json"
+        self.setup_force = to_strict_bool(os.environ.get("WEBUI_SETUP_FORCE", "False"))
+        self.purge_caches = to_strict_bool(os.environ.get("WEBUI_SETUP_PURGE_CACHES", "False"))
+        self.model_store_dir = pathlib.Path(os.environ.get("WEBUI_MODEL_STORE") or self.root.parent / "model_store")
+        installs = os.environ.get("WEBUI_MODEL_INSTALLS") or str(self.root.parent / "stable-diffusion-webui")
+        self.model_installs = [pathlib.Path(install) for install in installs.split(":") if install]
+        self.model_link_mode = os.environ.get("WEBUI_MODEL_LINK_MODE", "auto")
+        self.model_hash_workers = int(os.environ.get("WEBUI_MODEL_HASH_WORKERS", "4"))
+
+    def prerequisite_steps(self):
         commands = self.linux_commands_by_distro()
-        if self.is_conda_installed():
-            if not self.is_conda_environment_AUTO1111_present():
-                commands.insert(0, "conda run -n AUTO1111 pip install -r requirements.txt")
-                commands.insert(0, "conda create --name AUTO1111 python=3.10.6 -y")
-                commands.insert(0, "conda clean --all -y")
-                commands.insert(0, "pip cache purge")
-            else:
-                commands.insert(0, "conda clean --all -y")
-                commands.insert(0, "pip cache purge")
-        else:
+        if commands is None:
+            self.log.critical("Unsupported Linux distribution, install the prerequisites manually and try again.")
+            raise Exception("Unsupported Linux distribution, install the prerequisites manually and try again.")
+        if not self.is_conda_installed():
             self.log.critical("Conda is not installed. Please setup anaconda3, or miniconda, and try again.")
             raise Exception("Conda is not installed. Please setup anaconda3, or miniconda, and try again.")
-        for command in commands:
-            try:
-                result = self.run_command_with_logging(command, self.log)
-            except Exception as e:
-                self.log.error(f"An unknown error occurred while running command {' '.join(command)}: {str(e)}\n{traceback.format_exc()}")
-        return result
-    
+
+        packages_command, download_command = commands
+        steps = [
+            Step("system_packages", packages_command, interactive=True),
+            Step("download_webui_sh", download_command, outputs=["../webui.sh"]),
+        ]
+        # Purging only makes the reinstall below download everything again, so it has to be asked for.
+        purge = self.purge_caches
+        if purge:
+            steps += [Step("pip_cache_purge", "pip cache purge", always_run=True),
+                      Step("conda_clean", "conda clean --all -y", always_run=True)]
+        pip_deps = ["pip_cache_purge"] if purge else []
+        if not self.is_conda_environment_AUTO1111_present():
+            steps.append(Step("conda_create_env", "conda create --name AUTO1111 python=3.10.6 -y",
+                              deps=["conda_clean"] if purge else []))
+            pip_deps.append("conda_create_env")
+        # Always part of the graph, but skipped unless requirements.txt changed since the last install.
+        steps.append(Step("pip_install_requirements", "conda run -n AUTO1111 pip install -r requirements.txt",
+                          deps=pip_deps, inputs=["requirements.txt"]))
+        return steps
+
+    def run_prerequisites(self):
+        graph = StepGraph(self.prerequisite_steps(), self.log, self.setup_logs_dir, cwd=self.root,
+                          max_workers=self.setup_workers, state_fp=self.setup_state_fp, force=self.setup_force)
+        return graph.run()
+
     def webui_sh_first_run_conda(self):
         webui_sh_path = pathlib.Path(self.root.parent, "webui.sh")
         webui_sh_path.chmod(webui_sh_path.stat().st_mode | stat.S_IEXEC)
         activate_path = self.get_conda_activate_path()
 
-        install = f"source {activate_path} AUTO1111 && exec bash -c '\"../webui.sh\" 2>&1 | tee \"{self.log}\"'"
+        install = f"source {activate_path} AUTO1111 && exec bash -c '\"../webui.sh\" 2>&1 | tee \"{self.first_run_log_fp}\"'"
 
         self.terminal_divider()
         print("Wait for webui.sh to finish installing, and the browser page to load. Then cntrl+c to close the webui.sh terminal.")
@@ -281,12 +288,12 @@ you can do this by running 'conda env remove AUTO1111'")
 
         # Commands to run webui.sh
         commands = [
-            f"{activate_env_command} && exec bash -c '{script_path} | tee -a {self.log}'"
+            f"{activate_env_command} && exec bash -c '{script_path} | tee -a {self.first_run_log_fp}'"
         ]
 
         # Execute commands in a new terminal
         for command in commands:
-            if command.endswith(f"'{script_path} | tee -a {self.log}'"):
+            if command.endswith(f"'{script_path} | tee -a {self.first_run_log_fp}'"):
                 if os.environ.get("DESKTOP_SESSION") == "gnome":
                     terminal = ['gnome-terminal', '--', 'bash', '-c']
                 elif os.environ.get("DESKTOP_SESSION") in ["kde", "plasma"]:
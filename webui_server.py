@@ -1,91 +1,511 @@
-from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction,\
-    QVBoxLayout, QLabel, QPushButton, QDialog
-from PyQt5.QtGui import QIcon
+# Qt is deliberately not imported here: the lock check, env parsing and spawning all happen
+# before the tray is created, and daemon mode never loads Qt at all.
 from dotenv import load_dotenv, set_key
 from utils import Utils, to_strict_bool, os, sys, signal, subprocess,\
     logging, traceback
-import time
+from readiness import ReadinessWatcher
+from supervisor import Supervisor
+from resources import ResourceSampler, summary
+from activation import ActivationProxy
+from pool import InstancePool
+from http_proxy import ProxyServer, Forwarder
+from coalescer import Coalescer
+from result_cache import ResultCache
+from prewarm import Prewarmer, resolve_models
+from logpipe import PipeReader
+from shutdown import ShutdownCoordinator
+from metrics import MetricsServer, ProgressSampler
+from startup_profile import StartupProfiler
+from autotune import tuned_flags
+from job_queue import JobQueue
+from instance import InstanceLock, ControlServer, send_command, COMMANDS
+import threading, webbrowser, collections, json, time
 
 load_dotenv()
 LOGLEVEL = int(os.environ["WEBUI_LOGLEVEL"])
 HEADLESS = to_strict_bool(os.environ["WEBUI_HEADLESS"])
 HIDDEN = to_strict_bool(os.environ["WEBUI_HIDDEN"])
+DAEMON = to_strict_bool(os.environ.get("WEBUI_DAEMON", "False")) or "--daemon" in sys.argv
+PROFILE = "--profile" in sys.argv
+COMMAND = next((arg for arg in sys.argv[1:] if arg in COMMANDS), None)
 
 class Runner(Utils):
-    def __init__(self, log_lvl=10):
+    def __init__(self, log_lvl=10, daemon=False, command=None):
         super().__init__(log_lvl)
+        self.daemon = daemon
+        self.hidden = True
+        self.headless = False
+        self.readiness = None
+        self.supervisor = None
+        self.webui_proc = None
+        self.tray = None
+        self.control = None
+        self.resources = None
+        self.activation = None
+        self.pool = None
+        self.proxy = None
+        self.coalescer = None
+        self.result_cache = None
+        self.prewarmer = None
+        self.metrics = None
+        self.progress_sampler = None
+        self.launches = 0
+        self.manual_restarts = 0
+        self.profile_next = False
+        self.profiler = None
+        self.jobs = None
+        self.server_port = self.webui_port
+        self.instance_lock = InstanceLock(self.webui_lock_fp)
+        self.exit_requested = threading.Event()
+        self.restart_lock = threading.Lock()
+        self.restarts = collections.deque(maxlen=20)
+        self.shutdown = ShutdownCoordinator(grace=self.stop_timeout, kill_grace=self.kill_timeout,
+                                            gpu_source=lambda: self.probes()["gpu"], log=self.log)
 
-        if self.is_running():
-            print("Another instance is already running.")
-            self.show_instance_running_dialog()
+        # A second invocation hands its command to the running instance instead of starting up.
+        if self.is_running() or not self.create_lockfile():
+            self.forward_command(command or "open")
+        if command not in (None, "open"):
+            print("WebUI Server is not running.")
             sys.exit(1)
 
-        self.create_lockfile()
+        self.control = ControlServer(self.control_socket_fp, {
+            "open": self.open_browser,
+            "restart": self.in_background(self.restart_webui, "restarting"),
+            "profile": self.in_background(self.profile_launch, "restarting with profiling, see status for the report"),
+            "status": self.status,
+            "stop": self.request_exit,
+        }, log=self.log)
+        self.control.start()
 
-        signal.signal(signal.SIGTERM, self.cleanup)
-        signal.signal(signal.SIGINT, self.cleanup)
+        # The WebUI runs in its own session and would outlive us, so a signal takes the same stop path as Exit.
+        # The daemon loop or the tray timer picks the request up, the handler itself must not block.
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.request_exit())
+        signal.signal(signal.SIGINT, lambda signum, frame: self.request_exit())
 
     def is_running(self):
-        return os.path.exists(self.webui_lock_fp)
+        return self.instance_lock.is_held_elsewhere()
 
     def create_lockfile(self):
-        with open(self.webui_lock_fp, 'w') as f:
-            f.write(str(os.getpid()))
+        return self.instance_lock.acquire()
 
-    def cleanup(self, signum=None, frame=None):
+    def forward_command(self, command):
         try:
-            os.remove(self.webui_lock_fp)
-        except FileNotFoundError:
-            pass
-        QApplication.instance().quit()
+            response = send_command(self.control_socket_fp, command)
+        except OSError as e:
+            print(f"Another instance is already running (PID {self.instance_lock.owner_pid()}) "
+                  f"but it did not answer on {self.control_socket_fp}: {e}")
+            if not self.daemon:
+                self.show_instance_running_dialog()
+            sys.exit(1)
+        if not response.get("ok"):
+            print(response.get("error"))
+            sys.exit(1)
+        result = response.get("result")
+        print(json.dumps(result, indent=2) if isinstance(result, dict) else result)
         sys.exit(0)
 
-    def launch_webui(self, hidden=True, headless=False):
-        parent_dir = self.root.parent
-        webui_script = parent_dir / "webui.sh"
-        command = [str(webui_script)]
+    def open_browser(self):
+        url = f"http://{self.webui_host}:{self.webui_port}"
+        threading.Thread(target=webbrowser.open, args=(url,), daemon=True).start()
+        return url
 
-        if os.name == 'posix':
-            if os.environ.get("DESKTOP_SESSION") == "gnome":
-                terminal = ['gnome-terminal', '--']
-            elif os.environ.get("DESKTOP_SESSION") in ["kde", "plasma"]:
-                terminal = ['konsole', '-e']
-            else:
-                terminal = ['xterm', '-e']
+    def in_background(self, task, reply):
+        # A restart waits up to stop_timeout + kill_timeout for the old WebUI, far longer than a control client
+        # waits for its answer, so the command is acknowledged right away. status shows how it went.
+        def run():
+            try:
+                task()
+            except Exception as e:
+                self.log.error(f"{task.__name__} failed: {e}")
 
-            if headless:
-                command.append("--nowebui")
+        def handler():
+            threading.Thread(target=run, name=f"webui-control-{task.__name__}", daemon=True).start()
+            return reply
+        return handler
 
-            if hidden:
-                log_file_path = None
-                for handler in self.log.handlers:
-                    if isinstance(handler, logging.handlers.RotatingFileHandler):
-                        log_file_path = handler.baseFilename
-                        break
+    def request_exit(self):
+        self.exit_requested.set()
+        return "stopping"
 
-                if log_file_path:
-                    with open(log_file_path, "a") as log_file:
-                        proc = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT, preexec_fn=os.setsid)
-                else:
-                    self.log.warning("RotatingFileHandler not found for logging. Output will go to the console.")
-                    proc = subprocess.Popen(command, preexec_fn=os.setsid)
+    def status(self):
+        return {
+            "pid": os.getpid(),
+            # Pool instances report their own PIDs, the PID file never belongs to them.
+            "webui_pid": self.owned_proc().pid if self.owned_proc() is not None else None,
+            "webui_pids": [instance.supervisor.proc.pid for instance in self.pool.instances
+                           if instance.supervisor and instance.supervisor.proc] if self.pool else None,
+            "mode": "daemon" if self.daemon else "tray",
+            "url": f"http://{self.webui_host}:{self.webui_port}",
+            "state": self.status_tooltip(),
+            "ready": self.readiness is not None and self.readiness.ready.is_set(),
+            "time_to_ready": self.readiness.time_to_ready() if self.readiness else None,
+            "runs": len(self.supervisor.history) + 1 if self.supervisor else 1,
+            "resources": self.resources.latest() if self.resources else None,
+            "on_demand": self.activation.stats() if self.activation else None,
+            "pool": self.pool.stats() if self.pool else None,
+            "coalescer": self.coalescer.stats() if self.coalescer else None,
+            "result_cache": self.result_cache.stats() if self.result_cache else None,
+            "restarts": list(self.restarts),
+            "jobs": self.jobs.stats() if self.jobs else None,
+            "launch_flags": tuned_flags(self.autotune_fp, self.probes()["gpu"]) if self.autotune_apply else [],
+            "metrics": self.metrics.url if self.metrics else None,
+            "profile": str(self.profiler.report_fp or self.profiler.profile_dir) if self.profiler else None,
+            "prewarm": {"progress": self.prewarmer.progress(), "files": self.prewarmer.files,
+                        "warmed_bytes": self.prewarmer.warmed_bytes} if self.prewarmer else None,
+        }
+
+    def restart_webui(self):
+        if self.activation is not None:
+            # Not under the restart lock, stop_backend takes it from the activation thread.
+            return self.restart_on_demand()
+        with self.restart_lock:
+            self.log.info("Restarting WebUI.")
+            started = time.monotonic()
+            self.manual_restarts += 1
+            if self.pool is not None:
+                self.pool.restart()
+                stopped = self.pool.last_stop
+                pids = [instance.supervisor.proc.pid for instance in self.pool.instances]
+                watchers = [instance.readiness for instance in self.pool.instances]
             else:
-                full_command = terminal + command
-                proc = subprocess.Popen(full_command)
-        else:
+                if self.supervisor is not None:
+                    self.supervisor.stop()
+                    if self.supervisor.proc is not None:
+                        self.close(self.supervisor.proc.pid)
+                    self.supervisor.join(60)
+                    stopped = time.monotonic()
+                    proc = self.supervisor.start()
+                else:
+                    if self.webui_proc is not None and self.webui_proc.poll() is None:
+                        self.close(self.webui_proc.pid)
+                    stopped = time.monotonic()
+                    proc = self.webui_proc = self.spawn_webui(self.hidden, self.headless)
+                    self.save_pid(proc.pid, self.webui_pid_fp)
+                pids = [proc.pid]
+                watchers = [self.readiness]
+            return self.record_restart(started, stopped, pids, watchers)
+
+    def restart_on_demand(self):
+        # Through the activation proxy, so a connection arriving during the restart waits for this server
+        # instead of starting a second one.
+        self.log.info("Restarting WebUI.")
+        started = time.monotonic()
+        self.manual_restarts += 1
+        stopped = self.activation.restart_backend()
+        return self.record_restart(started, stopped, [self.supervisor.proc.pid], [self.readiness])
+
+    def record_restart(self, started, stopped, pids, watchers):
+        record = {"time": time.time(), "stop": stopped - started, "start": None}
+        self.restarts.append(record)
+        threading.Thread(target=self.time_restart, args=(record, stopped, watchers),
+                         name="webui-restart-timer", daemon=True).start()
+        return {"pids": pids, "stop": record["stop"]}
+
+    def profile_launch(self):
+        # Restarts the WebUI once with import tracing and stack sampling, see start_profiler.
+        if self.pool is not None:
+            return "Startup profiling is not available in pool mode."
+        self.profile_next = True
+        self.restart_webui()
+        return str(self.profiler.profile_dir) if self.profiler else None
+
+    def start_profiler(self, hidden):
+        self.profile_next = False
+        if not hidden:
+            self.log.warning("Startup profiling needs the WebUI output, set WEBUI_HIDDEN='True' to use it.")
+            return None
+        self.profiler = StartupProfiler(self.profiles_dir, self.webui_dir, interval=self.profile_interval,
+                                        settle=self.profile_settle, timeout=self.ready_timeout, log=self.log)
+        self.log.info(f"Profiling this launch into {self.profiler.profile_dir}.")
+        return self.profiler
+
+    def time_restart(self, record, stopped, watchers):
+        if all(watcher is not None and watcher.wait(self.ready_timeout) for watcher in watchers):
+            record["start"] = max(watcher.started_at + watcher.time_to_ready() for watcher in watchers) - stopped
+            self.log.info(f"Restart took {record['stop']:.1f}s to stop and {record['start']:.1f}s to be ready again.")
+
+    def cleanup(self, signum=None, frame=None):
+        if self.control is not None:
+            self.control.stop()
+            self.control = None
+        if self.metrics is not None:
+            self.metrics.stop()
+            self.progress_sampler.stop()
+            self.metrics = None
+        if self.jobs is not None:
+            self.jobs.stop()
+            self.jobs = None
+        self.resources = None
+        self.activation = None
+        self.pool = None
+        self.proxy = None
+        self.coalescer = None
+        self.result_cache = None
+        self.server_port = self.webui_port
+        self.instance_lock.release()
+        if self.tray is not None:
+            self.tray.quit()
+        sys.exit(0)
+
+    def start_metrics(self):
+        # Served from its own threads and built from counters the sampler already holds, so scrapes
+        # never wait on the WebUI or the Qt event loop.
+        if not self.metrics_enabled:
+            return
+        self.progress_sampler = ProgressSampler(self.metric_targets, interval=self.metrics_interval, log=self.log)
+        self.progress_sampler.start()
+        try:
+            self.metrics = MetricsServer(self.metrics_port, self.metric_families, log=self.log)
+        except OSError as e:
+            self.log.error(f"Could not serve metrics on port {self.metrics_port}: {e}")
+            return
+        self.metrics.start()
+        self.log.info(f"Serving metrics on {self.metrics.url}.")
+
+    def start_jobs(self):
+        # Jobs go through WEBUI_PORT, so the pool, the front proxy and on-demand start-up all apply to them.
+        if not self.jobs_enabled:
+            return
+        self.jobs = JobQueue(self.webui_host, self.webui_port, self.jobs_dir, self.jobs_output_dir,
+                             concurrency=self.jobs_concurrency, max_attempts=self.jobs_max_attempts,
+                             ready=self.accepting_jobs, log=self.log)
+        self.jobs.start()
+        self.log.info(f"Job queue watching {self.jobs.inbox} for prompt files.")
+
+    def accepting_jobs(self):
+        if self.activation is not None:
+            return True
+        return any(running for _, running in self.metric_targets())
+
+    def watched_servers(self):
+        if self.pool is not None:
+            return [(instance.port, instance.readiness, instance.supervisor) for instance in self.pool.instances]
+        return [(self.server_port, self.readiness, self.supervisor)]
+
+    def metric_targets(self):
+        targets = []
+        for port, readiness, supervisor in self.watched_servers():
+            running = readiness is not None and readiness.ready.is_set() and \
+                (readiness.proc is None or readiness.proc.poll() is None)
+            targets.append((port, running))
+        return targets
+
+    def metric_families(self):
+        servers = self.watched_servers()
+        history = [run for _, _, supervisor in servers if supervisor is not None for run in supervisor.history]
+        exit_codes = collections.Counter(run["exit_code"] for run in history)
+        last_restart = self.restarts[-1] if self.restarts else {}
+        families = [
+            ("webui_launches_total", "counter", "Times webui.sh was started.", [({}, self.launches)]),
+            ("webui_restarts_total", "counter", "WebUI restarts, requested or after a crash.",
+             [({"reason": "manual"}, self.manual_restarts),
+              ({"reason": "crash"}, sum(1 for run in history if run["restart_delay"] is not None))]),
+            ("webui_exits_total", "counter", "Exits of webui.sh by exit code.",
+             [({"code": code}, count) for code, count in sorted(exit_codes.items(), key=str)]),
+            ("webui_last_exit_code", "gauge", "Exit code of the last webui.sh run.",
+             [({}, history[-1]["exit_code"])] if history else []),
+            ("webui_up", "gauge", "Whether webui.sh is running.",
+             [({"port": port}, supervisor is not None and supervisor.state == "Running")
+              for port, _, supervisor in servers]),
+            ("webui_ready", "gauge", "Whether the WebUI is accepting requests.",
+             [({"port": port}, readiness is not None and readiness.ready.is_set()) for port, readiness, _ in servers]),
+            ("webui_time_to_ready_seconds", "gauge", "Seconds from spawning webui.sh to the port accepting requests.",
+             [({"port": port}, readiness.time_to_ready()) for port, readiness, _ in servers if readiness is not None]),
+            ("webui_restart_stop_seconds", "gauge", "Seconds the last restart spent stopping the WebUI.",
+             [({}, last_restart.get("stop"))]),
+            ("webui_restart_start_seconds", "gauge", "Seconds the last restart took to be ready again.",
+             [({}, last_restart.get("start"))]),
+        ]
+        if self.pool is not None:
+            families.append(("webui_pool_in_flight", "gauge", "API calls being forwarded to each instance.",
+                             [({"port": instance.port}, instance.in_flight) for instance in self.pool.instances]))
+        return families + self.progress_sampler.families()
+
+    def launch_webui(self, hidden=True, headless=False, profile=False):
+        if os.name != 'posix':
             self.log.error("Windows support is not yet implemented.")
             sys.exit(1)
 
+        self.hidden = hidden
+        self.headless = headless
+        self.profile_next = profile
+        front_proxy = self.wants_front_proxy(headless)
+        if front_proxy:
+            self.server_port = self.backend_port
+        if hidden:
+            self.create_supervisor()
+            proc = self.supervisor.start()
+        else:
+            proc = self.webui_proc = self.spawn_webui(hidden, headless)
+        if front_proxy:
+            self.start_front_proxy(Forwarder("127.0.0.1", self.server_port))
+
+        return proc.pid
+
+    def wants_front_proxy(self, headless):
+        if (self.coalesce or self.result_cache_enabled) and not headless:
+            self.log.warning("Request coalescing and result caching only apply to the API, "
+                             "set WEBUI_HEADLESS='True' to use them.")
+            return False
+        return self.coalesce or self.result_cache_enabled
+
+    def start_front_proxy(self, upstream):
+        # The tray takes over WEBUI_PORT and passes API calls through these layers to the server(s).
+        app = upstream
+        if self.coalesce and self.headless:
+            self.coalescer = Coalescer(app, window=self.coalesce_window, max_batch=self.coalesce_max_batch,
+                                       log=self.log)
+            app = self.coalescer
+        if self.result_cache_enabled and self.headless:
+            # In front of the coalescer, so repeated requests never take a slot in a batch.
+            self.result_cache = ResultCache(app, self.result_cache_dir, self.result_cache_bytes, log=self.log)
+            app = self.result_cache
+        self.proxy = ProxyServer(self.webui_host, self.webui_port, app, log=self.log)
+        self.proxy.start()
+
+    def launch_on_demand(self, headless=False):
+        # The tray owns the public port and only starts the server, on a private port, once someone connects.
+        self.hidden = True
+        self.headless = headless
+        self.server_port = self.backend_port
+        self.create_supervisor()
+        self.activation = ActivationProxy(self.webui_host, self.webui_port, "127.0.0.1", self.server_port,
+                                          start_backend=self.supervisor.start, stop_backend=self.stop_backend,
+                                          wait_ready=lambda timeout: self.readiness.wait(timeout),
+                                          backend_alive=self.supervisor.is_alive,
+                                          idle_timeout=self.idle_timeout, ready_timeout=self.ready_timeout,
+                                          log=self.log)
+        self.activation.start()
+
+    def launch_pool(self, headless=False):
+        if not headless:
+            # The balancer buffers whole responses, drops Upgrade and has no session affinity, so the Gradio UI's
+            # websockets, streaming and per-session state cannot go through it.
+            self.log.error("Pool mode only balances the API, set WEBUI_HEADLESS='True' to use it.")
+            sys.exit(1)
+        gpu = self.probes()["gpu"]
+        size = self.pool_size or (len(gpu["names"]) if gpu else 1)
+        self.hidden = True
+        self.headless = headless
+        self.pool = InstancePool(self, size, gpu["vendor"] if gpu else None, headless=headless)
+        self.pool.start()
+        self.start_front_proxy(self.pool)
+        self.log.info(f"Started {size} WebUI instances on ports {self.backend_port}-{self.backend_port + size - 1}, "
+                      f"balanced on {self.webui_host}:{self.webui_port}.")
+
+    def stop_backend(self):
+        with self.restart_lock:
+            self.supervisor.stop()
+            if self.supervisor.proc is not None:
+                self.close(self.supervisor.proc.pid)
+            self.supervisor.join(60)
+
+    def create_supervisor(self):
+        self.supervisor = Supervisor(lambda: self.spawn_webui(self.hidden, self.headless),
+                                     on_spawn=lambda proc: self.save_pid(proc.pid, self.webui_pid_fp),
+                                     on_exit=lambda proc: self.remove_pid(proc.pid, self.webui_pid_fp),
+                                     history_fp=self.runs_fp, max_crashes=self.max_crashes,
+                                     crash_window=self.crash_window, log=self.log)
+        self.resources = ResourceSampler(self.webui_pgid, gpu_source=lambda: self.probes()["gpu"],
+                                         interval=self.sample_interval, gpu_interval=self.gpu_sample_interval,
+                                         log=self.log)
+        self.resources.start()
+
+    def start_prewarm(self):
+        # Pulls the checkpoint into the page cache while webui.sh is still activating the venv.
+        if not self.prewarm or (self.prewarmer is not None and self.prewarmer.is_alive()):
+            return
+        paths = resolve_models(self.webui_dir, self.prewarm_models)
+        if not paths:
+            self.log.debug("No model files to prewarm.")
+            return
+        self.prewarmer = Prewarmer(paths, rate=self.prewarm_rate, reserve=self.prewarm_reserve,
+                                   timings_fp=self.timings_fp, log=self.log)
+        self.prewarmer.start()
+
+    def launch_flags(self, index=0):
+        # The fastest stable flags autotune.py found for this GPU model, if it has been run.
+        if not self.autotune_apply:
+            return []
+        flags = tuned_flags(self.autotune_fp, self.probes()["gpu"], index)
+        if flags:
+            self.log.info(f"Using tuned launch flags: {' '.join(flags)}")
+        return flags
+
+    def webui_pgid(self):
+        # spawn_webui starts the hidden child with setsid, so its PID is also its process group.
+        proc = self.supervisor.proc if self.supervisor is not None else None
+        if proc is None or proc.poll() is not None:
+            return None
         return proc.pid
 
-    def close(self, pid):
+    def spawn_webui(self, hidden=True, headless=False, instance=None):
+        # Pool instances carry their own port, device pinning, log file and readiness watcher.
+        target = instance or self
+        port = instance.port if instance is not None else self.server_port
+        command = [str(self.webui_sh_path)]
+
+        if os.environ.get("DESKTOP_SESSION") == "gnome":
+            terminal = ['gnome-terminal', '--']
+        elif os.environ.get("DESKTOP_SESSION") in ["kde", "plasma"]:
+            terminal = ['konsole', '-e']
+        else:
+            terminal = ['xterm', '-e']
+
+        if headless:
+            command.append("--nowebui")
+        if port != self.webui_port:
+            command += ["--port", str(port)]
+        if instance is not None:
+            command.append("--api")
+        command += self.launch_flags(instance.index if instance is not None else 0)
+        env = dict(os.environ, **instance.env) if instance is not None else None
+        profiler = self.start_profiler(hidden) if self.profile_next and instance is None else None
+        if profiler is not None:
+            env = dict(os.environ, **profiler.env())
+
+        if target.readiness is not None:
+            target.readiness.stop()
+
+        self.start_prewarm()
+        self.launches += 1
+        spawn_started = time.monotonic()
+        if hidden:
+            # Output is drained by a reader thread into the log pipeline, which also feeds readiness.
+            log_fp = instance.log_fp if instance is not None else self.log_fp
+            proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    preexec_fn=os.setsid, env=env)
+        else:
+            full_command = terminal + command
+            proc = subprocess.Popen(full_command)
+
+        # The terminal wrapper exits independently of the server, so only watch the child when hidden.
+        target.readiness = ReadinessWatcher(self.webui_host, port,
+                                            proc=proc if hidden else None,
+                                            timings_fp=self.timings_fp, spawn_started=spawn_started,
+                                            timeout=self.ready_timeout, log=self.log)
+        if hidden:
+            sink = self.log_pipeline.sink(log_fp)
+            if profiler is not None:
+                sink = profiler.sink(sink)
+                profiler.watch(target.readiness)
+            PipeReader(proc.stdout, sink, on_lines=target.readiness.feed_line,
+                       name=f"webui-output-{proc.pid}").start()
+        if self.prewarmer is not None:
+            target.readiness.annotations.append(self.prewarmer.annotate)
+        target.readiness.start()
+        return proc
+
+    def close(self, pid, port=None):
+        # Blocks until the whole process group is gone and the port and GPU memory are free again.
         if isinstance(pid, str):
             pid = int(pid)
         try:
-            os.killpg(os.getpgid(pid), signal.SIGTERM)
-            self.log.info("WebUI terminated.")
-        except ProcessLookupError:
-            self.log.error("WebUI process not found.")
+            result = self.shutdown.stop(pid, "127.0.0.1", port or self.server_port)
+            if result["exited"] is None:
+                self.log.error("WebUI process not found.")
+            return result
         except Exception as e:
             self.log.error(f"Error closing WebUI: {e}\n\n{traceback.format_exc()}")
 
@@ -93,61 +513,123 @@ class Runner(Utils):
         with open(pid_fp, 'w') as f:
             f.write(str(pid))
 
+    def remove_pid(self, pid, pid_fp):
+        # Only our own child's PID, so an exiting run never removes a file a newer run just wrote.
+        try:
+            with open(pid_fp, 'r') as f:
+                if int(f.read()) != pid:
+                    return
+            os.unlink(pid_fp)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def owned_proc(self):
+        # The child this Runner started itself. The PID file is only informational and is never signalled,
+        # the PID in it may be stale and reused by an unrelated process.
+        if self.pool is not None:
+            return None
+        if self.supervisor is not None:
+            return self.supervisor.proc
+        return self.webui_proc
+
     def load_pid(self, pid_fp):
         try:
             with open(pid_fp, 'r') as f:
                 return int(f.read())
-        except FileNotFoundError:
+        except (FileNotFoundError, ValueError):
             self.log.error("No PID file found.")
             return None
 
     def create_tray_icon(self, icon_path):
-        app = QApplication(sys.argv)
-        tray = QSystemTrayIcon(QIcon(str(icon_path)), app)
+        from tray import Tray
+        self.tray = Tray(self, icon_path)
+        sys.exit(self.tray.exec())
 
-        tray.setToolTip(self.tooltip)
+    def serve_forever(self):
+        self.log.info("Running headless daemon, send SIGTERM to stop.")
+        while not self.exit_requested.is_set():
+            with self.restart_lock:
+                # In on-demand mode a stopped server just means it is idle.
+                if self.pool is not None:
+                    if not self.pool.is_alive():
+                        break
+                elif self.activation is None and (self.supervisor is None or not self.supervisor.is_alive()):
+                    break
+            self.exit_requested.wait(1.0)
+        if self.exit_requested.is_set():
+            self.on_exit()
+        status = 1 if self.supervisor is not None and self.supervisor.gave_up else 0
+        self.cleanup()
+        sys.exit(status)
 
-        menu = QMenu()
-        exit_action = QAction("Exit")
-        exit_action.triggered.connect(self.on_exit)
-        menu.addAction(exit_action)
+    def status_tooltip(self):
+        status = self.readiness_status()
+        sample = self.resources.latest() if self.resources is not None else None
+        if sample is not None:
+            status += "\n" + summary(sample)
+        if self.prewarmer is not None and self.prewarmer.is_alive():
+            status += f"\nPrewarming model {self.prewarmer.progress():.0%}"
+        jobs = self.jobs.summary() if self.jobs is not None else None
+        if jobs is not None:
+            status += "\n" + jobs
+        return status
 
-        tray.setContextMenu(menu)
-        tray.show()
+    def readiness_status(self):
+        if self.pool is not None:
+            return f"{self.tooltip} pool:" + "".join(
+                f"\nGPU {i['gpu']} :{i['port']} {i['state']} ({i['in_flight']} in flight)"
+                for i in self.pool.stats())
+        if self.activation is not None and not self.activation.backend_running:
+            return f"{self.tooltip}: Idle, starts on first request"
+        if self.supervisor is not None and self.supervisor.state != "Running":
+            return f"{self.tooltip}: {self.supervisor.state}"
+        if self.readiness is None:
+            return self.tooltip
+        if self.readiness.ready.is_set():
+            return f"{self.tooltip}: Ready ({self.readiness.time_to_ready():.0f}s to start)"
+        if self.readiness.done.is_set():
+            return f"{self.tooltip}: {self.readiness.state}"
+        return f"{self.tooltip}: {self.readiness.state} ({self.readiness.elapsed():.0f}s)"
 
-        sys.exit(app.exec_())
-    
     def show_instance_running_dialog(self):
-        app = QApplication(sys.argv)
-        
-        dialog = QDialog()
-        dialog.setWindowTitle("Error:")
-
-        layout = QVBoxLayout()
-        label = QLabel("Instance already running!")
-        layout.addWidget(label)
-
-        ok_button = QPushButton("OK")
-        ok_button.clicked.connect(dialog.accept)
-        layout.addWidget(ok_button)
-
-        dialog.setLayout(layout)
-        dialog.exec_()
+        from tray import show_instance_running_dialog
+        show_instance_running_dialog()
 
     def on_exit(self):
-        pid = self.load_pid(self.webui_pid_fp)
-        if pid is not None:
-            self.close(pid)
-        self.cleanup()
+        try:
+            if self.jobs is not None:
+                self.jobs.stop()
+            if self.pool is not None:
+                self.pool.stop()
+            if self.supervisor is not None:
+                self.supervisor.stop()
+            proc = self.owned_proc()
+            if proc is not None and proc.poll() is None:
+                self.close(proc.pid)
+            if proc is not None:
+                self.remove_pid(proc.pid, self.webui_pid_fp)
+        finally:
+            self.cleanup()
 
 if __name__ == "__main__":
-    run = Runner(LOGLEVEL)
+    run = Runner(LOGLEVEL, daemon=DAEMON, command=COMMAND)
     icon_path = run.icon
 
-    webui_pid = run.launch_webui(hidden=HIDDEN, headless=HEADLESS)
-    run.save_pid(webui_pid, run.webui_pid_fp)
+    if run.pool_mode:
+        run.launch_pool(headless=HEADLESS)
+    elif run.on_demand:
+        run.launch_on_demand(headless=HEADLESS)
+    else:
+        # The supervisor needs the child's output in webui.log, so a daemon always runs hidden.
+        webui_pid = run.launch_webui(hidden=HIDDEN or DAEMON, headless=HEADLESS, profile=PROFILE)
+        run.save_pid(webui_pid, run.webui_pid_fp)
 
+    run.start_metrics()
+    run.start_jobs()
     tray_pid = os.getpid()
     run.save_pid(tray_pid, run.tray_pid_fp)
 
-    run.create_tray_icon(icon_path)
\ No newline at end of file
+    if DAEMON:
+        run.serve_forever()
+    else:
+        run.create_tray_icon(icon_path)
\ No newline at end of file